@@ -0,0 +1,266 @@
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import commit_hooks, engine
+from models import AuditLog, BlacklistedToken, TableVersion, Tombstone
+
+logger = logging.getLogger(__name__)
+
+# Flush the buffer once it holds this many entries, or this often
+AUDIT_BATCH_SIZE = settings.audit_batch_size
+AUDIT_FLUSH_INTERVAL_MS = settings.audit_flush_interval_ms
+
+# Bookkeeping tables that are not audited
+NOT_AUDITED = {
+    AuditLog.__tablename__,
+    TableVersion.__tablename__,
+    BlacklistedToken.__tablename__,
+    Tombstone.__tablename__,
+}
+NOT_AUDITED_COLUMNS = {"password"}
+
+
+# In-memory write-behind buffer. Request handlers only append; a background
+# thread writes the entries with one bulk INSERT per batch.
+class AuditBuffer:
+    def __init__(
+        self,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+        max_pending: int = 50000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    def add(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            self._pending.extend(entries)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                # Database unavailable for a long time: keep the newest entries
+                del self._pending[:overflow]
+                self.dropped += overflow
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        self.start()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with engine.begin() as connection:
+                    for start in range(0, len(batch), self.batch_size):
+                        connection.execute(
+                            insert(AuditLog), batch[start : start + self.batch_size]
+                        )
+            except Exception:
+                logger.exception("Could not write %d audit entries", len(batch))
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            self.written += len(batch)
+            self.flushes += 1
+            return len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+        }
+
+
+audit_buffer = AuditBuffer()
+atexit.register(audit_buffer.close)
+
+
+def column_values(obj):
+    mapper = inspect(obj).mapper
+    return {
+        attr.key: getattr(obj, attr.key)
+        for attr in mapper.column_attrs
+        if attr.key in obj.__dict__ and attr.key not in NOT_AUDITED_COLUMNS
+    }
+
+
+def changed_values(obj):
+    state = inspect(obj)
+    before, after = {}, {}
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if attr.key in NOT_AUDITED_COLUMNS or not history.has_changes():
+            continue
+        before[attr.key] = history.deleted[0] if history.deleted else None
+        after[attr.key] = history.added[0] if history.added else None
+    return before, after
+
+
+def primary_key_of(obj):
+    values = inspect(obj).mapper.primary_key_from_instance(obj)
+    return ",".join(str(value) for value in values)
+
+
+def new_entry(entity: str, entity_id, action: str, actor, before=None, after=None):
+    return {
+        "actor_id": getattr(actor, "id", None),
+        "actor_name": getattr(actor, "name", None),
+        "entity": entity,
+        "entity_id": entity_id,
+        "action": action,
+        "changes": jsonable_encoder({"before": before, "after": after}),
+        "created_at": datetime.now(),
+    }
+
+
+def audit_entry(obj, action: str, actor, before=None, after=None):
+    return new_entry(
+        obj.__table__.name, primary_key_of(obj), action, actor, before, after
+    )
+
+
+# The acting user is put on request.state by get_current_user; the write
+# session carries the request state in its info.
+def session_actor(session):
+    request_state = session.info.get("request_state")
+    return getattr(request_state, "current_user", None)
+
+
+# Collect create / update / delete entries for everything a flush wrote.
+# They are handed to the buffer only once the transaction commits.
+@event.listens_for(Session, "after_flush")
+def collect_audit_entries(session, flush_context):
+    actor = session_actor(session)
+    pending = session.info.setdefault("audit_pending", [])
+    for obj in session.new:
+        if obj.__table__.name not in NOT_AUDITED:
+            pending.append(audit_entry(obj, "create", actor, after=column_values(obj)))
+    for obj in session.dirty:
+        if obj.__table__.name in NOT_AUDITED or not session.is_modified(obj):
+            continue
+        before, after = changed_values(obj)
+        if after:
+            pending.append(audit_entry(obj, "update", actor, before, after))
+    for obj in session.deleted:
+        if obj.__table__.name not in NOT_AUDITED:
+            pending.append(audit_entry(obj, "delete", actor, before=column_values(obj)))
+
+
+# Bulk statements never reach the flush. A bulk DELETE (chunked deletes)
+# gets one entry per row, read just before the statement in the same
+# transaction and scope. A bulk INSERT of a list of rows (the ledgers) gets
+# one entry per row sent; their ids are not known yet. Statements run with
+# execution_options(audit=False) are skipped: season archival, whose rows
+# live on in the archive tables.
+@event.listens_for(Session, "do_orm_execute")
+def collect_bulk_audit_entries(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.local_table.name in NOT_AUDITED:
+        return
+    if not orm_execute_state.execution_options.get("audit", True):
+        return
+    session = orm_execute_state.session
+    table_name = mapper.local_table.name
+    actor = session_actor(session)
+    if orm_execute_state.is_insert:
+        # None / {} for an INSERT carrying its own VALUES (the upserts)
+        rows = orm_execute_state.parameters or []
+        if isinstance(rows, dict):
+            rows = [rows]
+        entries = [
+            new_entry(
+                table_name,
+                None,
+                "create",
+                actor,
+                after={
+                    key: value
+                    for key, value in row.items()
+                    if key not in NOT_AUDITED_COLUMNS
+                },
+            )
+            for row in rows
+        ]
+    else:
+        attrs = [
+            attr for attr in mapper.column_attrs if attr.key not in NOT_AUDITED_COLUMNS
+        ]
+        query = select(*(attr.columns[0].label(attr.key) for attr in attrs))
+        if orm_execute_state.statement.whereclause is not None:
+            query = query.where(orm_execute_state.statement.whereclause)
+        primary_keys = [
+            mapper.get_property_by_column(column).key for column in mapper.primary_key
+        ]
+        entries = [
+            new_entry(
+                table_name,
+                ",".join(str(row[key]) for key in primary_keys),
+                "delete",
+                actor,
+                before=dict(row),
+            )
+            for row in session.execute(query).mappings()
+        ]
+    session.info.setdefault("audit_pending", []).extend(entries)
+
+
+def enqueue_committed_entries(session, tables):
+    audit_buffer.add(session.info.pop("audit_pending", None))
+
+
+commit_hooks.append(enqueue_committed_entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_audit_entries(session):
+    session.info.pop("audit_pending", None)
@@ -0,0 +1,65 @@
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from fieldsets import select_fields
+from queries import (
+    agreement_columns,
+    broker_columns,
+    do_with_names_columns,
+    kochia_columns,
+    party_columns,
+    query_do_with_names,
+    rice_mill_columns,
+    society_columns,
+    transporter_columns,
+    truck_columns,
+    ware_house_columns,
+)
+
+# Ids per IN (...) list, so large batches stay within packet and plan limits
+BATCH_CHUNK_SIZE = settings.batch_fetch_chunk_size
+# Ids accepted per request
+BATCH_MAX_IDS = settings.batch_fetch_max_ids
+
+# Entities served by the batch fetch: (primary key, columns of a row, the
+# same as the entity's by-id endpoint)
+BATCH_ENTITIES = {
+    "rice_mills": (models.Add_Rice_Mill.rice_mill_id, rice_mill_columns),
+    "transporters": (models.Transporter.transporter_id, transporter_columns),
+    "trucks": (models.Truck.truck_id, truck_columns),
+    "societies": (models.Society.society_id, society_columns),
+    "agreements": (models.Agreement.agremennt_id, agreement_columns),
+    "warehouses": (models.ware_house_transporting.ware_house_id, ware_house_columns),
+    "kochia": (models.Kochia.kochia_id, kochia_columns),
+    "parties": (models.Party.party_id, party_columns),
+    "brokers": (models.brokers.broker_id, broker_columns),
+    "dos": (models.Add_Do.do_id, do_with_names_columns),
+}
+
+
+def query_rows(db: Session, entity: str, columns):
+    if entity == "dos":
+        return query_do_with_names(db, columns)
+    return db.query(*columns)
+
+
+# Rows of `entity` for `ids`, in the order asked for (repeats dropped), with
+# the ids not found (or not the session user's) listed in `missing`. One
+# IN (...) query per BATCH_CHUNK_SIZE ids. `fields` (?fields=) narrows the
+# columns; the id is always sent, to match rows to ids.
+def fetch_by_ids(db: Session, entity: str, ids, fields: str = None):
+    primary_key, columns = BATCH_ENTITIES[entity]
+    columns = select_fields(columns, fields)
+    if primary_key.key not in [column.key for column in columns]:
+        columns = (primary_key, *columns)
+    ids = list(dict.fromkeys(ids))
+    found = {}
+    for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+        chunk = ids[start : start + BATCH_CHUNK_SIZE]
+        for row in query_rows(db, entity, columns).filter(primary_key.in_(chunk)):
+            found[getattr(row, primary_key.key)] = row._asdict()
+    return {
+        "rows": [found[row_id] for row_id in ids if row_id in found],
+        "missing": [row_id for row_id in ids if row_id not in found],
+    }
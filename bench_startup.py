@@ -0,0 +1,46 @@
+# Startup-time benchmark: time from a fresh interpreter importing main to the
+# app being ready (lifespan startup finished), over several cold starts.
+#
+#     python bench_startup.py [runs]
+#
+# Uses the configured DATABASE_URL, like a worker spawn would.
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app):
+    ready = time.perf_counter()
+    print(json.dumps({
+        "import": imported - started,
+        "lifespan": ready - imported,
+        "import_to_ready": ready - started,
+    }))
+"""
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs: int):
+    results = [run_once() for _ in range(runs)]
+    for name in ("import", "lifespan", "import_to_ready"):
+        values = [result[name] for result in results]
+        print(
+            f"{name:>16}: median {statistics.median(values) * 1000:8.1f} ms"
+            f"  min {min(values) * 1000:8.1f} ms  max {max(values) * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
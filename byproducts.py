@@ -0,0 +1,256 @@
+import threading
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.orm import Session
+
+import models
+from database import engine
+from stock import record_movements
+from util import check_ids_exist
+
+PRODUCTS = ("broken", "husk", "nakkhi", "bran", "bhushi")
+
+# Sales accepted by one batch
+MAX_BATCH_SIZE = 1000
+
+# Rows removed per statement when a partition is dropped without native
+# partitioning
+DROP_CHUNK_SIZE = 5000
+
+# Partitions added at once for a sale month far from those recorded so far
+MAX_NEW_PARTITIONS = 24
+
+TABLE_NAME = models.ByproductSale.__tablename__
+FUTURE_PARTITION = "p_future"
+
+
+def sale_month(sale_date) -> int:
+    return sale_date.year * 100 + sale_date.month
+
+
+def next_month(month: int) -> int:
+    year, month = divmod(month, 100)
+    return (year + 1) * 100 + 1 if month == 12 else year * 100 + month + 1
+
+
+def partition_name(month: int) -> str:
+    return f"p{month}"
+
+
+def months_between(first: int, last: int):
+    months = [first]
+    while months[-1] < last:
+        months.append(next_month(months[-1]))
+    return months
+
+
+# MySQL: repartition the freshly created table by RANGE (sale_month). The
+# partition key has to be part of the primary key. Months are split off the
+# catch-all p_future partition as sales for them arrive.
+@event.listens_for(models.ByproductSale.__table__, "after_create")
+def partition_byproduct_sales(target, connection, **kw):
+    if connection.dialect.name != "mysql":
+        return
+    connection.execute(
+        text(
+            f"ALTER TABLE {TABLE_NAME} DROP PRIMARY KEY, "
+            "ADD PRIMARY KEY (sale_id, sale_month)"
+        )
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {TABLE_NAME} PARTITION BY RANGE (sale_month) "
+            f"(PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)"
+        )
+    )
+
+
+# Monthly partitions of byproduct_sales. On MySQL these are real RANGE
+# partitions: adding one splits p_future, dropping one is a metadata change.
+# Elsewhere (SQLite in development) a month is the rows with that sale_month,
+# found through the leading sale_month index, and dropping it deletes them in
+# chunks.
+class MonthlyPartitions:
+    def __init__(self):
+        self._known = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def native(connection) -> bool:
+        return connection.dialect.name == "mysql"
+
+    # {month: approximate row count}
+    def list(self, connection):
+        if self.native(connection):
+            rows = connection.execute(
+                text(
+                    "SELECT PARTITION_NAME, TABLE_ROWS "
+                    "FROM information_schema.PARTITIONS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                    "AND PARTITION_NAME IS NOT NULL"
+                ),
+                {"table": TABLE_NAME},
+            ).all()
+            return {
+                int(name[1:]): row_count
+                for name, row_count in rows
+                if name != FUTURE_PARTITION
+            }
+        rows = connection.execute(
+            select(models.ByproductSale.sale_month, func.count()).group_by(
+                models.ByproductSale.sale_month
+            )
+        ).all()
+        return {month: row_count for month, row_count in rows}
+
+    # Make sure every month written has a partition of its own before rows
+    # for it are written. Runs on its own connection: MySQL commits DDL
+    # implicitly, which must not happen inside a request's transaction.
+    def ensure(self, months):
+        missing = set(months) - self._known
+        if not missing:
+            return
+        with self._lock:
+            with engine.connect() as connection:
+                if self.native(connection):
+                    for month in sorted(missing):
+                        self._add_partition(connection, month)
+                connection.commit()
+            self._known |= missing
+
+    # MySQL: split the partition covering `month` so that `month`, and every
+    # month between it and the neighbouring partition, gets its own range.
+    # A month is thus never left sharing a partition with the months around
+    # it, and dropping a partition drops exactly one month.
+    def _add_partition(self, connection, month: int):
+        existing = sorted(self.list(connection))
+        if month in existing:
+            return
+        later = [m for m in existing if m > month]
+        earlier = [m for m in existing if m < month]
+        if later:
+            covering, last = partition_name(later[0]), later[0]
+        else:
+            covering, last = FUTURE_PARTITION, month
+        first = next_month(earlier[-1]) if earlier else month
+        new_months = months_between(first, last)
+        if len(new_months) > MAX_NEW_PARTITIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Sale month {month} is too far from the months already "
+                "recorded",
+            )
+        partitions = [
+            f"PARTITION {partition_name(m)} VALUES LESS THAN ({next_month(m)})"
+            for m in new_months
+        ]
+        if covering == FUTURE_PARTITION:
+            partitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+        connection.execute(
+            text(
+                f"ALTER TABLE {TABLE_NAME} REORGANIZE PARTITION {covering} "
+                f"INTO ({', '.join(partitions)})"
+            )
+        )
+
+    # Drop one month of every user's sales. Returns False when nothing is
+    # recorded for the month. On MySQL a partition still holding other months
+    # (rows written before each month got its own partition) is refused
+    # rather than dropped, so both backends only ever remove `month`.
+    def drop(self, month: int):
+        with self._lock:
+            with engine.connect() as connection:
+                if month not in self.list(connection):
+                    return False
+                if self.native(connection):
+                    shared = connection.execute(
+                        text(
+                            f"SELECT 1 FROM {TABLE_NAME} PARTITION "
+                            f"({partition_name(month)}) WHERE sale_month <> :month "
+                            "LIMIT 1"
+                        ),
+                        {"month": month},
+                    ).first()
+                    if shared is not None:
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Partition {partition_name(month)} also holds "
+                            "sales of other months",
+                        )
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {TABLE_NAME} DROP PARTITION "
+                            f"{partition_name(month)}"
+                        )
+                    )
+                else:
+                    Sale = models.ByproductSale
+                    while True:
+                        chunk = select(Sale.sale_id).where(Sale.sale_month == month)
+                        result = connection.execute(
+                            delete(Sale).where(
+                                Sale.sale_id.in_(chunk.limit(DROP_CHUNK_SIZE))
+                            )
+                        )
+                        connection.commit()
+                        if result.rowcount < DROP_CHUNK_SIZE:
+                            break
+                connection.commit()
+            self._known.discard(month)
+            return True
+
+
+byproduct_partitions = MonthlyPartitions()
+
+
+# Write a batch of sales with one bulk INSERT and take the products out of
+# the mills' stock. Party, broker and mill ids are checked here because the
+# partitioned table cannot carry foreign keys.
+def record_sales(db: Session, sales, user_id: int = None):
+    if not sales or len(sales) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Send 1 to {MAX_BATCH_SIZE} sales per batch",
+        )
+    check_ids_exist(
+        db,
+        models.Add_Rice_Mill.rice_mill_id,
+        (sale.rice_mill_id for sale in sales),
+        "Rice mill",
+    )
+    check_ids_exist(
+        db, models.Party.party_id, (sale.party_id for sale in sales), "Party"
+    )
+    check_ids_exist(
+        db, models.brokers.broker_id, (sale.broker_id for sale in sales), "Broker"
+    )
+
+    rows = [
+        dict(
+            sale.dict(),
+            sale_month=sale_month(sale.sale_date),
+            amount=round(sale.quantity * sale.rate, 2),
+            user_id=user_id,
+        )
+        for sale in sales
+    ]
+    byproduct_partitions.ensure({row["sale_month"] for row in rows})
+    db.execute(insert(models.ByproductSale), rows)
+    record_movements(
+        db,
+        [
+            {
+                "rice_mill_id": row["rice_mill_id"],
+                "commodity": row["product"],
+                "movement_type": f"{row['product']}_jawak",
+                "quantity": -row["quantity"],
+                "movement_date": row["sale_date"],
+                "reference": f"party:{row['party_id']}",
+                "user_id": user_id,
+            }
+            for row in rows
+        ],
+    )
+    db.commit()
+    return len(rows)
@@ -0,0 +1,246 @@
+import functools
+import hashlib
+import inspect
+import threading
+import time
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache_backends import CacheBackend, cache_backend, dumps, loads
+from database import READ_AFTER_WRITE_WINDOW, commit_hooks
+from table_versions import (
+    bump_table_versions,
+    current_table_versions,
+    expire_local_versions,
+)
+
+# Which cached route groups read from which table. A commit that touches a
+# table drops every group listed for it.
+TABLE_DEPENDENCIES = {
+    "addricemill": {"rice_mills", "agreements", "kochia", "do_data", "do_form"},
+    "transporter": {"transporters", "trucks", "truck_lookup"},
+    "trucks": {"trucks", "do_data", "do_form", "truck_lookup"},
+    "society": {"societies", "do_data", "do_form"},
+    "agreement": {"agreements", "do_data", "do_form"},
+    "warehousetransporting": {"warehouses"},
+    "kochia": {"kochia"},
+    "party": {"parties"},
+    "brokers": {"brokers"},
+    "addDo": {"do_data", "truck_lookup"},
+}
+
+
+# Reverse of TABLE_DEPENDENCIES: the tables each route group reads
+GROUP_TABLES = {}
+for table_name, table_groups in TABLE_DEPENDENCIES.items():
+    for group_name in table_groups:
+        GROUP_TABLES.setdefault(group_name, set()).add(table_name)
+
+# Table versions this worker has already reconciled its cache against, and
+# when this worker last saw each table change
+_seen_versions = {}
+_changed_at = {}
+_seen_versions_lock = threading.Lock()
+
+
+def invalidate_tables(tables, cache: CacheBackend = cache_backend):
+    groups = set()
+    for table in tables:
+        groups.update(TABLE_DEPENDENCIES.get(table, ()))
+    if groups:
+        cache.invalidate(*groups)
+
+
+def cache_key_params(kwargs):
+    params = []
+    for name, value in sorted(kwargs.items()):
+        if name == "db":
+            continue
+        if name == "current_user":
+            # Sessions are scoped to the user, so each user has their own
+            # entries
+            if value is not None:
+                params.append(("owner", value.id))
+            continue
+        if isinstance(value, list):
+            value = tuple(value)
+        params.append((name, value))
+    return tuple(params)
+
+
+# Drop cached groups whose tables were written by another worker since this
+# worker last looked at the table_versions registry.
+def sync_with_table_versions(cache: CacheBackend = cache_backend):
+    versions = current_table_versions()
+    with _seen_versions_lock:
+        changed = [
+            table_name
+            for table_name, version in versions.items()
+            if _seen_versions.get(table_name, version) != version
+        ]
+        _seen_versions.update(versions)
+    if changed:
+        mark_tables_changed(changed)
+        invalidate_tables(changed, cache)
+    return versions
+
+
+def mark_tables_changed(tables):
+    now = time.monotonic()
+    with _seen_versions_lock:
+        for table_name in tables:
+            _changed_at[table_name] = now
+
+
+# True while a write to any of `tables` may not have reached the replica yet
+def changed_recently(tables, window: float = READ_AFTER_WRITE_WINDOW):
+    now = time.monotonic()
+    with _seen_versions_lock:
+        return any(now - _changed_at.get(table, -window) < window for table in tables)
+
+
+# Digest of the route, its parameters and the versions of the tables its
+# group reads. Used both as the shared cache key and as the ETag, so a
+# table write anywhere yields a new key on every node.
+def route_digest(group: str, key, versions):
+    tables = sorted(GROUP_TABLES.get(group, ()))
+    state = repr((key, [(table, versions.get(table, 0)) for table in tables]))
+    return hashlib.blake2b(state.encode(), digest_size=12).hexdigest()
+
+
+# If-None-Match: "*" or a comma-separated list of entity tags, compared
+# weakly (a W/ prefix on either side is ignored), as RFC 9110 asks for GET
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+# Cache the return value of a GET route under `group` in the configured
+# backend. Path/query parameters and the current user's id form the key.
+# The response carries an ETag derived from the versions of the tables the
+# group reads, and a matching If-None-Match is answered with 304.
+def cached_route(group: str, cache: CacheBackend = cache_backend):
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(
+            *args, cache_request: Request, cache_response: Response, **kwargs
+        ):
+            versions = sync_with_table_versions(cache)
+            key = (group, func.__name__, cache_key_params(kwargs))
+            digest = route_digest(group, key, versions)
+            etag = 'W/"%s"' % digest
+            if etag_matches(cache_request.headers.get("if-none-match", ""), etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            cache_response.headers["ETag"] = etag
+            return await load(digest, args, kwargs)
+
+        async def load(digest, args, kwargs):
+            cached = cache.get("route:" + digest)
+            if cached is not None:
+                return loads(cached)
+            # Do not fill the shared cache from a replica that may still lag
+            # behind the write that produced this version
+            db = kwargs.get("db")
+            if db is not None and changed_recently(GROUP_TABLES.get(group, ())):
+                db.info["primary"] = True
+            value = await func(*args, **kwargs)
+            cache.set("route:" + digest, dumps(value), group=group)
+            return value
+
+        # Fill the cache as a request by `user` would, e.g. at startup. Only
+        # for routes whose parameters besides the session and the current
+        # user all have defaults (e.g. ?fields=), which are used.
+        defaults = {
+            name: parameter.default
+            for name, parameter in signature.parameters.items()
+            if name not in ("db", "current_user")
+        }
+
+        async def warm_cache(db, user):
+            kwargs = {**defaults, "db": db, "current_user": user}
+            versions = sync_with_table_versions(cache)
+            key = (group, func.__name__, cache_key_params(kwargs))
+            await load(route_digest(group, key, versions), (), kwargs)
+
+        if inspect.Parameter.empty not in defaults.values():
+            wrapper.warm_cache = warm_cache
+
+        wrapper.__signature__ = signature.replace(
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(
+                    "cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+                ),
+                inspect.Parameter(
+                    "cache_response",
+                    inspect.Parameter.KEYWORD_ONLY,
+                    annotation=Response,
+                ),
+            ]
+        )
+        return wrapper
+
+    return decorator
+
+
+# Warm every cached route of `app` that supports it, for each of `users`,
+# with sessions scoped to that user. Returns the number of entries warmed.
+async def warm_route_caches(app, session_factory, users):
+    warmed = 0
+    for route in app.routes:
+        warm_cache = getattr(getattr(route, "endpoint", None), "warm_cache", None)
+        if warm_cache is None:
+            continue
+        for user in users:
+            db = session_factory()
+            db.info["owner_id"] = user.id
+            try:
+                await warm_cache(db, user)
+                warmed += 1
+            except HTTPException:
+                # e.g. 404 for an empty list; nothing to cache
+                pass
+            finally:
+                db.close()
+    return warmed
+
+
+# Record the new table versions in the same transaction as the write
+@event.listens_for(Session, "before_commit")
+def bump_committed_tables(session):
+    session.flush()
+    tables = session.info.get("changed_tables")
+    if tables:
+        bump_table_versions(session, set(tables))
+
+
+# Invalidate cached routes for the tables a committed transaction wrote
+def invalidate_committed_tables(session, tables):
+    expire_local_versions()
+    mark_tables_changed(tables)
+    invalidate_tables(tables)
+
+
+commit_hooks.append(invalidate_committed_tables)
+
+
+# Authenticated users by email, keyed on the users table version so a change
+# to any user is picked up by every node.
+def get_cached_user(email: str):
+    version = current_table_versions().get("users", 0)
+    cached = cache_backend.get(f"user:{version}:{email}")
+    return loads(cached) if cached is not None else None
+
+
+def set_cached_user(user, ttl: float = 60):
+    version = current_table_versions().get("users", 0)
+    data = {"id": user.id, "name": user.name, "email": user.email, "role": user.role}
+    cache_backend.set(f"user:{version}:{user.email}", dumps(data), ttl=ttl)
@@ -0,0 +1,303 @@
+import datetime
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import orjson
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+
+from config import settings
+
+
+def encode_default(value):
+    if isinstance(value, Row):
+        return value._asdict()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+# Compact bytes for cached values so every backend stores the same payload
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=encode_default)
+
+
+def loads(data: bytes):
+    return orjson.loads(data)
+
+
+# Common interface for the shared caches. Values are always bytes.
+class CacheBackend:
+    name = "base"
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float = None, group: str = None):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    # Drop everything stored under the given groups. Backends whose keys
+    # already embed table versions can leave stale keys to expire.
+    def invalidate(self, *groups: str):
+        pass
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+# Bounded LRU cache with a per-entry TTL. Every entry belongs to a group
+# (e.g. "rice_mills") so a write can drop all cached variants of a route.
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, group, value = entry
+            if expires_at < now:
+                self._remove(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value, group: str = None, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, group, value)
+            self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def invalidate(self, *groups: str):
+        with self._lock:
+            for group in groups:
+                for key in self._groups.pop(group, ()):
+                    self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def _remove(self, key):
+        expires_at, group, value = self._entries.pop(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Per-process backend. Also the stand-in used when no Redis is configured.
+class InProcessBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.store = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, key: str):
+        hit, value = self.store.get(key)
+        return value if hit else None
+
+    def set(self, key: str, value: bytes, ttl: float = None, group: str = None):
+        self.store.set(key, value, group=group, ttl=ttl)
+
+    def delete(self, *keys: str):
+        self.store.delete(*keys)
+
+    def invalidate(self, *groups: str):
+        self.store.invalidate(*groups)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        return {"backend": self.name, **self.store.stats()}
+
+
+class RedisError(Exception):
+    pass
+
+
+# Minimal RESP client (GET / SET PX / DEL / FLUSHDB) talking to Redis or any
+# server speaking its protocol. One connection per thread; any network error
+# is treated as a cache miss so the request falls back to the database.
+class RedisBackend(CacheBackend):
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float = 300, timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._execute("AUTH", self.password)
+        if self.db:
+            self._execute("SELECT", self.db)
+
+    def _execute(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._local.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload
+        if prefix == b"-":
+            raise RedisError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(payload)
+            if count == -1:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def command(self, *args):
+        try:
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            return self._execute(*args)
+        except (OSError, RedisError):
+            self._close()
+            with self._lock:
+                self.errors += 1
+            return None
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+        self._local.reader = None
+
+    def get(self, key: str):
+        value = self.command("GET", key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float = None, group: str = None):
+        ttl_ms = int((self.ttl if ttl is None else ttl) * 1000)
+        self.command("SET", key, value, "PX", ttl_ms)
+
+    def delete(self, *keys: str):
+        if keys:
+            self.command("DEL", *keys)
+
+    def clear(self):
+        self.command("FLUSHDB")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.name,
+                "server": f"{self.host}:{self.port}/{self.db}",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "errors": self.errors,
+            }
+
+
+# CACHE_BACKEND=memory (default) or CACHE_BACKEND=redis with CACHE_URL
+def create_cache_backend(
+    backend: str = None, url: str = None, ttl: float = None
+) -> CacheBackend:
+    backend = backend or settings.cache_backend
+    ttl = ttl if ttl is not None else settings.cache_ttl
+    if backend == "redis":
+        return RedisBackend(url or settings.cache_url, ttl=ttl)
+    if backend == "memory":
+        return InProcessBackend(max_entries=settings.cache_max_entries, ttl=ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}")
+
+
+cache_backend = create_cache_backend()
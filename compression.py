@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+
+# Compressed bodies keyed by (encoding, digest of the raw body). Reference
+# lists such as /do-data/ or the DO form payload are byte-identical between
+# writes, so hashing the body is enough to skip recompressing them.
+class CompressedBodyCache:
+    def __init__(self, max_entries: int = 256, max_body_size: int = 4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_body_size = max_body_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, encoding: str, body: bytes, compress):
+        if len(body) > self.max_body_size:
+            return compress(body)
+
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = compress(body)
+        with self._lock:
+            self._entries[key] = compressed
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+compressed_body_cache = CompressedBodyCache()
+
+
+# Response compression for buffered JSON payloads (brotli when the client
+# accepts it, gzip otherwise). Streaming responses are passed through untouched.
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache: CompressedBodyCache = compressed_body_cache,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache
+
+    def choose_encoding(self, accept_encoding: str):
+        accepted = {
+            part.split(";")[0].strip().lower() for part in accept_encoding.split(",")
+        }
+        if "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, encoding: str, body: bytes):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        cacheable = scope["method"] == "GET"
+        start_message = None
+        body_parts = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streaming response (e.g. server-sent events), do not buffer
+                passthrough = True
+                await send(start_message)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": b"".join(body_parts),
+                        "more_body": True,
+                    }
+                )
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(body) < self.minimum_size or "content-encoding" in headers:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if cacheable and start_message["status"] == 200:
+                compressed = self.cache.get_or_compress(
+                    encoding, body, lambda raw: self.compress(encoding, raw)
+                )
+            else:
+                compressed = self.compress(encoding, body)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
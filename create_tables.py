@@ -0,0 +1,79 @@
+# Create the database tables. Run once per deploy (or after adding a model):
+#
+#     python create_tables.py
+#     python create_tables.py backfill-truck-numbers
+#     python create_tables.py backfill-truck-owners
+#
+# The app itself no longer touches the schema at import; set
+# CREATE_TABLES_ON_STARTUP=true to have the lifespan do it instead.
+import sys
+
+from sqlalchemy import select, update
+
+import models  # noqa: F401  registers the tables on Base.metadata
+import table_versions  # noqa: F401  seeds table_versions after it is created
+import byproducts  # noqa: F401  partitions byproduct_sales on MySQL
+from database import Base, engine
+
+
+def create_tables():
+    Base.metadata.create_all(bind=engine)
+
+
+# Fill trucks.truck_number_normalized for rows written before the column was
+# added. Numbers that collide with an earlier truck of the same user are
+# left NULL and reported so the duplicates can be merged by hand.
+def backfill_truck_numbers():
+    seen = {}
+    duplicates = []
+    with engine.begin() as connection:
+        rows = connection.execute(
+            select(
+                models.Truck.truck_id,
+                models.Truck.truck_number,
+                models.Truck.user_id,
+            ).order_by(models.Truck.truck_id)
+        ).all()
+        for truck_id, truck_number, user_id in rows:
+            normalized = models.normalize_truck_number(truck_number)
+            if normalized is None:
+                continue
+            key = (user_id, normalized)
+            if key in seen:
+                duplicates.append((truck_id, truck_number, seen[key]))
+                continue
+            seen[key] = truck_id
+            connection.execute(
+                update(models.Truck)
+                .where(models.Truck.truck_id == truck_id)
+                .values(truck_number_normalized=normalized)
+            )
+    return duplicates
+
+
+# Trucks used to be saved without a user_id, which hides them from every
+# user now that reads are scoped by owner. Give them their transporter's.
+def backfill_truck_owners():
+    owner = (
+        select(models.Transporter.user_id)
+        .where(models.Transporter.transporter_id == models.Truck.transport_id)
+        .scalar_subquery()
+    )
+    with engine.begin() as connection:
+        result = connection.execute(
+            update(models.Truck)
+            .where(models.Truck.user_id.is_(None))
+            .values(user_id=owner)
+        )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["backfill-truck-owners"]:
+        print(f"{backfill_truck_owners()} trucks updated")
+    elif sys.argv[1:] == ["backfill-truck-numbers"]:
+        for truck_id, truck_number, first_id in backfill_truck_numbers():
+            print(f"Truck {truck_id} ({truck_number}) duplicates truck {first_id}")
+    else:
+        create_tables()
+        print("Tables created")
@@ -0,0 +1,229 @@
+from fastapi import HTTPException, status
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+
+# Rows removed per statement; each chunk is its own transaction, so locks on
+# the child tables are held only briefly
+DELETE_CHUNK_SIZE = settings.delete_chunk_size
+
+
+# Refuse the delete while any of `checks` ([(what, select)]) finds a row.
+# The ledgers (arrivals, deposits, stock, by-product sales) are append-only
+# and never cascade; their foreign keys restrict at the database too.
+def check_unreferenced(db: Session, checks):
+    found = [what for what, query in checks if db.execute(query.limit(1)).first()]
+    if found:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot delete, it still has {', '.join(found)}",
+        )
+
+
+# DELETE the rows of `model` matching `condition` in chunks of primary keys,
+# committing after each. Each chunk's rows are audited and tombstoned in its
+# own transaction (see audit.py and sync.py). Returns the number of rows
+# deleted.
+def delete_in_chunks(db: Session, model, condition, chunk_size: int = None):
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    primary_key = model.__mapper__.primary_key[0]
+    deleted = 0
+    while True:
+        ids = (
+            db.execute(select(primary_key).where(condition).limit(chunk_size))
+            .scalars()
+            .all()
+        )
+        if not ids:
+            return deleted
+        result = db.execute(
+            delete(model)
+            .where(primary_key.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += result.rowcount
+
+
+# The parent itself goes through the ORM, so it is audited. Its child
+# relationships are passive and are not loaded. Nothing cascades at the
+# database: children written since their chunks were deleted (`children`,
+# [(model, condition)]) are deleted in the parent's transaction, so every
+# removed row is audited and tombstoned. A child committed in the last instant still
+# blocks the delete, which is refused rather than left half done.
+def delete_parent(db: Session, model, row_id, children=()):
+    try:
+        for child, condition in children:
+            db.execute(
+                delete(child)
+                .where(condition)
+                .execution_options(synchronize_session=False)
+            )
+        parent = db.get(model, row_id)
+        if parent is not None:
+            db.delete(parent)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Rows were added to it while it was being deleted, try again",
+        )
+
+
+def closed_season_dos(condition):
+    return (
+        select(models.Add_Do.do_id)
+        .join(models.Season, models.Season.season_id == models.Add_Do.season_id)
+        .where(condition, models.Season.closed_at.is_not(None))
+    )
+
+
+# A mill with its agreements, kochia and DOs (including DOs written against
+# its agreements). Children go first, chunk by chunk, then the mill. Safe
+# to re-run if interrupted.
+def delete_rice_mill(db: Session, rice_mill_id: int):
+    Do = models.Add_Do
+    agreement_ids = select(models.Agreement.agremennt_id).where(
+        models.Agreement.rice_mill_id == rice_mill_id
+    )
+    mill_dos = or_(
+        Do.select_mill_id == rice_mill_id, Do.select_argeement_id.in_(agreement_ids)
+    )
+    check_unreferenced(
+        db,
+        [
+            (
+                "paddy arrivals",
+                select(models.Dhan_Awak.dhan_awak_id).where(
+                    or_(
+                        models.Dhan_Awak.rice_mill_id == rice_mill_id,
+                        models.Dhan_Awak.do_id.in_(select(Do.do_id).where(mill_dos)),
+                    )
+                ),
+            ),
+            (
+                "rice deposits",
+                select(models.Rice_deposite.rice_deposite_id).where(
+                    models.Rice_deposite.rice_mill_id == rice_mill_id
+                ),
+            ),
+            (
+                "stock movements",
+                select(models.StockMovement.movement_id).where(
+                    models.StockMovement.rice_mill_id == rice_mill_id
+                ),
+            ),
+            (
+                "by-product sales",
+                select(models.ByproductSale.sale_id).where(
+                    models.ByproductSale.rice_mill_id == rice_mill_id
+                ),
+            ),
+            ("DOs in a closed season", closed_season_dos(mill_dos)),
+        ],
+    )
+    mill_agreements = models.Agreement.rice_mill_id == rice_mill_id
+    mill_kochia = models.Kochia.rice_mill_name_id == rice_mill_id
+    deleted = {
+        "dos": delete_in_chunks(db, Do, mill_dos),
+        "agreements": delete_in_chunks(db, models.Agreement, mill_agreements),
+        "kochia": delete_in_chunks(db, models.Kochia, mill_kochia),
+    }
+    delete_parent(
+        db,
+        models.Add_Rice_Mill,
+        rice_mill_id,
+        [
+            (Do, mill_dos),
+            (models.Agreement, mill_agreements),
+            (models.Kochia, mill_kochia),
+        ],
+    )
+    return deleted
+
+
+# An agreement with its DOs. The DOs go through delete_in_chunks (they do
+# not cascade), so they are tombstoned and announced like any other delete.
+def delete_agreement(db: Session, agreement_id: int):
+    agreement_dos = models.Add_Do.select_argeement_id == agreement_id
+    check_unreferenced(
+        db,
+        [
+            (
+                "paddy arrivals",
+                select(models.Dhan_Awak.dhan_awak_id).where(
+                    models.Dhan_Awak.do_id.in_(
+                        select(models.Add_Do.do_id).where(agreement_dos)
+                    )
+                ),
+            ),
+            ("DOs in a closed season", closed_season_dos(agreement_dos)),
+        ],
+    )
+    deleted = {"dos": delete_in_chunks(db, models.Add_Do, agreement_dos)}
+    delete_parent(db, models.Agreement, agreement_id, [(models.Add_Do, agreement_dos)])
+    return deleted
+
+
+# A transporter with its trucks. Trucks still used by DOs or the ledgers
+# keep the transporter.
+def delete_transporter(db: Session, transporter_id: int):
+    truck_ids = select(models.Truck.truck_id).where(
+        models.Truck.transport_id == transporter_id
+    )
+    check_unreferenced(
+        db,
+        [
+            (
+                "trucks used by DOs",
+                select(models.Add_Do.do_id).where(
+                    models.Add_Do.truck_number_id.in_(truck_ids)
+                ),
+            ),
+            (
+                "trucks with paddy arrivals",
+                select(models.Dhan_Awak.dhan_awak_id).where(
+                    models.Dhan_Awak.truck_id.in_(truck_ids)
+                ),
+            ),
+            (
+                "trucks with rice deposits",
+                select(models.Rice_deposite.rice_deposite_id).where(
+                    models.Rice_deposite.truck_id.in_(truck_ids)
+                ),
+            ),
+        ],
+    )
+    trucks = models.Truck.transport_id == transporter_id
+    deleted = {"trucks": delete_in_chunks(db, models.Truck, trucks)}
+    delete_parent(db, models.Transporter, transporter_id, [(models.Truck, trucks)])
+    return deleted
+
+
+# A society with its DOs
+def delete_society(db: Session, society_id: int):
+    society_dos = models.Add_Do.society_name_id == society_id
+    check_unreferenced(
+        db,
+        [
+            (
+                "paddy arrivals",
+                select(models.Dhan_Awak.dhan_awak_id).where(
+                    or_(
+                        models.Dhan_Awak.society_id == society_id,
+                        models.Dhan_Awak.do_id.in_(
+                            select(models.Add_Do.do_id).where(society_dos)
+                        ),
+                    )
+                ),
+            ),
+            ("DOs in a closed season", closed_season_dos(society_dos)),
+        ],
+    )
+    deleted = {"dos": delete_in_chunks(db, models.Add_Do, society_dos)}
+    delete_parent(db, models.Society, society_id, [(models.Add_Do, society_dos)])
+    return deleted
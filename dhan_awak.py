@@ -0,0 +1,207 @@
+from collections import defaultdict
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from seasons import check_season_open
+from stock import record_movements
+
+# Arrivals accepted by one ingestion call
+MAX_BATCH_SIZE = 1000
+# Tries at a batch that races a concurrent batch for the same slips
+MAX_ATTEMPTS = 3
+
+
+@event.listens_for(models.Dhan_Awak, "before_update")
+@event.listens_for(models.Dhan_Awak, "before_delete")
+def reject_ledger_change(mapper, connection, target):
+    raise ValueError("Dhan awak entries are append-only, post a reversal instead")
+
+
+# Append a batch of arrivals and move the received totals of their DOs, in
+# one transaction: one bulk INSERT plus one UPDATE ... SET x = x + n per DO.
+# Slips already recorded for the mill (or repeated in the batch) are
+# skipped and returned, so a weighbridge can safely re-send a batch.
+# Returns (inserted, skipped rst numbers, affected do ids).
+def record_arrivals(db: Session, arrivals, user_id: int = None):
+    if len(arrivals) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_SIZE} arrivals per batch",
+        )
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return insert_new_arrivals(db, arrivals, user_id)
+        except IntegrityError:
+            # A concurrent batch committed one of these slips between the
+            # check and the INSERT (the unique mill / rst index): roll back
+            # and start over, the slip now reads as recorded and is skipped
+            db.rollback()
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+
+
+def insert_new_arrivals(db: Session, arrivals, user_id: int = None):
+    do_ids = {arrival.do_id for arrival in arrivals}
+    dos = {
+        row.do_id: row
+        for row in db.query(
+            models.Add_Do.do_id,
+            models.Add_Do.select_mill_id,
+            models.Add_Do.society_name_id,
+            models.Add_Do.truck_number_id,
+            models.Add_Do.season_id,
+        ).filter(models.Add_Do.do_id.in_(do_ids))
+    }
+    missing = sorted(do_ids - dos.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"DO not found: {', '.join(map(str, missing))}",
+        )
+    # Closed seasons take no new arrivals
+    for season_id in {do.season_id for do in dos.values()}:
+        check_season_open(db, season_id)
+
+    rst_numbers = {arrival.rst_number for arrival in arrivals}
+    recorded = set(
+        db.query(models.Dhan_Awak.rice_mill_id, models.Dhan_Awak.rst_number)
+        .filter(models.Dhan_Awak.rst_number.in_(rst_numbers))
+        .all()
+    )
+
+    rows = []
+    skipped = []
+    totals = defaultdict(lambda: [0.0, 0, 0])
+    for arrival in arrivals:
+        do = dos[arrival.do_id]
+        slip = (do.select_mill_id, arrival.rst_number)
+        if slip in recorded:
+            skipped.append(arrival.rst_number)
+            continue
+        recorded.add(slip)
+        rows.append(
+            {
+                "do_id": arrival.do_id,
+                "rice_mill_id": do.select_mill_id,
+                "society_id": do.society_name_id,
+                "truck_id": arrival.truck_id or do.truck_number_id,
+                "rst_number": arrival.rst_number,
+                "arrival_date": arrival.arrival_date,
+                "bags": arrival.bags,
+                "net_weight": arrival.net_weight,
+                "user_id": user_id,
+            }
+        )
+        total = totals[arrival.do_id]
+        total[0] += arrival.net_weight
+        total[1] += arrival.bags
+        total[2] += 1
+
+    if rows:
+        db.execute(insert(models.Dhan_Awak), rows)
+        add_to_received(db, totals)
+        record_movements(
+            db,
+            [
+                {
+                    "rice_mill_id": row["rice_mill_id"],
+                    "commodity": "paddy",
+                    "movement_type": "dhan_awak",
+                    "quantity": row["net_weight"],
+                    "movement_date": row["arrival_date"],
+                    "reference": f"rst:{row['rst_number']}",
+                    "user_id": user_id,
+                }
+                for row in rows
+            ],
+        )
+    db.commit()
+    return len(rows), skipped, sorted(totals)
+
+
+# Append an entry cancelling `dhan_awak_id` and take it off the DO totals
+def reverse_arrival(db: Session, dhan_awak_id: int, user_id: int = None):
+    original = (
+        db.query(models.Dhan_Awak)
+        .filter(models.Dhan_Awak.dhan_awak_id == dhan_awak_id)
+        .first()
+    )
+    if original is None:
+        raise HTTPException(status_code=404, detail="Arrival not found")
+    if original.reverses_id is not None:
+        raise HTTPException(status_code=400, detail="Cannot reverse a reversal")
+    already_reversed = (
+        db.query(models.Dhan_Awak.dhan_awak_id)
+        .filter(models.Dhan_Awak.reverses_id == dhan_awak_id)
+        .first()
+    )
+    if already_reversed:
+        raise HTTPException(status_code=400, detail="Arrival already reversed")
+    check_season_open(
+        db,
+        db.query(models.Add_Do.season_id)
+        .filter(models.Add_Do.do_id == original.do_id)
+        .scalar(),
+    )
+
+    try:
+        db.execute(
+            insert(models.Dhan_Awak),
+            [
+                {
+                    "do_id": original.do_id,
+                    "rice_mill_id": original.rice_mill_id,
+                    "society_id": original.society_id,
+                    "truck_id": original.truck_id,
+                    "rst_number": None,
+                    "arrival_date": original.arrival_date,
+                    "bags": -original.bags,
+                    "net_weight": -original.net_weight,
+                    "reverses_id": original.dhan_awak_id,
+                    "user_id": user_id,
+                }
+            ],
+        )
+    except IntegrityError:
+        # A concurrent reversal of the same arrival got in between the check
+        # and the INSERT (the unique reverses_id index)
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Arrival already reversed")
+    add_to_received(db, {original.do_id: [-original.net_weight, -original.bags, -1]})
+    record_movements(
+        db,
+        [
+            {
+                "rice_mill_id": original.rice_mill_id,
+                "commodity": "paddy",
+                "movement_type": "adjustment",
+                "quantity": -original.net_weight,
+                "movement_date": original.arrival_date,
+                "reference": f"dhanawak-reversal:{original.dhan_awak_id}",
+                "user_id": user_id,
+            }
+        ],
+    )
+    db.commit()
+    return original.do_id
+
+
+# totals: {do_id: [weight, bags, arrivals]}. DOs are updated in id order so
+# concurrent batches lock rows in the same order.
+def add_to_received(db: Session, totals):
+    for do_id in sorted(totals):
+        weight, bags, count = totals[do_id]
+        db.execute(
+            update(models.Add_Do)
+            .where(models.Add_Do.do_id == do_id)
+            .values(
+                received_weight=models.Add_Do.received_weight + weight,
+                received_bags=models.Add_Do.received_bags + bags,
+                arrival_count=models.Add_Do.arrival_count + count,
+            )
+            .execution_options(synchronize_session=False)
+        )
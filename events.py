@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from database import commit_hooks
+from queries import do_columns
+from scoping import owner_id
+from sync import ENTITY_BY_TABLE
+
+CLIENT_BUFFER = settings.sse_client_buffer
+HEARTBEAT_SECONDS = settings.sse_heartbeat_seconds
+
+
+# One connected client: a bounded queue drained by its response stream.
+# Events are put from whichever thread committed the write, through the
+# client's event loop.
+class Subscriber:
+    def __init__(self, owner, loop, buffer: int):
+        self.owner = owner
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=buffer)
+        self.dropped = 0
+
+    # Runs on the subscriber's loop. A client that fell `buffer` events
+    # behind loses them and gets a single "resync" event instead, telling it
+    # to catch up through /sync/.
+    def _put(self, message):
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            if message is not None:
+                message = ("resync", {"reason": "client fell behind"})
+        self.queue.put_nowait(message)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+
+# In-process fan-out of committed changes to the connected clients of the
+# user that made them. Each worker process has its own broker, fed by the
+# writes it commits itself.
+class EventBroker:
+    def __init__(self, buffer: int = CLIENT_BUFFER):
+        self.buffer = buffer
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, owner):
+        subscriber = Subscriber(owner, asyncio.get_running_loop(), self.buffer)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    # owner None: every client (writes made outside a request)
+    def publish(self, name: str, data, owner=None):
+        with self._lock:
+            subscribers = [
+                subscriber
+                for subscriber in self._subscribers
+                if owner is None or subscriber.owner == owner
+            ]
+            event_id = next(self._ids)
+            self.published += 1
+        for subscriber in subscribers:
+            subscriber.put((name, data, event_id))
+
+    # End every stream, e.g. on shutdown
+    def close(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            published = self.published
+        return {
+            "clients": len(subscribers),
+            "published": published,
+            "buffered": sum(s.queue.qsize() for s in subscribers),
+            "dropped": sum(s.dropped for s in subscribers),
+            "client_buffer": self.buffer,
+        }
+
+
+event_broker = EventBroker()
+
+
+def format_event(message) -> str:
+    name, data = message[0], message[1]
+    lines = [f"event: {name}"]
+    if len(message) > 2:
+        lines.append(f"id: {message[2]}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Server-sent event stream for one client, with a keep-alive comment when
+# nothing happened for HEARTBEAT_SECONDS
+async def event_stream(request, subscriber):
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(
+                    subscriber.queue.get(), HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                break
+            yield format_event(message)
+    finally:
+        event_broker.unsubscribe(subscriber)
+
+
+def do_snapshot(obj):
+    # Only attributes already loaded: no SQL from inside a flush
+    return {
+        column.key: obj.__dict__[column.key]
+        for column in do_columns
+        if column.key in obj.__dict__
+    }
+
+
+# DO rows written by a flush, kept until the transaction commits
+@event.listens_for(Session, "after_flush")
+def collect_do_events(session, flush_context):
+    pending = session.info.setdefault("do_events", [])
+    for obj in session.new:
+        if isinstance(obj, models.Add_Do):
+            pending.append(("created", do_snapshot(obj), obj.user_id))
+    for obj in session.dirty:
+        if isinstance(obj, models.Add_Do) and session.is_modified(obj):
+            pending.append(("updated", do_snapshot(obj), obj.user_id))
+    for obj in session.deleted:
+        if isinstance(obj, models.Add_Do):
+            pending.append(("deleted", {"do_id": obj.do_id}, obj.user_id))
+
+
+# Bulk INSERT / UPDATE / DELETE statements carry no rows to report; the
+# entities they touched are sent as invalidations instead
+@event.listens_for(Session, "do_orm_execute")
+def collect_bulk_event_tables(orm_execute_state):
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        bulk = orm_execute_state.session.info.setdefault("event_bulk_tables", set())
+        bulk.add(orm_execute_state.statement.table.name)
+
+
+# Commit hook: one "do" event per DO row written, then one "invalidate"
+# event naming the master-data entities (and DOs, for bulk writes) changed
+def publish_committed_events(session, tables):
+    do_events = session.info.pop("do_events", None) or []
+    bulk_tables = session.info.pop("event_bulk_tables", None) or set()
+    owner = owner_id(session)
+    for action, data, row_owner in do_events:
+        event_broker.publish(
+            "do", {"action": action, **data}, row_owner if owner is None else owner
+        )
+    entities = {
+        ENTITY_BY_TABLE[table]
+        for table in tables
+        if table in ENTITY_BY_TABLE
+        and (table != models.Add_Do.__tablename__ or table in bulk_tables)
+    }
+    if entities:
+        event_broker.publish("invalidate", {"entities": sorted(entities)}, owner)
+
+
+commit_hooks.append(publish_committed_events)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending_events(session):
+    session.info.pop("do_events", None)
+    session.info.pop("event_bulk_tables", None)
@@ -0,0 +1,19 @@
+from fastapi import HTTPException, status
+
+
+# The columns of `columns` named in `fields` (?fields=a,b,c), in their usual
+# order; all of them when no fields are given. Unknown names are refused
+# with the list of known ones.
+def select_fields(columns, fields: str = None):
+    names = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    if not names:
+        return columns
+    known = [column.key for column in columns]
+    unknown = sorted(names.difference(known))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields {', '.join(unknown)}, "
+            f"expected some of {', '.join(known)}",
+        )
+    return tuple(column for column in columns if column.key in names)
@@ -0,0 +1,165 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuit open for {host}, retry in {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+# Opens after `failure_threshold` consecutive failures, rejects calls for
+# `reset_timeout` seconds, then lets a single trial call through (half-open).
+# The trial's outcome closes the circuit again or re-opens it.
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    # Seconds until a call may be attempted, 0 if it may go now
+    def before_call(self) -> float:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    return remaining
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.trial_in_flight:
+                self.rejected += 1
+                return self.reset_timeout
+            self.trial_in_flight = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+
+# Shared client for outbound HTTP calls: keep-alive connection pool,
+# connect/read timeouts on every request and one circuit breaker per host.
+# Connection errors, timeouts and 5xx responses count as failures.
+class OutboundClient:
+    def __init__(
+        self,
+        connect_timeout: float = 3,
+        read_timeout: float = 10,
+        pool_maxsize: int = 10,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            connect_timeout=settings.outbound_connect_timeout,
+            read_timeout=settings.outbound_read_timeout,
+            failure_threshold=settings.outbound_failure_threshold,
+            reset_timeout=settings.outbound_reset_timeout,
+        )
+
+    def breaker_for(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self.breakers[host] = breaker
+            return breaker
+
+    def request(self, method: str, url: str, **kwargs):
+        host = urlparse(url).netloc
+        breaker = self.breaker_for(host)
+        wait = breaker.before_call()
+        if wait > 0:
+            raise CircuitOpenError(host, wait)
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self.breakers)
+        return {
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "hosts": {host: breaker.stats() for host, breaker in breakers.items()},
+        }
+
+
+outbound_client = OutboundClient.from_settings()
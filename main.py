@@ -1,7 +1,22 @@
-import os
-from fastapi import FastAPI, Depends, HTTPException, Request, status, Header
+import time
+
+# Start of import, for the import-to-ready startup time
+IMPORT_STARTED_AT = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    status,
+    Header,
+)
 from pydantic import BaseModel
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 import models
 from schemas import (
     AddRiceMillBase,
@@ -19,6 +34,9 @@ from schemas import (
 )
 from util import (
     add_to_blacklist,
+    CurrentUser,
+    check_ids_exist,
+    get_admin_user,
     get_current_user,
     get_user_from_token,
     hash_password,
@@ -29,19 +47,120 @@ from util import (
 )
 import schemas
 from models import Add_Rice_Mill, Transporter, Permission, User, Role
-from database import engine, Base, get_db
-from datetime import datetime, timedelta
+from queries import (
+    agreement_columns,
+    audit_log_columns,
+    broker_columns,
+    party_columns,
+    dhan_awak_columns,
+    do_balance_columns,
+    query_warehouse_deposit_totals,
+    rice_deposite_columns,
+    stock_level_columns,
+    byproduct_sale_columns,
+    query_byproduct_rollup,
+    stock_movement_columns,
+    query_do_with_names,
+    query_truck_with_recent_dos,
+    rice_mill_columns,
+    society_columns,
+    transporter_columns,
+    do_columns,
+    do_with_names_columns,
+    truck_columns,
+    truck_with_transporter_columns,
+    agreement_with_mill_columns,
+    kochia_with_mill_columns,
+    ware_house_columns,
+)
+from database import (
+    ReadSessionLocal,
+    SessionLocal,
+    engine,
+    get_db,
+    get_pool_stats,
+    get_read_db,
+    warm_pool,
+)
+from config import settings
+from create_tables import create_tables
+from datetime import date, datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from compression import CompressionMiddleware, compressed_body_cache
+from cache import cached_route, warm_route_caches
+from cache_backends import cache_backend
+from audit import audit_buffer
+from notifications import notifier
+from http_client import outbound_client
+from tokens import token_verifier
+from typeahead import TYPEAHEAD_SOURCES, typeahead_index
+import scoping  # noqa: F401  scopes request sessions to the current user
+import deletes
+from sync import SYNC_ENTITIES, changes_since
+from events import event_broker, event_stream
+from fieldsets import select_fields
+from batch import BATCH_ENTITIES, BATCH_MAX_IDS, fetch_by_ids
+from dhan_awak import record_arrivals, reverse_arrival
+from stock import record_movements, signed_quantity, take_all_snapshots
+from rice_deposite import record_deposits
+from byproducts import byproduct_partitions, record_sales
+from seasons import (
+    archive_season,
+    assign_season,
+    check_no_overlap,
+    check_season_open,
+    get_season,
+    resolve_season,
+)
 from typing import List, Optional
 from datetime import datetime
 
-# Get the current time
-current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
+logger = logging.getLogger(__name__)
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-app = FastAPI()
+startup_stats = {}
+
+
+# Startup: optional schema creation, then open pool connections and fill the
+# reference route caches so the first requests are served warm. Shutdown:
+# end the event streams, write out buffered audit entries and pending
+# notifications.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started_at = time.perf_counter()
+    startup_stats["import_seconds"] = round(started_at - IMPORT_STARTED_AT, 4)
+    if settings.create_tables_on_startup:
+        create_tables()
+    try:
+        warm_pool(settings.warm_pool_connections)
+        if settings.warm_caches_on_startup:
+            with ReadSessionLocal() as db:
+                users = (
+                    db.query(User)
+                    .order_by(User.id.desc())
+                    .limit(settings.warm_cache_users)
+                    .all()
+                )
+            startup_stats["routes_warmed"] = await warm_route_caches(
+                app, ReadSessionLocal, [CurrentUser.from_user(user) for user in users]
+            )
+            typeahead_index.build_all()
+    except Exception:
+        # Serve anyway; requests connect and fill the caches themselves
+        logger.exception("Startup warm-up failed")
+    ready_at = time.perf_counter()
+    startup_stats["warmup_seconds"] = round(ready_at - started_at, 4)
+    startup_stats["import_to_ready_seconds"] = round(ready_at - IMPORT_STARTED_AT, 4)
+    logger.info("Ready in %.3fs", startup_stats["import_to_ready_seconds"])
+    yield
+    event_broker.close()
+    audit_buffer.close()
+    notifier.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -52,12 +171,10 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Compress large JSON payloads (mill / society / truck lists repeat a lot)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-API_KEY = os.getenv("SECRET_KEY")
+API_KEY = settings.secret_key
 
 
 # Dependency to check API key
@@ -70,10 +187,6 @@ async def api_key_header(api_key: Optional[str] = Header(default=None)):
     return api_key
 
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
-
-
 @app.post("/users/", tags=["Authentication"])
 def create_user(user: AddUserBase, db: Session = Depends(get_db)):
     hashed_password = hash_password(user.password)
@@ -103,9 +216,11 @@ def create_user(user: AddUserBase, db: Session = Depends(get_db)):
 
 # Get User Data
 @app.get("/users/{user_id}", tags=["Authentication"])
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db)):
     # Query the database for the user by ID
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = (
+        db.query(User.name, User.email, User.role).filter(User.id == user_id).first()
+    )
 
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -119,7 +234,7 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
 def create_role(
     role: RoleBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     role_exists = db.query(Role).filter(Role.role_name == role.role_name).first()
     if role_exists:
@@ -144,9 +259,9 @@ def create_role(
     response_model=List[RoleBase],
     tags=["Get All User Role and Permissions "],
 )
-async def get_all_roles(db: Session = Depends(get_db)):
-    # Retrieve all rice mills
-    roles = db.query(Role).all()
+async def get_all_roles(db: Session = Depends(get_read_db)):
+    # Retrieve all roles
+    roles = db.query(Role.id, Role.role_name).all()
 
     return roles
 
@@ -167,7 +282,8 @@ def login_user(request: LoginRequest, db: Session = Depends(get_db)):
     )
 
     # Send Telegram message
-    message = f"User logged in:\nEmail: {user.email}\nTime: {current_time}"
+    login_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    message = f"User logged in:\nEmail: {user.email}\nTime: {login_time}"
     send_telegram_message(message)
 
     return {
@@ -187,12 +303,12 @@ def logout_user(request: Request, db: Session = Depends(get_db)):
     # Extract the token from the Authorization header
     token = auth_header.split(" ")[1]
 
+    # Get the user information from the token (decoded once, then cached)
+    user_info = get_user_from_token(token)
+
     # Check if the token is blacklisted
     if not is_token_blacklisted(token, db):
         add_to_blacklist(token, db)
-
-    # Get the user information from the token
-    user_info = get_user_from_token(token)
     user_name = user_info.get(
         "name", "Unknown User"
     )  # Get the user's name from the decoded token
@@ -210,10 +326,10 @@ def logout_user(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/roles-and-permissions", tags=["User Role and Permissions"])
-def get_roles_and_permissions(db: Session = Depends(get_db)):
+def get_roles_and_permissions(db: Session = Depends(get_read_db)):
     # Fetch all roles and permissions
-    roles = db.query(Role).all()
-    permissions = db.query(Permission).all()
+    roles = db.query(Role.id, Role.role_name).all()
+    permissions = db.query(Permission.role_id, Permission.permissions).all()
 
     # Convert roles to a list of role names
     role_names = [role.role_name for role in roles]
@@ -256,12 +372,57 @@ def update_permissions(
     return {"message": "Permissions updated successfully"}
 
 
+# Cache hit-rate stats
+@app.get("/cache-stats/", tags=["Cache"])
+async def get_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return {
+        "route_cache": cache_backend.stats(),
+        "compressed_responses": compressed_body_cache.stats(),
+    }
+
+
+# Session / connection pool usage on the request path
+@app.get("/pool-stats/", tags=["Cache"])
+async def get_pool_usage(current_user: CurrentUser = Depends(get_current_user)):
+    return get_pool_stats()
+
+
+# Verified-token cache
+@app.get("/token-cache-stats/", tags=["Cache"])
+async def get_token_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return token_verifier.stats()
+
+
+# Import-to-ready time of this worker and what the startup warm-up did
+@app.get("/startup-stats/", tags=["Cache"])
+async def get_startup_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return startup_stats
+
+
+# Telegram queue / digest counters
+@app.get("/notification-stats/", tags=["Cache"])
+async def get_notification_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return notifier.stats()
+
+
+# Outbound HTTP client timeouts and circuit breakers
+@app.get("/outbound-stats/", tags=["Cache"])
+async def get_outbound_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return outbound_client.stats()
+
+
+# Audit log write-behind buffer
+@app.get("/audit-stats/", tags=["Audit Log"])
+async def get_audit_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return audit_buffer.stats()
+
+
 # Add Rice Mill
 @app.post("/add-rice-mill/", response_model=AddRiceMillBase, tags=["Rice Mill"])
 async def add_rice_mill(
     addricemill: AddRiceMillBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Check if a rice mill with the same name exists
     if (
@@ -301,16 +462,21 @@ async def add_rice_mill(
 
 # To get specific rice mill data
 @app.get(
-    "/get-rice-mill/{rice_mill_id}", response_model=AddRiceMillBase, tags=["Rice Mill"]
+    "/get-rice-mill/{rice_mill_id}",
+    response_model=schemas.SparseRiceMill,
+    response_model_exclude_unset=True,
+    tags=["Rice Mill"],
 )
+@cached_route("rice_mills")
 async def get_rice_mill(
     rice_mill_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the rice mill by ID
     rice_mill = (
-        db.query(Add_Rice_Mill)
+        db.query(*select_fields(rice_mill_columns, fields))
         .filter(Add_Rice_Mill.rice_mill_id == rice_mill_id)
         .first()
     )
@@ -327,14 +493,19 @@ async def get_rice_mill(
 
 # To get all rice mill data
 @app.get(
-    "/get-all-rice-mills/", response_model=List[AddRiceMillBase], tags=["Rice Mill"]
+    "/get-all-rice-mills/",
+    response_model=List[schemas.SparseRiceMill],
+    response_model_exclude_unset=True,
+    tags=["Rice Mill"],
 )
+@cached_route("rice_mills")
 async def get_all_rice_mills(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve all rice mills
-    rice_mills = db.query(Add_Rice_Mill).all()
+    rice_mills = db.query(*select_fields(rice_mill_columns, fields)).all()
 
     return rice_mills
 
@@ -349,7 +520,7 @@ async def update_rice_mill(
     rice_mill_id: int,
     update_data: UpdateRiceMillBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the rice mill by ID
     rice_mill = (
@@ -391,7 +562,7 @@ async def update_rice_mill(
 async def delete_rice_mill(
     rice_mill_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Find the rice mill by ID
     rice_mill = (
@@ -407,17 +578,15 @@ async def delete_rice_mill(
             detail="Rice Mill not found",
         )
 
-    # Delete the rice mill entry
-    db.delete(rice_mill)
-    db.commit()
+    # Delete the rice mill with its agreements, kochia and DOs
+    rice_mill_name = rice_mill.rice_mill_name
+    deleted = deletes.delete_rice_mill(db, rice_mill_id)
 
     # Prepare and send the message
-    message = (
-        f"User {current_user.name} deleted the rice mill: {rice_mill.rice_mill_name}"
-    )
+    message = f"User {current_user.name} deleted the rice mill: {rice_mill_name}"
     send_telegram_message(message)
 
-    return {"message": "Rice Mill deleted successfully"}
+    return {"message": "Rice Mill deleted successfully", "deleted": deleted}
 
 
 # Add Transporter
@@ -425,7 +594,7 @@ async def delete_rice_mill(
 async def add_transporter(
     transporter: TransporterBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Check if a transporter with the same name exists
     if (
@@ -461,17 +630,20 @@ async def add_transporter(
 
 @app.get(
     "/get-transporter/{transporter_id}",
-    response_model=TransporterBase,
+    response_model=schemas.SparseTransporter,
+    response_model_exclude_unset=True,
     tags=["Transporter"],
 )
+@cached_route("transporters")
 async def get_transporter(
     transporter_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the transporter by ID
     transporter = (
-        db.query(Transporter)
+        db.query(*select_fields(transporter_columns, fields))
         .filter(Transporter.transporter_id == transporter_id)
         .first()
     )
@@ -488,15 +660,18 @@ async def get_transporter(
 
 @app.get(
     "/get-all-transporters",
-    response_model=List[TransporterBase],
+    response_model=List[schemas.SparseTransporter],
+    response_model_exclude_unset=True,
     tags=["Transporter"],
 )
+@cached_route("transporters")
 async def get_all_transporters(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve all transporters
-    transporters = db.query(Transporter).all()
+    transporters = db.query(*select_fields(transporter_columns, fields)).all()
 
     return transporters
 
@@ -510,7 +685,7 @@ async def update_transporter(
     transporter_id: int,
     update_data: TransporterBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the transporter by ID
     transporter = (
@@ -550,7 +725,7 @@ async def update_transporter(
 async def delete_transporter(
     transporter_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Find the transporter by ID
     transporter = (
@@ -566,15 +741,15 @@ async def delete_transporter(
             detail="Transporter not found",
         )
 
-    # Delete the transporter entry
-    db.delete(transporter)
-    db.commit()
+    # Delete the transporter with its trucks
+    transporter_name = transporter.transporter_name
+    deleted = deletes.delete_transporter(db, transporter_id)
 
     # Prepare and send the message
-    message = f"User {current_user.name} deleted the transporter: {transporter.transporter_name}"
+    message = f"User {current_user.name} deleted the transporter: {transporter_name}"
     send_telegram_message(message)
 
-    return {"message": "Transporter deleted successfully"}
+    return {"message": "Transporter deleted successfully", "deleted": deleted}
 
 
 # create the post route for truck
@@ -587,10 +762,15 @@ async def delete_transporter(
 async def add_new_truck(
     truck: TruckBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_truck = (
-        db.query(models.Truck).filter(models.Truck.truck_id == truck.truck_id).first()
+        db.query(models.Truck.truck_id)
+        .filter(
+            models.Truck.truck_number_normalized
+            == models.normalize_truck_number(truck.truck_number)
+        )
+        .first()
     )
 
     if existing_truck:
@@ -599,7 +779,11 @@ async def add_new_truck(
             detail="Truck with this Number already exists",
         )
 
-    db_truck = models.Truck(**truck.dict())
+    # Scoped to the caller: another user's transporter reads as missing
+    check_ids_exist(
+        db, models.Transporter.transporter_id, [truck.transport_id], "Transporter"
+    )
+    db_truck = models.Truck(**truck.dict(), user_id=current_user.id)
     db.add(db_truck)
     db.commit()
     db.refresh(db_truck)
@@ -616,14 +800,25 @@ async def add_new_truck(
 
 
 # create the get route for truck
-@app.get("/get-truck/{truck_id}", response_model=TruckBase, tags=["Truck"])
+@app.get(
+    "/get-truck/{truck_id}",
+    response_model=schemas.SparseTruck,
+    response_model_exclude_unset=True,
+    tags=["Truck"],
+)
+@cached_route("trucks")
 async def get_truck(
     truck_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the Truck by ID
-    truck = db.query(models.Truck).filter(models.Truck.truck_id == truck_id).first()
+    truck = (
+        db.query(*select_fields(truck_columns, fields))
+        .filter(models.Truck.truck_id == truck_id)
+        .first()
+    )
 
     # Check if the Truck exists
     if not truck:
@@ -635,13 +830,51 @@ async def get_truck(
     return truck
 
 
+# Look a truck up by number in any spelling ("cg04ab1234", "CG04 AB 1234"),
+# with its transporter and most recent DOs
+@app.get(
+    "/truck-by-number/{truck_number}",
+    response_model=schemas.TruckWithRecentDos,
+    tags=["Truck"],
+)
+@cached_route("truck_lookup")
+async def get_truck_by_number(
+    truck_number: str,
+    recent_dos: int = Query(10, ge=0, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    rows = query_truck_with_recent_dos(
+        db, models.normalize_truck_number(truck_number), max(recent_dos, 1)
+    ).all()
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Truck not found",
+        )
+
+    truck = rows[0]
+    return {
+        "truck_id": truck.truck_id,
+        "truck_number": truck.truck_number,
+        "transport_id": truck.transport_id,
+        "transporter_name": truck.transporter_name,
+        "transporter_phone_number": truck.transporter_phone_number,
+        "recent_dos": [
+            {column.key: getattr(row, column.key) for column in do_columns}
+            for row in rows[:recent_dos]
+            if row.do_id is not None
+        ],
+    }
+
+
 # # create the update route for truck
 @app.put("/update-truck/{truck_id}", response_model=TruckBase, tags=["Truck"])
 async def update_truck(
     truck_id: int,
     Truck: TruckBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the Truck by ID
     truck = db.query(models.Truck).filter(models.Truck.truck_id == truck_id).first()
@@ -653,6 +886,24 @@ async def update_truck(
             detail="Truck not found",
         )
 
+    duplicate_truck = (
+        db.query(models.Truck.truck_id)
+        .filter(
+            models.Truck.truck_number_normalized
+            == models.normalize_truck_number(Truck.truck_number),
+            models.Truck.truck_id != truck_id,
+        )
+        .first()
+    )
+    if duplicate_truck:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Truck with this Number already exists",
+        )
+
+    check_ids_exist(
+        db, models.Transporter.transporter_id, [Truck.transport_id], "Transporter"
+    )
     # Update the Truck data in another way
     truck.transport_id = Truck.transport_id
     truck.truck_number = Truck.truck_number
@@ -668,7 +919,7 @@ async def update_truck(
 async def delete_truck(
     truck_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the Truck by ID
     truck = db.query(models.Truck).filter(models.Truck.truck_id == truck_id).first()
@@ -689,15 +940,23 @@ async def delete_truck(
 
 @app.get(
     "/get-all-trucks/",
-    response_model=List[TruckWithTransporter],
+    response_model=List[schemas.SparseTruckWithTransporter],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Truck"],
 )
+@cached_route("trucks")
 async def get_all_truck_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    trucks = db.query(models.Truck).all()
+    trucks = (
+        db.query(*select_fields(truck_with_transporter_columns, fields))
+        .select_from(models.Truck)
+        .join(models.Truck.transporter)
+        .all()
+    )
 
     # Check if the Truck exists
     if not trucks:
@@ -706,17 +965,7 @@ async def get_all_truck_data(
             detail="Truck not found",
         )
 
-    result = []
-    for truck in trucks:
-        result.append(
-            TruckWithTransporter(
-                truck_number=truck.truck_number,
-                transporter_name=truck.transporter.transporter_name,
-                transport_id=truck.transport_id,
-                truck_id=truck.truck_id,
-            )
-        )
-    return result
+    return trucks
 
 
 # @app.get(
@@ -744,7 +993,7 @@ async def get_all_truck_data(
 async def add_society(
     addsociety: schemas.SocietyBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_society = (
         db.query(models.Society)
@@ -775,33 +1024,39 @@ async def add_society(
 
 @app.get(
     "/get-all-societies/",
-    response_model=List[schemas.SocietyBase],
+    response_model=List[schemas.SparseSociety],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Society"],
 )
+@cached_route("societies")
 async def get_all_society_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    societys = db.query(models.Society).all()
+    societys = db.query(*select_fields(society_columns, fields)).all()
 
     return societys
 
 
 @app.get(
     "/get-societies/{society_id}",
-    response_model=schemas.SocietyBase,
+    response_model=schemas.SparseSociety,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Society"],
 )
+@cached_route("societies")
 async def get_societies_by_user_id(
     society_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Correctly filter societies by society_id
     societies = (
-        db.query(models.Society)
+        db.query(*select_fields(society_columns, fields))
         .filter(models.Society.society_id == society_id)  # Fix comparison here
         .first()
     )
@@ -825,7 +1080,7 @@ async def update_society_data(
     society_id: int,
     update_addsociety: schemas.SocietyBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Retrieve the society by ID
     society = (
@@ -868,7 +1123,7 @@ async def update_society_data(
 async def delete_society_data(
     society_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     society = (
         db.query(models.Society).filter(models.Society.society_id == society_id).first()
@@ -876,13 +1131,13 @@ async def delete_society_data(
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
 
-    db.delete(society)
-    db.commit()
+    society_name = society.society_name
+    deleted = deletes.delete_society(db, society_id)
 
-    message = f"User {current_user.name} deleted the Society: {society.society_name}"
+    message = f"User {current_user.name} deleted the Society: {society_name}"
     send_telegram_message(message)
 
-    return {"message": "Society deleted successfully"}
+    return {"message": "Society deleted successfully", "deleted": deleted}
 
 
 # Add Agreement
@@ -895,7 +1150,7 @@ async def delete_society_data(
 async def add_agreement(
     addagreement: schemas.AgreementBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_agreement = (
         db.query(models.Agreement)
@@ -907,6 +1162,7 @@ async def add_agreement(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Agreement with this name already exists",
         )
+    addagreement.season_id = resolve_season(db, addagreement.season_id, date.today())
     db_agreement = models.Agreement(
         **addagreement.dict(),
         user_id=current_user.id,
@@ -929,52 +1185,47 @@ async def add_agreement(
 
 @app.get(
     "/get-all-agreements/",
-    response_model=List[schemas.AgreementBase],
+    response_model=List[schemas.SparseAgreement],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     # dependencies=[Depends(api_key_header)],
     tags=["Agreement"],
 )
+@cached_route("agreements")
 async def get_all_agreements_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     agreements = (
-        db.query(models.Agreement)
-        .options(joinedload(models.Agreement.addricemill))
+        db.query(*select_fields(agreement_with_mill_columns, fields))
+        .select_from(models.Agreement)
+        .join(models.Agreement.addricemill)
         .all()
     )
 
-    result = []
-    for agreement in agreements:
-        result.append(
-            schemas.RiceMillWithAgreement(
-                rice_mill_id=agreement.rice_mill_id,
-                agreement_number=agreement.agreement_number,
-                type_of_agreement=agreement.type_of_agreement,
-                lot_from=agreement.lot_from,
-                lot_to=agreement.lot_to,
-                agremennt_id=agreement.agremennt_id,
-                rice_mill_name=agreement.addricemill.rice_mill_name,
-            )
-        )
-
-    return result
+    return agreements
 
 
 @app.get(
     "/get-agreement/{agreement_id}",
-    response_model=schemas.RiceMillWithAgreement,
+    response_model=schemas.SparseAgreement,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Agreement"],
 )
+@cached_route("agreements")
 async def get_agreement_by_id(
     agreement_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Query the Agreement table and filter by agreement_id
     agreement = (
-        db.query(models.Agreement)
+        db.query(*select_fields(agreement_with_mill_columns, fields))
+        .select_from(models.Agreement)
+        .join(models.Agreement.addricemill)
         .filter(models.Agreement.agremennt_id == agreement_id)
         .first()
     )
@@ -987,15 +1238,7 @@ async def get_agreement_by_id(
         )
 
     # Return the agreement with rice mill data
-    return schemas.RiceMillWithAgreement(
-        rice_mill_id=agreement.rice_mill_id,
-        agreement_number=agreement.agreement_number,
-        type_of_agreement=agreement.type_of_agreement,
-        lot_from=agreement.lot_from,
-        lot_to=agreement.lot_to,
-        agremennt_id=agreement.agremennt_id,
-        rice_mill_name=agreement.addricemill.rice_mill_name,
-    )
+    return agreement
 
 
 @app.put(
@@ -1009,7 +1252,7 @@ async def update_agreement_data(
     agreement_id: int,
     updated_agreement_data: schemas.AgreementBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_agreement = (
         db.query(models.Agreement)
@@ -1021,13 +1264,15 @@ async def update_agreement_data(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Agreement with this id does not exist",
         )
-    db.query(models.Agreement).filter(
-        models.Agreement.agremennt_id == agreement_id
-    ).update(updated_agreement_data.dict())
+    check_season_open(db, existing_agreement.season_id)
+    updated_agreement_data.season_id = resolve_season(
+        db,
+        updated_agreement_data.season_id,
+        (existing_agreement.created_at or datetime.now()).date(),
+    )
+    for field, value in updated_agreement_data.dict(exclude={"agremennt_id"}).items():
+        setattr(existing_agreement, field, value)
     db.commit()
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return updated_agreement_data
 
 
@@ -1039,7 +1284,7 @@ async def update_agreement_data(
 )
 async def delete_agreement_data(
     agreement_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     existing_agreement = (
@@ -1052,12 +1297,10 @@ async def delete_agreement_data(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Agreement with this id does not exist",
         )
-    db.delete(existing_agreement)
-    db.commit()
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
-    return {"message": "Agreement deleted successfully"}
+    check_season_open(db, existing_agreement.season_id)
+    # Delete the agreement with its DOs
+    deleted = deletes.delete_agreement(db, agreement_id)
+    return {"message": "Agreement deleted successfully", "deleted": deleted}
 
 
 @app.post(
@@ -1069,7 +1312,7 @@ async def delete_agreement_data(
 async def add_ware_house(
     warehouse: schemas.WareHouseTransporting,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_warehouse = (
         db.query(models.ware_house_transporting)
@@ -1110,33 +1353,39 @@ async def add_ware_house(
 
 @app.get(
     "/get-ware-house-data/",
-    response_model=List[schemas.WareHouseTransporting],
+    response_model=List[schemas.SparseWareHouse],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Warehouse"],
 )
+@cached_route("warehouses")
 async def get_all_ware_house_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    ware_house_db = db.query(models.ware_house_transporting).all()
+    ware_house_db = db.query(*select_fields(ware_house_columns, fields)).all()
 
     return ware_house_db
 
 
 @app.get(
     "/get-ware-house/{ware_house_id}/",
-    response_model=schemas.WareHouseTransporting,
+    response_model=schemas.SparseWareHouse,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Warehouse"],
 )
+@cached_route("warehouses")
 async def get_ware_house_data_by_id(
     ware_house_id: int,  # Adding id as a path parameter
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Query the warehouse data by ID
     ware_house_db = (
-        db.query(models.ware_house_transporting)
+        db.query(*select_fields(ware_house_columns, fields))
         .filter(models.ware_house_transporting.ware_house_id == ware_house_id)
         .first()
     )
@@ -1161,7 +1410,7 @@ async def update_ware_house(
     ware_house_id: int,
     updated_ware_house: schemas.WareHouseTransporting,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     db_ware_house = (
         db.query(models.ware_house_transporting)
@@ -1173,13 +1422,9 @@ async def update_ware_house(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ware House with this transporting rate not found",
         )
-    db.query(models.ware_house_transporting).filter(
-        models.ware_house_transporting.ware_house_id == ware_house_id
-    ).update(updated_ware_house.dict())
+    for field, value in updated_ware_house.dict(exclude={"ware_house_id"}).items():
+        setattr(db_ware_house, field, value)
     db.commit()
-
-    message = f"New action performed by user.\nName:  "
-    send_telegram_message(message)
     return {"message": "Updated successfully"}
 
 
@@ -1192,7 +1437,7 @@ async def update_ware_house(
 async def delete_ware_house(
     ware_house_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     db_ware_house = (
         db.query(models.ware_house_transporting)
@@ -1206,9 +1451,6 @@ async def delete_ware_house(
         )
     db.delete(db_ware_house)
     db.commit()
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return {"message": "Deleted successfully"}
 
 
@@ -1222,7 +1464,7 @@ async def delete_ware_house(
 async def add_kochia(
     addkochia: schemas.KochiaBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_kochia = (
         db.query(models.Kochia)
@@ -1242,55 +1484,53 @@ async def add_kochia(
     db.add(db_kochia)
     db.commit()
     db.refresh(db_kochia)
-
-    message = f"New action performed by user.\nName:"
-    send_telegram_message(message)
     return db_kochia
 
 
 @app.get(
     "/kochia-data/",
-    response_model=List[schemas.KochiaWithRiceMill],
+    response_model=List[schemas.SparseKochia],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Kochia"],
 )
+@cached_route("kochia")
 async def get_all_kochia_data(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     kochias = (
-        db.query(models.Kochia).options(joinedload(models.Kochia.addricemill)).all()
-    )
-
-    result = []
-    for kochia in kochias:
-        result.append(
-            schemas.KochiaWithRiceMill(
-                rice_mill_name_id=kochia.rice_mill_name_id,
-                kochia_name=kochia.kochia_name,
-                kochia_phone_number=kochia.kochia_phone_number,
-                kochia_id=kochia.kochia_id,
-                rice_mill_name=kochia.addricemill.rice_mill_name,
-            )
-        )
+        db.query(*select_fields(kochia_with_mill_columns, fields))
+        .select_from(models.Kochia)
+        .join(models.Kochia.addricemill)
+        .all()
+    )
 
-    return result
+    return kochias
 
 
 @app.get(
     "/kochia-data-by-id/{kochia_id}/",
-    response_model=schemas.KochiaWithRiceMill,
+    response_model=schemas.SparseKochia,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["Kochia"],
 )
+@cached_route("kochia")
 async def get_kochia_data_by_id(
     kochia_id: int,  # Get the kochia_id as a path parameter
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     # Query the Kochia data using the kochia_id
     kochia = (
-        db.query(models.Kochia).filter(models.Kochia.kochia_id == kochia_id).first()
+        db.query(*select_fields(kochia_with_mill_columns, fields))
+        .select_from(models.Kochia)
+        .join(models.Kochia.addricemill)
+        .filter(models.Kochia.kochia_id == kochia_id)
+        .first()
     )
 
     # If no Kochia data is found, raise a 404 error
@@ -1301,13 +1541,7 @@ async def get_kochia_data_by_id(
         )
 
     # Return the desired data structure
-    return schemas.KochiaWithRiceMill(
-        rice_mill_name_id=kochia.rice_mill_name_id,
-        kochia_name=kochia.kochia_name,
-        kochia_phone_number=kochia.kochia_phone_number,
-        kochia_id=kochia.kochia_id,
-        rice_mill_name=kochia.addricemill.rice_mill_name,
-    )
+    return kochia
 
 
 @app.put(
@@ -1321,7 +1555,7 @@ async def update_kochia(
     kochia_id: int,
     kochia_update: schemas.KochiaBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_kochia = (
         db.query(models.Kochia).filter(models.Kochia.kochia_id == kochia_id).first()
@@ -1331,13 +1565,9 @@ async def update_kochia(
             status_code=status.HTTP_404_NOT_FOUND, detail="Kochia not found"
         )
 
-    db.query(models.Kochia).filter(models.Kochia.kochia_id == kochia_id).update(
-        kochia_update.dict()
-    )
+    for field, value in kochia_update.dict(exclude={"kochia_id"}).items():
+        setattr(existing_kochia, field, value)
     db.commit()
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return kochia_update
 
 
@@ -1349,7 +1579,7 @@ async def update_kochia(
 )
 async def delete_kochia(
     kochia_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     existing_kochia = (
@@ -1363,9 +1593,6 @@ async def delete_kochia(
     db.delete(existing_kochia)
     db.commit()
 
-    message = f"New action performed by user.\nName:"
-    send_telegram_message(message)
-
 
 # Party
 @app.post(
@@ -1376,7 +1603,7 @@ async def delete_kochia(
 )
 async def add_party(
     party: schemas.PartyBase,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     existing_party = (
@@ -1395,9 +1622,6 @@ async def add_party(
     )
     db.add(db_add_party)
     db.commit()
-
-    message = f"New action performed by user.\nName:  "
-    send_telegram_message(message)
     return party
 
 
@@ -1407,10 +1631,12 @@ async def add_party(
     response_model=List[schemas.PartyBase],
     status_code=status.HTTP_200_OK,
 )
+@cached_route("parties")
 async def get_party_data(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
-    db_party_data = db.query(models.Party).distinct().all()
+    db_party_data = db.query(*party_columns).distinct().all()
     return db_party_data
 
 
@@ -1420,12 +1646,15 @@ async def get_party_data(
     response_model=schemas.PartyBase,  # Since it's fetching one party, you can remove `List[]`
     status_code=status.HTTP_200_OK,
 )
+@cached_route("parties")
 async def get_party_data(
     party_id: int,  # Add party_id as a path parameter
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
-    db_party = db.query(models.Party).filter(models.Party.party_id == party_id).first()
+    db_party = (
+        db.query(*party_columns).filter(models.Party.party_id == party_id).first()
+    )
 
     if not db_party:
         raise HTTPException(
@@ -1446,7 +1675,7 @@ async def update_party(
     party_id: int,
     updated_party_data: schemas.PartyBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_party = (
         db.query(models.Party).filter(models.Party.party_id == party_id).first()
@@ -1456,13 +1685,10 @@ async def update_party(
             status_code=status.HTTP_404_NOT_FOUND, detail="Party not found"
         )
 
-    db.query(models.Party).filter(models.Party.party_id == party_id).update(
-        updated_party_data.dict()
-    )
+    for field, value in updated_party_data.dict(exclude={"party_id"}).items():
+        setattr(existing_party, field, value)
 
     db.commit()
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return existing_party
 
 
@@ -1474,7 +1700,7 @@ async def update_party(
 )
 async def delete_party(
     party_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     existing_party = (
@@ -1488,9 +1714,6 @@ async def delete_party(
     db.delete(existing_party)
     db.commit()
 
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
-
 
 # broker
 @app.post(
@@ -1502,7 +1725,7 @@ async def delete_party(
 async def add_broker(
     broker: schemas.BrokerBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     existing_broker = (
         db.query(models.brokers)
@@ -1521,9 +1744,6 @@ async def add_broker(
     db.add(db_add_broker)
     db.commit()
     db.refresh(db_add_broker)
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return db_add_broker
 
 
@@ -1533,10 +1753,12 @@ async def add_broker(
     status_code=status.HTTP_200_OK,
     tags=["Broker"],
 )
+@cached_route("brokers")
 async def get_broker_data(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
-    db_broker_data = db.query(models.brokers).distinct().all()
+    db_broker_data = db.query(*broker_columns).distinct().all()
 
     return db_broker_data
 
@@ -1547,14 +1769,15 @@ async def get_broker_data(
     response_model=schemas.BrokerBase,  # Return a single broker
     status_code=status.HTTP_200_OK,
 )
+@cached_route("brokers")
 async def get_broker_data_by_id(
     broker_id: int,  # Broker ID passed as a path parameter
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
     # Query the broker by the provided ID
     db_broker = (
-        db.query(models.brokers).filter(models.brokers.broker_id == broker_id).first()
+        db.query(*broker_columns).filter(models.brokers.broker_id == broker_id).first()
     )
 
     # Raise 404 error if broker is not found
@@ -1577,7 +1800,7 @@ async def update_broker_data(
     broker_id: int,
     update_broker_data: schemas.BrokerBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     broker_data = (
         db.query(models.brokers).filter(models.brokers.broker_id == broker_id).first()
@@ -1587,13 +1810,9 @@ async def update_broker_data(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Broker data not found",
         )
-    db.query(models.brokers).filter(models.brokers.broker_id == broker_id).update(
-        update_broker_data.dict()
-    )
+    for field, value in update_broker_data.dict(exclude={"broker_id"}).items():
+        setattr(broker_data, field, value)
     db.commit()
-
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
     return broker_data
 
 
@@ -1605,7 +1824,7 @@ async def update_broker_data(
 )
 async def delete_broker_data(
     broker_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     broker_data = (
@@ -1619,9 +1838,6 @@ async def delete_broker_data(
     db.delete(broker_data)
     db.commit()
 
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
-
 
 # GET DATA FOR DO FORM
 @app.get(
@@ -1629,29 +1845,34 @@ async def delete_broker_data(
     response_model=schemas.RiceMillData,
     status_code=status.HTTP_200_OK,
 )
+@cached_route("do_form")
 async def get_data(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
-    # Fetch data from different tables
-    rice_mill_data = db.query(models.Add_Rice_Mill).all()
-    agreement_data = db.query(models.Agreement).all()
-    truck_data = db.query(models.Truck).all()
-    society_data = db.query(models.Society).all()
-
+    # Fetch only the columns the DO form needs from each table
     response_data = {
-        "rice_mill_data": [
-            schemas.AddRiceMillBase(**row.__dict__) for row in rice_mill_data
-        ],
-        "agreement_data": [
-            schemas.AgreementBase(**row.__dict__) for row in agreement_data
-        ],
-        "truck_data": [schemas.TruckBase(**row.__dict__) for row in truck_data],
-        "society_data": [schemas.SocietyBase(**row.__dict__) for row in society_data],
+        "rice_mill_data": db.query(*rice_mill_columns).all(),
+        "agreement_data": db.query(*agreement_columns).all(),
+        "truck_data": db.query(*truck_columns).all(),
+        "society_data": db.query(*society_columns).all(),
     }
 
     return response_data
 
 
+# The mill, agreement, society and truck of a DO must be the caller's own
+def check_do_references(db: Session, do: schemas.AddDoBase):
+    check_ids_exist(
+        db, models.Add_Rice_Mill.rice_mill_id, [do.select_mill_id], "Rice mill"
+    )
+    check_ids_exist(
+        db, models.Agreement.agremennt_id, [do.select_argeement_id], "Agreement"
+    )
+    check_ids_exist(db, models.Society.society_id, [do.society_name_id], "Society")
+    check_ids_exist(db, models.Truck.truck_id, [do.truck_number_id], "Truck")
+
+
 # Add Do
 @app.post(
     "/add-do/",
@@ -1662,8 +1883,11 @@ async def get_data(
 async def add_do(
     adddo: schemas.AddDoBase,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
+    # DO numbers are unique per user (the query is scoped): each mill's
+    # numbers come from its own agency, and another user's DOs are not
+    # revealed
     existing_adddo = (
         db.query(models.Add_Do)
         .filter(models.Add_Do.do_number == adddo.do_number)
@@ -1674,6 +1898,8 @@ async def add_do(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Do with this Number already exists",
         )
+    check_do_references(db, adddo)
+    adddo.season_id = resolve_season(db, adddo.season_id, adddo.date)
     db_add_do = models.Add_Do(
         **adddo.dict(),
         user_id=current_user.id,
@@ -1682,81 +1908,56 @@ async def add_do(
     db.commit()
     db.refresh(db_add_do)
 
-    message = f"New action performed by user.\nName: "
-    send_telegram_message(message)
+    rice_mill_name = (
+        db.query(models.Add_Rice_Mill.rice_mill_name)
+        .filter(models.Add_Rice_Mill.rice_mill_id == db_add_do.select_mill_id)
+        .scalar()
+    )
+    notifier.event(
+        "DOs added",
+        rice_mill_name or f"Mill {db_add_do.select_mill_id}",
+        db_add_do.total_weight,
+    )
     return db_add_do
 
 
 @app.get(
     "/do-data/",
-    response_model=List[schemas.AddDoWithAddRiceMillAgreementSocietyTruck],
+    response_model=List[schemas.SparseDo],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["DO"],
 )
+@cached_route("do_data")
 async def get_all_add_do_data(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
-    Add_Dos = (
-        db.query(models.Add_Do)
-        .options(
-            joinedload(models.Add_Do.addricemill),
-            joinedload(models.Add_Do.agreement),
-            joinedload(models.Add_Do.society),
-            joinedload(models.Add_Do.trucks),
-        )
-        .all()
-    )
+    Add_Dos = query_do_with_names(
+        db, select_fields(do_with_names_columns, fields)
+    ).all()
 
-    result = []
-    for Add_Do in Add_Dos:
-        result.append(
-            schemas.AddDoWithAddRiceMillAgreementSocietyTruck(
-                select_mill_id=Add_Do.select_mill_id,
-                date=Add_Do.date,
-                do_number=Add_Do.do_number,
-                select_argeement_id=Add_Do.select_argeement_id,
-                mota_weight=Add_Do.mota_weight,
-                mota_Bardana=Add_Do.mota_Bardana,
-                patla_weight=Add_Do.patla_weight,
-                patla_bardana=Add_Do.patla_bardana,
-                sarna_weight=Add_Do.sarna_weight,
-                sarna_bardana=Add_Do.sarna_bardana,
-                total_weight=Add_Do.total_weight,
-                total_bardana=Add_Do.total_bardana,
-                society_name_id=Add_Do.society_name_id,
-                truck_number_id=Add_Do.truck_number_id,
-                created_at=Add_Do.created_at,
-                rice_mill_name=Add_Do.addricemill.rice_mill_name,
-                agreement_number=Add_Do.agreement.agreement_number,
-                society_name=Add_Do.society.society_name,
-                truck_number=Add_Do.trucks.truck_number,
-                do_id=Add_Do.do_id,
-            )
-        )
-
-    return result
+    return Add_Dos
 
 
 @app.get(
     "/do-data-by-id/{do_id}",
-    response_model=schemas.AddDoWithAddRiceMillAgreementSocietyTruck,
+    response_model=schemas.SparseDo,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     tags=["DO"],
 )
+@cached_route("do_data")
 async def get_add_do_by_id(
     do_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
     # Query the Add_Do data based on the provided ID
     Add_Do = (
-        db.query(models.Add_Do)
-        .options(
-            joinedload(models.Add_Do.addricemill),
-            joinedload(models.Add_Do.agreement),
-            joinedload(models.Add_Do.society),
-            joinedload(models.Add_Do.trucks),
-        )
+        query_do_with_names(db, select_fields(do_with_names_columns, fields))
         .filter(models.Add_Do.do_id == do_id)  # Filter by ID
         .first()  # Retrieve one item
     )
@@ -1768,31 +1969,7 @@ async def get_add_do_by_id(
             detail=f"DO with ID {do_id} not found",
         )
 
-    # Create a response model with the necessary fields
-    result = schemas.AddDoWithAddRiceMillAgreementSocietyTruck(
-        select_mill_id=Add_Do.select_mill_id,
-        date=Add_Do.date,
-        do_number=Add_Do.do_number,
-        select_argeement_id=Add_Do.select_argeement_id,
-        mota_weight=Add_Do.mota_weight,
-        mota_Bardana=Add_Do.mota_Bardana,
-        patla_weight=Add_Do.patla_weight,
-        patla_bardana=Add_Do.patla_bardana,
-        sarna_weight=Add_Do.sarna_weight,
-        sarna_bardana=Add_Do.sarna_bardana,
-        total_weight=Add_Do.total_weight,
-        total_bardana=Add_Do.total_bardana,
-        society_name_id=Add_Do.society_name_id,
-        truck_number_id=Add_Do.truck_number_id,
-        created_at=Add_Do.created_at,
-        rice_mill_name=Add_Do.addricemill.rice_mill_name,
-        agreement_number=Add_Do.agreement.agreement_number,
-        society_name=Add_Do.society.society_name,
-        truck_number=Add_Do.trucks.truck_number,
-        do_id=Add_Do.do_id,
-    )
-
-    return result
+    return Add_Do
 
 
 @app.put(
@@ -1805,7 +1982,7 @@ async def get_add_do_by_id(
 async def update_do_data(
     do_id: int,
     update_do: schemas.AddDoBase,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     db_do = db.query(models.Add_Do).filter(models.Add_Do.do_id == do_id).first()
@@ -1813,13 +1990,12 @@ async def update_do_data(
     if not db_do:
         raise HTTPException(status_code=404, detail="Do not found")
 
-    db.query(models.Add_Do).filter(models.Add_Do.do_id == do_id).update(
-        update_do.dict()
-    )
+    check_season_open(db, db_do.season_id)
+    check_do_references(db, update_do)
+    update_do.season_id = resolve_season(db, update_do.season_id, update_do.date)
+    for field, value in update_do.dict(exclude={"do_id"}).items():
+        setattr(db_do, field, value)
     db.commit()
-
-    message = f"New action performed by user.\nName:"
-    send_telegram_message(message)
     return db_do
 
 
@@ -1831,7 +2007,7 @@ async def update_do_data(
 )
 async def delete_do_data(
     do_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     db_do = db.query(models.Add_Do).filter(models.Add_Do.do_id == do_id).first()
@@ -1839,8 +2015,680 @@ async def delete_do_data(
     if not db_do:
         raise HTTPException(status_code=404, detail="Do not found")
 
+    check_season_open(db, db_do.season_id)
+    # The arrival ledger is append-only, so its DOs stay
+    has_arrivals = (
+        db.query(models.Dhan_Awak.dhan_awak_id)
+        .filter(models.Dhan_Awak.do_id == do_id)
+        .first()
+    )
+    if has_arrivals:
+        raise HTTPException(status_code=400, detail="Do has paddy arrivals")
+
     db.delete(db_do)
     db.commit()
 
-    message = f"New action performed by user.\nName:  "
-    send_telegram_message(message)
+
+# Dhan Awak (paddy arrivals against a DO)
+def do_balances(db: Session, do_ids):
+    return (
+        db.query(*do_balance_columns)
+        .filter(models.Add_Do.do_id.in_(do_ids))
+        .order_by(models.Add_Do.do_id)
+        .all()
+    )
+
+
+@app.post(
+    "/dhan-awak/",
+    response_model=schemas.DhanAwakBatchResult,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Dhan Awak"],
+)
+async def add_dhan_awak(
+    arrival: schemas.DhanAwakBase,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    inserted, skipped, do_ids = record_arrivals(db, [arrival], current_user.id)
+    return {
+        "inserted": inserted,
+        "skipped_rst_numbers": skipped,
+        "balances": do_balances(db, [arrival.do_id]),
+    }
+
+
+# Weighbridge batch upload: one transaction, duplicates skipped
+@app.post(
+    "/dhan-awak/batch/",
+    response_model=schemas.DhanAwakBatchResult,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Dhan Awak"],
+)
+async def add_dhan_awak_batch(
+    arrivals: List[schemas.DhanAwakBase],
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    inserted, skipped, do_ids = record_arrivals(db, arrivals, current_user.id)
+    return {
+        "inserted": inserted,
+        "skipped_rst_numbers": skipped,
+        "balances": do_balances(db, do_ids),
+    }
+
+
+@app.post(
+    "/dhan-awak/{dhan_awak_id}/reverse/",
+    response_model=schemas.DoBalance,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Dhan Awak"],
+)
+async def reverse_dhan_awak(
+    dhan_awak_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    do_id = reverse_arrival(db, dhan_awak_id, current_user.id)
+    return do_balances(db, [do_id])[0]
+
+
+@app.get(
+    "/dhan-awak/",
+    response_model=List[schemas.DhanAwakEntry],
+    tags=["Dhan Awak"],
+)
+async def get_dhan_awak(
+    do_id: Optional[int] = None,
+    rice_mill_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    query = db.query(*dhan_awak_columns)
+    if do_id is not None:
+        query = query.filter(models.Dhan_Awak.do_id == do_id)
+    if rice_mill_id is not None:
+        query = query.filter(models.Dhan_Awak.rice_mill_id == rice_mill_id)
+    # Keyset pagination: pass the last dhan_awak_id of the previous page
+    if before_id is not None:
+        query = query.filter(models.Dhan_Awak.dhan_awak_id < before_id)
+    return query.order_by(models.Dhan_Awak.dhan_awak_id.desc()).limit(limit).all()
+
+
+# Ordered vs received vs pending paddy for a DO, from the running totals
+@app.get("/do-balance/{do_id}", response_model=schemas.DoBalance, tags=["Dhan Awak"])
+async def get_do_balance(
+    do_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    balance = db.query(*do_balance_columns).filter(models.Add_Do.do_id == do_id).first()
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Do not found")
+    return balance
+
+
+# Rice Deposite
+# A day's deposits in one batch, costed at the current warehouse rates
+@app.post(
+    "/rice-deposite/batch/",
+    response_model=schemas.RiceDepositeBatchResult,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Rice Deposite"],
+)
+async def add_rice_deposite_batch(
+    deposits: List[schemas.RiceDepositeBase],
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    ware_house_ids = record_deposits(db, deposits, current_user.id)
+    return {
+        "inserted": len(deposits),
+        "warehouse_totals": query_warehouse_deposit_totals(db)
+        .filter(models.WarehouseDepositTotal.ware_house_id.in_(ware_house_ids))
+        .all(),
+    }
+
+
+@app.get(
+    "/rice-deposite/",
+    response_model=List[schemas.RiceDepositeEntry],
+    tags=["Rice Deposite"],
+)
+async def get_rice_deposite(
+    ware_house_id: Optional[int] = None,
+    rice_mill_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    query = db.query(*rice_deposite_columns)
+    if ware_house_id is not None:
+        query = query.filter(models.Rice_deposite.ware_house_id == ware_house_id)
+    if rice_mill_id is not None:
+        query = query.filter(models.Rice_deposite.rice_mill_id == rice_mill_id)
+    if since is not None:
+        query = query.filter(models.Rice_deposite.deposit_date >= since)
+    if until is not None:
+        query = query.filter(models.Rice_deposite.deposit_date < until)
+    # Keyset pagination: pass the last rice_deposite_id of the previous page
+    if before_id is not None:
+        query = query.filter(models.Rice_deposite.rice_deposite_id < before_id)
+    return (
+        query.order_by(models.Rice_deposite.rice_deposite_id.desc()).limit(limit).all()
+    )
+
+
+# Deposit dashboard: running totals per warehouse
+@app.get(
+    "/rice-deposite/warehouse-totals/",
+    response_model=List[schemas.WarehouseDepositTotals],
+    tags=["Rice Deposite"],
+)
+async def get_warehouse_deposit_totals(
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return (
+        query_warehouse_deposit_totals(db)
+        .order_by(models.WarehouseDepositTotal.ware_house_id)
+        .all()
+    )
+
+
+# By-product sales (broken, husk, nakkhi, bran, bhushi)
+@app.post(
+    "/byproduct-sales/batch/",
+    status_code=status.HTTP_201_CREATED,
+    tags=["By-product Sales"],
+)
+async def add_byproduct_sales(
+    sales: List[schemas.ByproductSaleBase],
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return {"inserted": record_sales(db, sales, current_user.id)}
+
+
+@app.get(
+    "/byproduct-sales/",
+    response_model=List[schemas.ByproductSaleEntry],
+    tags=["By-product Sales"],
+)
+async def get_byproduct_sales(
+    month: Optional[int] = Query(None, ge=190001, le=999912),
+    party_id: Optional[int] = None,
+    broker_id: Optional[int] = None,
+    product: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    query = db.query(*byproduct_sale_columns)
+    if month is not None:
+        query = query.filter(models.ByproductSale.sale_month == month)
+    if party_id is not None:
+        query = query.filter(models.ByproductSale.party_id == party_id)
+    if broker_id is not None:
+        query = query.filter(models.ByproductSale.broker_id == broker_id)
+    if product is not None:
+        query = query.filter(models.ByproductSale.product == product)
+    # Keyset pagination: pass the last sale_id of the previous page
+    if before_id is not None:
+        query = query.filter(models.ByproductSale.sale_id < before_id)
+    return query.order_by(models.ByproductSale.sale_id.desc()).limit(limit).all()
+
+
+# Totals per party or per broker and product, optionally for a month range
+@app.get(
+    "/byproduct-sales/rollup/{group_by}",
+    response_model=List[schemas.ByproductRollup],
+    tags=["By-product Sales"],
+)
+async def get_byproduct_rollup(
+    group_by: str,
+    from_month: Optional[int] = None,
+    to_month: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    key_columns = {
+        "party": models.ByproductSale.party_id,
+        "broker": models.ByproductSale.broker_id,
+    }
+    if group_by not in key_columns:
+        raise HTTPException(status_code=404, detail="Group by party or broker")
+    return query_byproduct_rollup(db, key_columns[group_by], from_month, to_month).all()
+
+
+@app.get(
+    "/byproduct-sales/partitions/",
+    response_model=List[schemas.ByproductPartition],
+    tags=["By-product Sales"],
+)
+async def get_byproduct_partitions(
+    current_user: CurrentUser = Depends(get_admin_user),
+):
+    with engine.connect() as connection:
+        partitions = byproduct_partitions.list(connection)
+    return [
+        {"month": month, "rows": rows} for month, rows in sorted(partitions.items())
+    ]
+
+
+# Drop a month of every user's sales
+@app.delete(
+    "/byproduct-sales/partitions/{month}",
+    dependencies=[Depends(api_key_header)],
+    tags=["By-product Sales"],
+)
+async def drop_byproduct_partition(
+    month: int, current_user: CurrentUser = Depends(get_admin_user)
+):
+    if not byproduct_partitions.drop(month):
+        raise HTTPException(status_code=404, detail="Partition not found")
+    return {"message": f"Sales for {month} dropped"}
+
+
+# Mill stock ledger
+@app.post(
+    "/stock/movements/",
+    response_model=List[schemas.StockLevel],
+    status_code=status.HTTP_201_CREATED,
+    tags=["Stock"],
+)
+async def add_stock_movements(
+    movements: List[schemas.StockMovementBase],
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if not movements or len(movements) > 1000:
+        raise HTTPException(status_code=400, detail="Send 1 to 1000 movements")
+    rice_mill_ids = {movement.rice_mill_id for movement in movements}
+    found = {
+        row.rice_mill_id
+        for row in db.query(models.Add_Rice_Mill.rice_mill_id).filter(
+            models.Add_Rice_Mill.rice_mill_id.in_(rice_mill_ids)
+        )
+    }
+    if rice_mill_ids - found:
+        raise HTTPException(status_code=404, detail="Rice mill not found")
+
+    keys = record_movements(
+        db,
+        [
+            dict(
+                movement.dict(),
+                quantity=signed_quantity(movement.movement_type, movement.quantity),
+                user_id=current_user.id,
+            )
+            for movement in movements
+        ],
+    )
+    db.commit()
+    return [
+        level
+        for level in db.query(*stock_level_columns)
+        .filter(models.StockBalance.rice_mill_id.in_(rice_mill_ids))
+        .order_by(models.StockBalance.rice_mill_id, models.StockBalance.commodity)
+        if (level.rice_mill_id, level.commodity) in set(keys)
+    ]
+
+
+# Current stock of every commodity at a mill
+@app.get(
+    "/stock/{rice_mill_id}",
+    response_model=List[schemas.StockLevel],
+    tags=["Stock"],
+)
+async def get_mill_stock(
+    rice_mill_id: int,
+    commodity: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    check_ids_exist(db, models.Add_Rice_Mill.rice_mill_id, [rice_mill_id], "Rice mill")
+    query = db.query(*stock_level_columns).filter(
+        models.StockBalance.rice_mill_id == rice_mill_id
+    )
+    if commodity is not None:
+        query = query.filter(models.StockBalance.commodity == commodity)
+    return query.order_by(models.StockBalance.commodity).all()
+
+
+@app.get(
+    "/stock-movements/",
+    response_model=List[schemas.StockMovementEntry],
+    tags=["Stock"],
+)
+async def get_stock_movements(
+    rice_mill_id: int,
+    commodity: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    query = db.query(*stock_movement_columns).filter(
+        models.StockMovement.rice_mill_id == rice_mill_id
+    )
+    if commodity is not None:
+        query = query.filter(models.StockMovement.commodity == commodity)
+    # Keyset pagination: pass the last movement_id of the previous page
+    if before_id is not None:
+        query = query.filter(models.StockMovement.movement_id < before_id)
+    return query.order_by(models.StockMovement.movement_id.desc()).limit(limit).all()
+
+
+# Fold every balance's delta into a new snapshot (for a nightly job). Runs
+# over every user's mills, so administrators only, on an unscoped session.
+@app.post(
+    "/stock/snapshots/",
+    dependencies=[Depends(api_key_header)],
+    tags=["Stock"],
+)
+async def take_stock_snapshots(
+    current_user: CurrentUser = Depends(get_admin_user),
+):
+    with SessionLocal() as session:
+        return {"snapshots_taken": take_all_snapshots(session)}
+
+
+# Delta sync: rows created, changed or deleted since the client's last sync
+@app.get("/sync/", response_model=schemas.SyncChanges, tags=["Sync"])
+async def sync_changes(
+    since: Optional[datetime] = None,
+    entities: Optional[str] = Query(
+        None, description="Comma-separated, e.g. dos,trucks; default all"
+    ),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    names = entities.split(",") if entities else list(SYNC_ENTITIES)
+    unknown = [name for name in names if name not in SYNC_ENTITIES]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown entities {', '.join(unknown)}, "
+            f"expected some of {', '.join(SYNC_ENTITIES)}",
+        )
+    # Timestamps are stored naive, in the database clock's time; the
+    # watermark is handed out that way and has to come back unchanged
+    if since is not None and since.tzinfo is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Send since as the watermark of the last sync, without a "
+            "time zone",
+        )
+    # The primary, so the watermark never runs ahead of what a lagging
+    # replica has applied
+    db.info["primary"] = True
+    return changes_since(db, since, names)
+
+
+# Batch fetch: many rows of one entity by id in one request, instead of a
+# by-id call per row
+@app.get("/batch/{entity}/", response_model=schemas.BatchRows, tags=["Batch"])
+async def batch_fetch(
+    entity: str,
+    ids: str = Query(..., description="Comma-separated ids, e.g. 3,1,2"),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if entity not in BATCH_ENTITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown entity {entity}, expected one of "
+            f"{', '.join(BATCH_ENTITIES)}",
+        )
+    try:
+        id_list = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    if len(id_list) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request"
+        )
+    return fetch_by_ids(db, entity, id_list, fields)
+
+
+# Events
+@app.get("/events/", tags=["Events"])
+async def stream_events(
+    request: Request, current_user: CurrentUser = Depends(get_current_user)
+):
+    # Server-sent events for the user's writes: "do" (a DO created, updated
+    # or deleted, with its row), "invalidate" (master data changed, refetch
+    # or /sync/ the named entities) and "resync" (events were dropped, catch
+    # up through /sync/)
+    subscriber = event_broker.subscribe(current_user.id)
+    return StreamingResponse(
+        event_stream(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/events/stats/", tags=["Events"])
+async def get_event_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return event_broker.stats()
+
+
+# Seasons are shared by every user, and creating, closing or archiving one
+# takes in every user's DOs and agreements: administrators only
+@app.post(
+    "/seasons/",
+    response_model=schemas.SeasonEntry,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Seasons"],
+)
+async def add_season(
+    season: schemas.SeasonBase,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_admin_user),
+):
+    check_no_overlap(db, season.start_date, season.end_date)
+    db_season = models.Season(**season.dict(), user_id=current_user.id)
+    db.add(db_season)
+    db.flush()
+    assign_season(db, db_season)
+    db.commit()
+    db.refresh(db_season)
+    return db_season
+
+
+@app.get(
+    "/seasons/",
+    response_model=List[schemas.SeasonEntry],
+    tags=["Seasons"],
+)
+async def get_seasons(
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return db.query(models.Season).order_by(models.Season.start_date.desc()).all()
+
+
+# Freeze a season: its DOs and agreements can no longer be added, changed or
+# deleted
+@app.post(
+    "/seasons/{season_id}/close/",
+    response_model=schemas.SeasonEntry,
+    dependencies=[Depends(api_key_header)],
+    tags=["Seasons"],
+)
+async def close_season(
+    season_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_admin_user),
+):
+    season = get_season(db, season_id)
+    if season.closed_at is None:
+        season.closed_at = datetime.now()
+        db.commit()
+        db.refresh(season)
+    return season
+
+
+def run_season_archive(season_id: int):
+    with SessionLocal() as session:
+        moved = archive_season(session, season_id)
+    logger.info("Archived season %s: %s", season_id, moved)
+
+
+# Move a closed season to the archive tables in the background
+@app.post(
+    "/seasons/{season_id}/archive/",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(api_key_header)],
+    tags=["Seasons"],
+)
+async def start_season_archive(
+    season_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_admin_user),
+):
+    season = get_season(db, season_id)
+    if season.closed_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Close the season before archiving it",
+        )
+    background_tasks.add_task(run_season_archive, season_id)
+    return {"message": f"Archiving season {season.season_name}"}
+
+
+# Archived seasons, read-only. Keyset pagination on the original ids.
+def archived_rows(db: Session, archive, season_id: int, user, before_id, limit: int):
+    id_column = archive.primary_key.columns.values()[0]
+    query = db.query(archive).filter(
+        archive.c.user_id == user.id, archive.c.season_id == season_id
+    )
+    if before_id is not None:
+        query = query.filter(id_column < before_id)
+    return query.order_by(id_column.desc()).limit(limit).all()
+
+
+@app.get(
+    "/archive/{season_id}/do-data/",
+    response_model=List[schemas.ArchivedDo],
+    tags=["Archive"],
+)
+async def get_archived_dos(
+    season_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return archived_rows(
+        db, models.do_archive, season_id, current_user, before_id, limit
+    )
+
+
+@app.get(
+    "/archive/{season_id}/agreements/",
+    response_model=List[schemas.ArchivedAgreement],
+    tags=["Archive"],
+)
+async def get_archived_agreements(
+    season_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return archived_rows(
+        db, models.agreement_archive, season_id, current_user, before_id, limit
+    )
+
+
+@app.get(
+    "/archive/{season_id}/dhan-awak/",
+    response_model=List[schemas.ArchivedDhanAwak],
+    tags=["Archive"],
+)
+async def get_archived_dhan_awak(
+    season_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return archived_rows(
+        db, models.dhanawak_archive, season_id, current_user, before_id, limit
+    )
+
+
+# Audit Log
+@app.get(
+    "/audit-log/",
+    response_model=List[schemas.AuditLogEntry],
+    status_code=status.HTTP_200_OK,
+    tags=["Audit Log"],
+)
+async def get_audit_log(
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    # The caller's own changes only. Entries still in the write-behind buffer
+    # show up after its next flush.
+    query = db.query(*audit_log_columns).filter(
+        models.AuditLog.actor_id == current_user.id
+    )
+    if entity is not None:
+        query = query.filter(models.AuditLog.entity == entity)
+    if entity_id is not None:
+        query = query.filter(models.AuditLog.entity_id == entity_id)
+    if action is not None:
+        query = query.filter(models.AuditLog.action == action)
+    if since is not None:
+        query = query.filter(models.AuditLog.created_at >= since)
+    if until is not None:
+        query = query.filter(models.AuditLog.created_at < until)
+    # Keyset pagination: pass the last audit_id of the previous page
+    if before_id is not None:
+        query = query.filter(models.AuditLog.audit_id < before_id)
+
+    return query.order_by(models.AuditLog.audit_id.desc()).limit(limit).all()
+
+
+# Typeahead for the mill / society / party / broker / truck dropdowns, served
+# from the in-memory prefix index
+@app.get(
+    "/typeahead/{kind}",
+    response_model=List[schemas.TypeaheadMatch],
+    tags=["Typeahead"],
+)
+async def typeahead(
+    kind: str,
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if kind not in TYPEAHEAD_SOURCES:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown list, expected one of {', '.join(TYPEAHEAD_SOURCES)}",
+        )
+    return typeahead_index.search(kind, q, current_user.id, limit)
+
+
+@app.get("/typeahead-stats/", tags=["Typeahead"])
+async def get_typeahead_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return typeahead_index.stats()
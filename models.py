@@ -12,10 +12,13 @@ from sqlalchemy import (
     DATE,
     Enum,
     BIGINT,
+    Index,
+    Table,
 )
 from database import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 import enum
+import re
 
 
 class User(Base):
@@ -27,12 +30,13 @@ class User(Base):
     password = Column(String(100), nullable=False)
     role = Column(String(50), default="admin")
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
     role_create = relationship("Role", back_populates="user")
     addricemill = relationship("Add_Rice_Mill", back_populates="user")
     transporter = relationship("Transporter", back_populates="user")
     trucks = relationship("Truck", back_populates="user")
     society = relationship("Society", back_populates="user")
-    # dhanawak = relationship("Dhan_Awak", back_populates="user")
+    dhanawak = relationship("Dhan_Awak", back_populates="user", passive_deletes="all")
     # add_user = relationship("Add_User", back_populates="user")
 
 
@@ -61,6 +65,7 @@ class BlacklistedToken(Base):
 
 class Add_Rice_Mill(Base):
     __tablename__ = "addricemill"
+    __table_args__ = (Index("ix_addricemill_user", "user_id", "rice_mill_id"),)
 
     rice_mill_id = Column(Integer, primary_key=True, index=True)
     rice_mill_name = Column(String(50), index=True)
@@ -69,15 +74,21 @@ class Add_Rice_Mill(Base):
     phone_number = Column(BigInteger)
     rice_mill_capacity = Column(Float)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="addricemill")
-    agreement = relationship("Agreement", back_populates="addricemill")
-    kochia = relationship("Kochia", back_populates="addricemill")
-    add_do = relationship("Add_Do", back_populates="addricemill")
+    # Removed explicitly before the mill, without being loaded (see deletes.py)
+    agreement = relationship(
+        "Agreement", back_populates="addricemill", passive_deletes="all"
+    )
+    kochia = relationship("Kochia", back_populates="addricemill", passive_deletes="all")
+    add_do = relationship("Add_Do", back_populates="addricemill", passive_deletes="all")
     # frk = relationship("Frk", back_populates="addricemill")
     # other_awaks = relationship("Other_awak", back_populates="addricemill")
     # other_jawak = relationship("Other_jawak", back_populates="addricemill")
-    # ricedeposite = relationship("Rice_deposite", back_populates="addricemill")
+    ricedeposite = relationship(
+        "Rice_deposite", back_populates="addricemill", passive_deletes="all"
+    )
     # dopanding = relationship("Do_panding", back_populates="addricemill")
     # dhantransporting = relationship("Dhan_transporting", back_populates="addricemill")
     # brokenjawak = relationship("broken_jawak", back_populates="addricemill")
@@ -87,36 +98,63 @@ class Add_Rice_Mill(Base):
     # bhushi = relationship("bhushi", back_populates="addricemill")
     # paddysale = relationship("Paddy_sale", back_populates="addricemill")
     # ricepurchase = relationship("Rice_Purchase", back_populates="addricemill")
-    # dhanawak = relationship("Dhan_Awak", back_populates="addricemill")
+    dhanawak = relationship(
+        "Dhan_Awak", back_populates="addricemill", passive_deletes="all"
+    )
 
 
 class Transporter(Base):
     __tablename__ = "transporter"
+    __table_args__ = (Index("ix_transporter_user", "user_id", "transporter_id"),)
 
     transporter_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     transporter_name = Column(String(50))
     transporter_phone_number = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="transporter")
-    trucks = relationship("Truck", back_populates="transporter")
+    trucks = relationship("Truck", back_populates="transporter", passive_deletes="all")
+
+
+# Canonical truck number: upper-case letters and digits only, so
+# "CG04 AB 1234", "cg04ab1234" and "CG-04-AB-1234" are the same truck
+def normalize_truck_number(truck_number):
+    if truck_number is None:
+        return None
+    return re.sub(r"[^0-9A-Z]", "", truck_number.upper()) or None
 
 
 class Truck(Base):
     __tablename__ = "trucks"
+    __table_args__ = (
+        # Truck numbers are unique per user
+        Index(
+            "ix_trucks_user_number",
+            "user_id",
+            "truck_number_normalized",
+            unique=True,
+        ),
+    )
 
     truck_id = Column(Integer, primary_key=True, index=True)
     truck_number = Column(VARCHAR(50))
+    # Set from truck_number on every write
+    truck_number_normalized = Column(VARCHAR(50))
     transport_id = Column(Integer, ForeignKey("transporter.transporter_id"))
     transporter = relationship("Transporter", back_populates="trucks")
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="trucks")
-    add_do = relationship("Add_Do", back_populates="trucks")
+    # A truck used by a DO cannot be deleted
+    add_do = relationship("Add_Do", back_populates="trucks", passive_deletes="all")
     # frk = relationship("Frk", back_populates="trucks")
     # other_awaks = relationship("Other_awak", back_populates="trucks")
     # other_jawak = relationship("Other_jawak", back_populates="trucks")
-    # ricedeposite = relationship("Rice_deposite", back_populates="trucks")
+    ricedeposite = relationship(
+        "Rice_deposite", back_populates="trucks", passive_deletes="all"
+    )
     # saudapatrak = relationship("Sauda_patrak", back_populates="trucks")
     # dhantransporting = relationship("Dhan_transporting", back_populates="trucks")
     # dalalidhaan = relationship("Dalali_dhaan", back_populates="trucks")
@@ -127,11 +165,17 @@ class Truck(Base):
     # bhushi = relationship("bhushi", back_populates="trucks")
     # paddysale = relationship("Paddy_sale", back_populates="trucks")
     # ricepurchase = relationship("Rice_Purchase", back_populates="trucks")
-    # dhanawak = relationship("Dhan_Awak", back_populates="trucks")
+    dhanawak = relationship("Dhan_Awak", back_populates="trucks", passive_deletes="all")
+
+    @validates("truck_number")
+    def set_truck_number_normalized(self, key, truck_number):
+        self.truck_number_normalized = normalize_truck_number(truck_number)
+        return truck_number
 
 
 class Society(Base):
     __tablename__ = "society"
+    __table_args__ = (Index("ix_society_user", "user_id", "society_id"),)
 
     society_id = Column(Integer, primary_key=True, index=True)
     society_name = Column(String(50))
@@ -141,14 +185,35 @@ class Society(Base):
     actual_distance = Column(Integer)
     user = relationship("User", back_populates="society")
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
-    add_do = relationship("Add_Do", back_populates="society")
+    add_do = relationship("Add_Do", back_populates="society", passive_deletes="all")
     # dhantransporting = relationship("Dhan_transporting", back_populates="society")
-    # dhanawak = relationship("Dhan_Awak", back_populates="society")
+    dhanawak = relationship(
+        "Dhan_Awak", back_populates="society", passive_deletes="all"
+    )
+
+
+# A kharif marketing season. DOs and agreements belong to the season their
+# date falls in; once a season is closed they are frozen, and archiving it
+# moves them (with their arrivals) to the *_archive tables.
+class Season(Base):
+    __tablename__ = "seasons"
+
+    season_id = Column(Integer, primary_key=True, index=True)
+    season_name = Column(String(30), unique=True, nullable=False)
+    start_date = Column(DATE, nullable=False)
+    end_date = Column(DATE, nullable=False)
+    closed_at = Column(DateTime)
+    archived_at = Column(DateTime)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
 
 
 class Agreement(Base):
     __tablename__ = "agreement"
+    __table_args__ = (Index("ix_agreement_user", "user_id", "agremennt_id"),)
 
     agremennt_id = Column(Integer, primary_key=True, index=True)
     rice_mill_id = Column(Integer, ForeignKey("addricemill.rice_mill_id"))
@@ -156,26 +221,36 @@ class Agreement(Base):
     type_of_agreement = Column(String(50))
     lot_from = Column(Integer)
     lot_to = Column(Integer)
+    season_id = Column(Integer, ForeignKey("seasons.season_id"), index=True)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     addricemill = relationship("Add_Rice_Mill", back_populates="agreement")
     user_id = Column(Integer, ForeignKey("users.id"))
-    add_do = relationship("Add_Do", back_populates="agreement")
+    # DOs are removed explicitly before their agreement (see deletes.py)
+    add_do = relationship("Add_Do", back_populates="agreement", passive_deletes="all")
 
 
 class ware_house_transporting(Base):
     __tablename__ = "warehousetransporting"
+    __table_args__ = (
+        Index("ix_warehousetransporting_user", "user_id", "ware_house_id"),
+    )
 
     ware_house_id = Column(Integer, primary_key=True, index=True)
     ware_house_name = Column(String(100))
     ware_house_transporting_rate = Column(Integer)
     hamalirate = Column(Integer)
     created_at = Column(DateTime, default=func.now())
-    # ricedeposite = relationship("Rice_deposite", back_populates="warehousetransporting")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    ricedeposite = relationship(
+        "Rice_deposite", back_populates="warehousetransporting", passive_deletes="all"
+    )
     user_id = Column(Integer, ForeignKey("users.id"))
 
 
 class Kochia(Base):
     __tablename__ = "kochia"
+    __table_args__ = (Index("ix_kochia_user", "user_id", "kochia_id"),)
 
     kochia_id = Column(Integer, primary_key=True, index=True)
     rice_mill_name_id = Column(Integer, ForeignKey("addricemill.rice_mill_id"))
@@ -184,15 +259,18 @@ class Kochia(Base):
     addricemill = relationship("Add_Rice_Mill", back_populates="kochia")
     # dalalidhaan = relationship("Dalali_dhaan", back_populates="kochia")
     user_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
 class Party(Base):
     __tablename__ = "party"
+    __table_args__ = (Index("ix_party_user", "user_id", "party_id"),)
 
     party_id = Column(Integer, primary_key=True, index=True)
     party_name = Column(String(50))
     party_phone_number = Column(Integer)
     user_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     # other_awaks = relationship("Other_awak", back_populates="party")
     # other_jawak = relationship("Other_jawak", back_populates="party")
     # brokenjawak = relationship("broken_jawak", back_populates="party")
@@ -206,11 +284,13 @@ class Party(Base):
 
 class brokers(Base):
     __tablename__ = "brokers"
+    __table_args__ = (Index("ix_brokers_user", "user_id", "broker_id"),)
 
     broker_id = Column(Integer, primary_key=True, index=True)
     broker_name = Column(String(50))
     broker_phone_number = Column(Integer)
     user_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     # brokenjawak = relationship("broken_jawak", back_populates="brokers")
     # huskjawak = relationship("husk_jawak", back_populates="brokers")
     # nakkhijawak = relationship("nakkhi_jawak", back_populates="brokers")
@@ -221,6 +301,12 @@ class brokers(Base):
 
 class Add_Do(Base):
     __tablename__ = "addDo"
+    # Recent DOs of a truck
+    __table_args__ = (
+        Index("ix_addDo_truck_date", "truck_number_id", "date"),
+        Index("ix_addDo_season", "season_id", "do_id"),
+        Index("ix_addDo_user", "user_id", "do_id"),
+    )
 
     do_id = Column(Integer, primary_key=True, index=True)
     select_mill_id = Column(Integer, ForeignKey("addricemill.rice_mill_id"))
@@ -237,7 +323,14 @@ class Add_Do(Base):
     total_bardana = Column(Float)
     society_name_id = Column(Integer, ForeignKey("society.society_id"))
     truck_number_id = Column(Integer, ForeignKey("trucks.truck_id"))
+    # Running totals of the paddy received against this DO, kept up to date
+    # by dhan_awak.record_arrivals
+    received_weight = Column(Float, nullable=False, default=0, server_default="0")
+    received_bags = Column(Integer, nullable=False, default=0, server_default="0")
+    arrival_count = Column(Integer, nullable=False, default=0, server_default="0")
+    season_id = Column(Integer, ForeignKey("seasons.season_id"))
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     addricemill = relationship("Add_Rice_Mill", back_populates="add_do")
     agreement = relationship("Agreement", back_populates="add_do")
     society = relationship("Society", back_populates="add_do")
@@ -245,4 +338,284 @@ class Add_Do(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     # dopanding = relationship("Do_panding", back_populates="add_do")
     # dhantransporting = relationship("Dhan_transporting", back_populates="add_do")
-    # dhanawak = relationship("Dhan_Awak", back_populates="add_do")
+    dhanawak = relationship("Dhan_Awak", back_populates="add_do", passive_deletes="all")
+
+
+# Paddy arrivals at the weighbridge, recorded against a DO. Append-only:
+# a wrong entry is cancelled by a reversal entry, never edited or deleted.
+class Dhan_Awak(Base):
+    __tablename__ = "dhanawak"
+    __table_args__ = (
+        Index("ix_dhanawak_do", "do_id", "dhan_awak_id"),
+        Index("ix_dhanawak_user", "user_id", "dhan_awak_id"),
+        # A weighbridge slip is recorded once per mill, so re-sent batches
+        # are not counted twice
+        Index("ix_dhanawak_mill_rst", "rice_mill_id", "rst_number", unique=True),
+    )
+
+    dhan_awak_id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    do_id = Column(Integer, ForeignKey("addDo.do_id"), nullable=False)
+    rice_mill_id = Column(Integer, ForeignKey("addricemill.rice_mill_id"))
+    society_id = Column(Integer, ForeignKey("society.society_id"))
+    truck_id = Column(Integer, ForeignKey("trucks.truck_id"))
+    rst_number = Column(String(50))
+    arrival_date = Column(DATE, nullable=False)
+    bags = Column(Integer, nullable=False)
+    net_weight = Column(Float, nullable=False)
+    # Set on reversal entries: the entry they cancel
+    reverses_id = Column(BigInteger, unique=True)
+    created_at = Column(DateTime, default=func.now())
+    user_id = Column(Integer, ForeignKey("users.id"))
+    add_do = relationship("Add_Do", back_populates="dhanawak")
+    addricemill = relationship("Add_Rice_Mill", back_populates="dhanawak")
+    society = relationship("Society", back_populates="dhanawak")
+    trucks = relationship("Truck", back_populates="dhanawak")
+    user = relationship("User", back_populates="dhanawak")
+
+
+# Rice delivered to an FCI / warehouse, costed at the warehouse's rates when
+# it was entered
+class Rice_deposite(Base):
+    __tablename__ = "ricedeposite"
+    __table_args__ = (
+        Index("ix_ricedeposite_warehouse_date", "ware_house_id", "deposit_date"),
+        Index("ix_ricedeposite_mill_date", "rice_mill_id", "deposit_date"),
+        Index("ix_ricedeposite_user", "user_id", "rice_deposite_id"),
+    )
+
+    rice_deposite_id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    rice_mill_id = Column(
+        Integer, ForeignKey("addricemill.rice_mill_id"), nullable=False
+    )
+    ware_house_id = Column(
+        Integer, ForeignKey("warehousetransporting.ware_house_id"), nullable=False
+    )
+    truck_id = Column(Integer, ForeignKey("trucks.truck_id"))
+    deposit_date = Column(DATE, nullable=False)
+    lot_number = Column(String(50))
+    bags = Column(Integer, nullable=False)
+    weight = Column(Float, nullable=False)
+    transporting_rate = Column(Integer)
+    hamali_rate = Column(Integer)
+    transporting_cost = Column(Float, nullable=False)
+    hamali_cost = Column(Float, nullable=False)
+    total_cost = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    user_id = Column(Integer, ForeignKey("users.id"))
+    addricemill = relationship("Add_Rice_Mill", back_populates="ricedeposite")
+    trucks = relationship("Truck", back_populates="ricedeposite")
+    warehousetransporting = relationship(
+        "ware_house_transporting", back_populates="ricedeposite"
+    )
+
+
+# Running deposit totals per warehouse for the deposit dashboard
+class WarehouseDepositTotal(Base):
+    __tablename__ = "warehouse_deposit_totals"
+
+    ware_house_id = Column(
+        Integer, ForeignKey("warehousetransporting.ware_house_id"), primary_key=True
+    )
+    deposits = Column(Integer, nullable=False, default=0)
+    bags = Column(BigInteger, nullable=False, default=0)
+    weight = Column(Float, nullable=False, default=0)
+    transporting_cost = Column(Float, nullable=False, default=0)
+    hamali_cost = Column(Float, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+    last_deposit_date = Column(DATE)
+
+
+# Archive copy of a hot table: the same columns without foreign keys (the
+# rows they pointed at may be gone by the time the archive is read), plus the
+# season the rows belonged to and when they were moved. Read per user and
+# season.
+def archive_table(model, name: str):
+    source = model.__table__
+    primary_key = source.primary_key.columns.keys()[0]
+    columns = [
+        Column(
+            column.name,
+            column.type,
+            primary_key=column.primary_key,
+            autoincrement=False,
+        )
+        for column in source.columns
+    ]
+    if "season_id" not in source.columns:
+        columns.append(Column("season_id", Integer, nullable=False))
+    return Table(
+        name,
+        Base.metadata,
+        *columns,
+        Column("archived_at", DateTime, nullable=False),
+        Index(f"ix_{name}_user_season", "user_id", "season_id", primary_key),
+    )
+
+
+do_archive = archive_table(Add_Do, "addDo_archive")
+agreement_archive = archive_table(Agreement, "agreement_archive")
+dhanawak_archive = archive_table(Dhan_Awak, "dhanawak_archive")
+
+
+# Sales of broken, husk, nakkhi, bran and bhushi to parties, in one table.
+# On MySQL it is RANGE-partitioned by sale_month (see byproducts.py), which
+# is why it has no foreign keys: partitioned InnoDB tables cannot have them.
+class ByproductSale(Base):
+    __tablename__ = "byproduct_sales"
+    __table_args__ = (
+        Index("ix_byproduct_sales_month", "sale_month", "sale_id"),
+        Index("ix_byproduct_sales_user", "user_id", "sale_id"),
+        # Covering indexes for the per-party / per-broker rollups
+        Index(
+            "ix_byproduct_sales_party",
+            "party_id",
+            "sale_month",
+            "product",
+            "quantity",
+            "amount",
+        ),
+        Index(
+            "ix_byproduct_sales_broker",
+            "broker_id",
+            "sale_month",
+            "product",
+            "quantity",
+            "amount",
+        ),
+    )
+
+    sale_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # YYYYMM of sale_date, the partition key
+    sale_month = Column(Integer, nullable=False)
+    sale_date = Column(DATE, nullable=False)
+    rice_mill_id = Column(Integer, nullable=False)
+    party_id = Column(Integer, nullable=False)
+    broker_id = Column(Integer)
+    truck_id = Column(Integer)
+    product = Column(String(20), nullable=False)
+    quantity = Column(Float, nullable=False)
+    rate = Column(Float, nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    user_id = Column(Integer)
+
+
+# Every inflow / outflow of a commodity at a mill, signed (+ in, - out, in
+# quintals). Append-only like the arrival ledger.
+class StockMovement(Base):
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_mill", "rice_mill_id", "commodity", "movement_id"),
+        Index("ix_stock_movements_user", "user_id", "movement_id"),
+    )
+
+    movement_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    rice_mill_id = Column(
+        Integer, ForeignKey("addricemill.rice_mill_id"), nullable=False
+    )
+    commodity = Column(String(20), nullable=False)
+    movement_type = Column(String(30), nullable=False)
+    quantity = Column(Float, nullable=False)
+    movement_date = Column(DATE, nullable=False)
+    # What the movement came from, e.g. "dhanawak:12"
+    reference = Column(String(64))
+    created_at = Column(DateTime, default=func.now())
+    user_id = Column(Integer, ForeignKey("users.id"))
+
+
+# Current stock per mill and commodity: the last snapshot plus the movements
+# recorded since, both kept on this row, so current stock is one row read.
+class StockBalance(Base):
+    __tablename__ = "stock_balances"
+
+    rice_mill_id = Column(
+        Integer, ForeignKey("addricemill.rice_mill_id"), primary_key=True
+    )
+    commodity = Column(String(20), primary_key=True)
+    snapshot_quantity = Column(Float, nullable=False, default=0)
+    # Last movement folded into the snapshot
+    snapshot_movement_id = Column(BigInteger, nullable=False, default=0)
+    snapshot_at = Column(DateTime)
+    delta_quantity = Column(Float, nullable=False, default=0)
+    delta_movements = Column(Integer, nullable=False, default=0)
+
+
+# Snapshot history, for stock as of an earlier point
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        Index("ix_stock_snapshots_mill", "rice_mill_id", "commodity", "taken_at"),
+    )
+
+    snapshot_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    rice_mill_id = Column(
+        Integer, ForeignKey("addricemill.rice_mill_id"), nullable=False
+    )
+    commodity = Column(String(20), nullable=False)
+    quantity = Column(Float, nullable=False)
+    last_movement_id = Column(BigInteger, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class AuditLog(Base):
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        Index("ix_audit_log_entity", "entity", "entity_id", "created_at"),
+        Index("ix_audit_log_actor", "actor_id", "created_at"),
+    )
+
+    audit_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    actor_id = Column(Integer)
+    actor_name = Column(String(50))
+    entity = Column(String(64), nullable=False)
+    entity_id = Column(String(64))
+    action = Column(String(10), nullable=False)
+    changes = Column(JSON)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+# Deleted rows of the synced entities, so a delta sync (sync.py) can tell
+# clients what to drop
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+    __table_args__ = (
+        Index("ix_tombstones_user_deleted", "user_id", "deleted_at"),
+        Index("ix_tombstones_deleted", "deleted_at"),
+    )
+
+    tombstone_id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    entity = Column(String(32), nullable=False)
+    entity_id = Column(BigInteger, nullable=False)
+    user_id = Column(Integer)
+    deleted_at = Column(DateTime, nullable=False, default=func.now())
+
+
+# Each user's rows changed since a sync watermark
+for _model in (
+    Add_Rice_Mill,
+    Transporter,
+    Truck,
+    Society,
+    Agreement,
+    ware_house_transporting,
+    Kochia,
+    Party,
+    brokers,
+    Add_Do,
+):
+    Index(f"ix_{_model.__tablename__}_user_updated", _model.user_id, _model.updated_at)
+del _model
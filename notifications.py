@@ -0,0 +1,298 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import settings
+from http_client import CircuitOpenError, outbound_client
+
+logger = logging.getLogger(__name__)
+
+# Telegram caps a message at 4096 characters
+MAX_MESSAGE_LENGTH = 4096
+
+
+# Classic token bucket: `rate` tokens per second, bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    # Seconds until a token is available (0 if one is available now)
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+def format_quantity(quantity: float) -> str:
+    if quantity == int(quantity):
+        return f"{int(quantity):,}"
+    return f"{quantity:,.2f}"
+
+
+# Queues outgoing Telegram messages and sends them from a background thread
+# within the Bot API limits (about 30 messages/second per bot, 20/minute per
+# group, 1/second per private chat). With a digest window, events and
+# messages are coalesced into one summary per chat per window, e.g.
+# "42 DOs added at Mill X, total 1,230 qtl".
+class TelegramNotifier:
+    def __init__(
+        self,
+        bot_token: str,
+        chat_ids,
+        api_url: str = "https://api.telegram.org",
+        digest_window: float = 0,
+        messages_per_second: float = 30,
+        group_messages_per_minute: float = 20,
+        private_messages_per_second: float = 1,
+        max_queue: int = 1000,
+    ):
+        self.bot_token = bot_token
+        self.chat_ids = [chat_id for chat_id in chat_ids if chat_id]
+        self.api_url = api_url.rstrip("/")
+        self.digest_window = digest_window
+        self.bot_bucket = TokenBucket(messages_per_second, messages_per_second)
+        self.group_rate = group_messages_per_minute / 60
+        self.group_burst = group_messages_per_minute
+        self.private_rate = private_messages_per_second
+        self.chat_buckets = {}
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._outbox = deque()
+        # (action, subject, unit) -> [count, quantity] for the open window
+        self._events = OrderedDict()
+        self._texts = []
+        self._window_started_at = None
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            bot_token=settings.telegram_bot_token,
+            chat_ids=settings.telegram_chat_id.split(","),
+            api_url=settings.telegram_api_url,
+            digest_window=settings.telegram_digest_window,
+        )
+
+    @property
+    def digest_mode(self) -> bool:
+        return self.digest_window > 0
+
+    # Free-text notification
+    def send(self, text: str):
+        if self.digest_mode:
+            with self._lock:
+                self._open_window()
+                self._texts.append(text)
+                self.coalesced += 1
+            self._start()
+            return
+        for chat_id in self.chat_ids:
+            self._enqueue(chat_id, text)
+
+    # Countable event, summarised per (action, subject) in digest mode
+    def event(self, action: str, subject: str, quantity: float = None, unit="qtl"):
+        if not self.digest_mode:
+            text = f"1 {action} at {subject}"
+            if quantity is not None:
+                text += f", total {format_quantity(quantity)} {unit}"
+            self.send(text)
+            return
+        with self._lock:
+            self._open_window()
+            totals = self._events.setdefault((action, subject, unit), [0, 0.0])
+            totals[0] += 1
+            totals[1] += quantity or 0
+            self.coalesced += 1
+        self._start()
+
+    def _open_window(self):
+        if self._window_started_at is None:
+            self._window_started_at = time.monotonic()
+
+    def _enqueue(self, chat_id, text: str):
+        with self._lock:
+            if len(self._outbox) >= self.max_queue:
+                self._outbox.popleft()
+                self.dropped += 1
+            self._outbox.append((chat_id, text))
+        self._start()
+        self._wakeup.set()
+
+    # Build the summary for the closed window and queue it for every chat
+    def flush_digest(self):
+        with self._lock:
+            events, self._events = self._events, OrderedDict()
+            texts, self._texts = self._texts, []
+            self._window_started_at = None
+        lines = []
+        for (action, subject, unit), (count, quantity) in events.items():
+            line = f"{count} {action} at {subject}"
+            if quantity:
+                line += f", total {format_quantity(quantity)} {unit}"
+            lines.append(line)
+        lines.extend(texts)
+        if not lines:
+            return
+        for message in self._split(lines):
+            for chat_id in self.chat_ids:
+                self._enqueue(chat_id, message)
+
+    def _split(self, lines):
+        message = ""
+        for line in lines:
+            line = line[:MAX_MESSAGE_LENGTH]
+            if message and len(message) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+                yield message
+                message = ""
+            message = f"{message}\n{line}" if message else line
+        if message:
+            yield message
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if str(chat_id).startswith("-"):
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.private_rate, 1)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name="telegram-sender", daemon=True
+                    )
+                    self._thread.start()
+
+    def _digest_due_in(self):
+        with self._lock:
+            started_at = self._window_started_at
+        if started_at is None:
+            return None
+        return started_at + self.digest_window - time.monotonic()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            due_in = self._digest_due_in()
+            if due_in is not None and due_in <= 0:
+                self.flush_digest()
+                continue
+
+            with self._lock:
+                item = self._outbox[0] if self._outbox else None
+            if item is None:
+                self._wakeup.wait(due_in if due_in is not None else 1.0)
+                self._wakeup.clear()
+                continue
+
+            chat_id, text = item
+            chat_bucket = self._chat_bucket(chat_id)
+            delay = max(self.bot_bucket.wait_time(), chat_bucket.wait_time())
+            if delay > 0:
+                self.throttled += 1
+                self._stopped.wait(delay)
+                continue
+            self.bot_bucket.consume()
+            chat_bucket.consume()
+
+            retry_after = self._deliver(chat_id, text)
+            if retry_after:
+                # Rate limited by Telegram: keep the message and back off
+                self.throttled += 1
+                self._stopped.wait(retry_after)
+                continue
+            with self._lock:
+                if self._outbox and self._outbox[0] is item:
+                    self._outbox.popleft()
+
+    # POST one message; returns seconds to wait before retrying it when
+    # Telegram says 429 or the circuit breaker is open
+    def _deliver(self, chat_id, text: str):
+        url = f"{self.api_url}/bot{self.bot_token}/sendMessage"
+        try:
+            response = self._post(url, {"chat_id": chat_id, "text": text})
+        except CircuitOpenError as error:
+            # Telegram is failing: keep the message until the breaker half-opens
+            return error.retry_after
+        except Exception as error:
+            # Not the exception text: it carries the URL, bot token included
+            logger.error(
+                "Telegram message to %s failed: %s", chat_id, type(error).__name__
+            )
+            self.failed += 1
+            return None
+        if response.status_code == 429:
+            try:
+                return response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                return 1
+        if response.status_code >= 400:
+            logger.warning(
+                "Telegram message to %s rejected with %s", chat_id, response.status_code
+            )
+            self.failed += 1
+            return None
+        self.sent += 1
+        return None
+
+    def _post(self, url: str, payload: dict):
+        return outbound_client.post(url, json=payload)
+
+    def close(self, timeout: float = 5):
+        if self.digest_mode:
+            self.flush_digest()
+        deadline = time.monotonic() + timeout
+        while self._outbox and time.monotonic() < deadline:
+            if self._thread is None or not self._thread.is_alive():
+                break
+            self._wakeup.set()
+            time.sleep(0.05)
+        self._stopped.set()
+        self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            queued = len(self._outbox)
+            pending_events = sum(count for count, _ in self._events.values())
+            pending_texts = len(self._texts)
+        return {
+            "mode": "digest" if self.digest_mode else "immediate",
+            "digest_window": self.digest_window,
+            "queued": queued,
+            "pending_digest_items": pending_events + pending_texts,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "coalesced": self.coalesced,
+        }
+
+
+notifier = TelegramNotifier.from_settings()
+atexit.register(notifier.close)
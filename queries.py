@@ -0,0 +1,282 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models
+
+# Columns selected by the read endpoints, matching their response schemas so
+# rows are returned as plain tuples instead of fully hydrated ORM entities.
+rice_mill_columns = (
+    models.Add_Rice_Mill.rice_mill_id,
+    models.Add_Rice_Mill.rice_mill_name,
+    models.Add_Rice_Mill.gst_number,
+    models.Add_Rice_Mill.mill_address,
+    models.Add_Rice_Mill.phone_number,
+    models.Add_Rice_Mill.rice_mill_capacity,
+)
+
+transporter_columns = (
+    models.Transporter.transporter_id,
+    models.Transporter.transporter_name,
+    models.Transporter.transporter_phone_number,
+)
+
+truck_columns = (
+    models.Truck.truck_id,
+    models.Truck.truck_number,
+    models.Truck.transport_id,
+)
+
+society_columns = (
+    models.Society.society_id,
+    models.Society.society_name,
+    models.Society.distance_from_mill,
+    models.Society.google_distance,
+    models.Society.transporting_rate,
+    models.Society.actual_distance,
+)
+
+agreement_columns = (
+    models.Agreement.agremennt_id,
+    models.Agreement.rice_mill_id,
+    models.Agreement.agreement_number,
+    models.Agreement.type_of_agreement,
+    models.Agreement.lot_from,
+    models.Agreement.lot_to,
+    models.Agreement.season_id,
+)
+
+ware_house_columns = (
+    models.ware_house_transporting.ware_house_id,
+    models.ware_house_transporting.ware_house_name,
+    models.ware_house_transporting.ware_house_transporting_rate,
+    models.ware_house_transporting.hamalirate,
+)
+
+kochia_columns = (
+    models.Kochia.kochia_id,
+    models.Kochia.rice_mill_name_id,
+    models.Kochia.kochia_name,
+    models.Kochia.kochia_phone_number,
+)
+
+party_columns = (
+    models.Party.party_id,
+    models.Party.party_name,
+    models.Party.party_phone_number,
+)
+
+broker_columns = (
+    models.brokers.broker_id,
+    models.brokers.broker_name,
+    models.brokers.broker_phone_number,
+)
+
+do_columns = (
+    models.Add_Do.do_id,
+    models.Add_Do.select_mill_id,
+    models.Add_Do.date,
+    models.Add_Do.do_number,
+    models.Add_Do.select_argeement_id,
+    models.Add_Do.mota_weight,
+    models.Add_Do.mota_Bardana,
+    models.Add_Do.patla_weight,
+    models.Add_Do.patla_bardana,
+    models.Add_Do.sarna_weight,
+    models.Add_Do.sarna_bardana,
+    models.Add_Do.total_weight,
+    models.Add_Do.total_bardana,
+    models.Add_Do.society_name_id,
+    models.Add_Do.truck_number_id,
+    models.Add_Do.season_id,
+    models.Add_Do.created_at,
+)
+
+# The list endpoints that join in a name
+truck_with_transporter_columns = (
+    *truck_columns,
+    models.Transporter.transporter_name,
+)
+agreement_with_mill_columns = (
+    *agreement_columns,
+    models.Add_Rice_Mill.rice_mill_name,
+)
+kochia_with_mill_columns = (
+    *kochia_columns,
+    models.Add_Rice_Mill.rice_mill_name,
+)
+
+dhan_awak_columns = (
+    models.Dhan_Awak.dhan_awak_id,
+    models.Dhan_Awak.do_id,
+    models.Dhan_Awak.rice_mill_id,
+    models.Dhan_Awak.society_id,
+    models.Dhan_Awak.truck_id,
+    models.Dhan_Awak.rst_number,
+    models.Dhan_Awak.arrival_date,
+    models.Dhan_Awak.bags,
+    models.Dhan_Awak.net_weight,
+    models.Dhan_Awak.reverses_id,
+    models.Dhan_Awak.created_at,
+)
+
+# Ordered vs received paddy per DO, read from the running totals on addDo
+do_balance_columns = (
+    models.Add_Do.do_id,
+    models.Add_Do.do_number,
+    models.Add_Do.total_weight,
+    models.Add_Do.total_bardana,
+    models.Add_Do.received_weight,
+    models.Add_Do.received_bags,
+    models.Add_Do.arrival_count,
+    (models.Add_Do.total_weight - models.Add_Do.received_weight).label(
+        "pending_weight"
+    ),
+    (models.Add_Do.total_bardana - models.Add_Do.received_bags).label("pending_bags"),
+)
+
+rice_deposite_columns = (
+    models.Rice_deposite.rice_deposite_id,
+    models.Rice_deposite.rice_mill_id,
+    models.Rice_deposite.ware_house_id,
+    models.Rice_deposite.truck_id,
+    models.Rice_deposite.deposit_date,
+    models.Rice_deposite.lot_number,
+    models.Rice_deposite.bags,
+    models.Rice_deposite.weight,
+    models.Rice_deposite.transporting_rate,
+    models.Rice_deposite.hamali_rate,
+    models.Rice_deposite.transporting_cost,
+    models.Rice_deposite.hamali_cost,
+    models.Rice_deposite.total_cost,
+    models.Rice_deposite.created_at,
+)
+
+
+# Per-warehouse deposit totals with the warehouse name
+def query_warehouse_deposit_totals(db: Session):
+    return db.query(
+        models.WarehouseDepositTotal.ware_house_id,
+        models.ware_house_transporting.ware_house_name,
+        models.WarehouseDepositTotal.deposits,
+        models.WarehouseDepositTotal.bags,
+        models.WarehouseDepositTotal.weight,
+        models.WarehouseDepositTotal.transporting_cost,
+        models.WarehouseDepositTotal.hamali_cost,
+        models.WarehouseDepositTotal.total_cost,
+        models.WarehouseDepositTotal.last_deposit_date,
+    ).join(
+        models.ware_house_transporting,
+        models.ware_house_transporting.ware_house_id
+        == models.WarehouseDepositTotal.ware_house_id,
+    )
+
+
+byproduct_sale_columns = (
+    models.ByproductSale.sale_id,
+    models.ByproductSale.sale_month,
+    models.ByproductSale.sale_date,
+    models.ByproductSale.rice_mill_id,
+    models.ByproductSale.party_id,
+    models.ByproductSale.broker_id,
+    models.ByproductSale.truck_id,
+    models.ByproductSale.product,
+    models.ByproductSale.quantity,
+    models.ByproductSale.rate,
+    models.ByproductSale.amount,
+    models.ByproductSale.created_at,
+)
+
+
+# Sales, quantity and amount per party (or broker) and product, read from the
+# covering (party_id / broker_id, sale_month, product, quantity, amount)
+# indexes. The sale_month range also prunes partitions on MySQL.
+def query_byproduct_rollup(db: Session, key_column, from_month=None, to_month=None):
+    Sale = models.ByproductSale
+    query = db.query(
+        key_column.label("id"),
+        Sale.product,
+        func.count().label("sales"),
+        func.sum(Sale.quantity).label("quantity"),
+        func.sum(Sale.amount).label("amount"),
+    )
+    if from_month is not None:
+        query = query.filter(Sale.sale_month >= from_month)
+    if to_month is not None:
+        query = query.filter(Sale.sale_month <= to_month)
+    return query.group_by(key_column, Sale.product).order_by(key_column, Sale.product)
+
+
+stock_movement_columns = (
+    models.StockMovement.movement_id,
+    models.StockMovement.rice_mill_id,
+    models.StockMovement.commodity,
+    models.StockMovement.movement_type,
+    models.StockMovement.quantity,
+    models.StockMovement.movement_date,
+    models.StockMovement.reference,
+    models.StockMovement.created_at,
+)
+
+# Current stock: snapshot plus the delta since, both on the balance row
+stock_level_columns = (
+    models.StockBalance.rice_mill_id,
+    models.StockBalance.commodity,
+    (models.StockBalance.snapshot_quantity + models.StockBalance.delta_quantity).label(
+        "quantity"
+    ),
+    models.StockBalance.snapshot_quantity,
+    models.StockBalance.snapshot_at,
+    models.StockBalance.delta_movements.label("movements_since_snapshot"),
+)
+
+audit_log_columns = (
+    models.AuditLog.audit_id,
+    models.AuditLog.actor_id,
+    models.AuditLog.actor_name,
+    models.AuditLog.entity,
+    models.AuditLog.entity_id,
+    models.AuditLog.action,
+    models.AuditLog.changes,
+    models.AuditLog.created_at,
+)
+
+
+do_with_names_columns = (
+    *do_columns,
+    models.Add_Rice_Mill.rice_mill_name,
+    models.Agreement.agreement_number,
+    models.Society.society_name,
+    models.Truck.truck_number,
+)
+
+
+# DO rows with the mill, agreement, society and truck names joined in the
+# same statement. `columns` narrows the select (?fields=); the joins stay,
+# so the same rows come back.
+def query_do_with_names(db: Session, columns=do_with_names_columns):
+    return (
+        db.query(*columns)
+        .select_from(models.Add_Do)
+        .join(models.Add_Do.addricemill)
+        .join(models.Add_Do.agreement)
+        .join(models.Add_Do.society)
+        .join(models.Add_Do.trucks)
+    )
+
+
+# A truck by canonical number with its transporter and most recent DOs, as
+# one query on the unique truck_number_normalized index. A truck without DOs
+# comes back as a single row with the DO columns NULL.
+def query_truck_with_recent_dos(db: Session, truck_number_normalized: str, limit: int):
+    return (
+        db.query(
+            *truck_columns,
+            models.Transporter.transporter_name,
+            models.Transporter.transporter_phone_number,
+            *do_columns,
+        )
+        .outerjoin(models.Truck.transporter)
+        .outerjoin(models.Truck.add_do)
+        .filter(models.Truck.truck_number_normalized == truck_number_normalized)
+        .order_by(models.Add_Do.date.desc(), models.Add_Do.do_id.desc())
+        .limit(limit)
+    )
@@ -0,0 +1,169 @@
+import threading
+from collections import defaultdict
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, insert, select
+from sqlalchemy.orm import Session
+
+import models
+from database import engine, upsert
+from stock import record_movements
+from table_versions import current_table_versions
+
+# Deposits accepted by one batch
+MAX_BATCH_SIZE = 1000
+
+
+# ware_house_id -> (transporting rate per quintal, hamali rate per bag), kept
+# in memory and reloaded when the warehousetransporting table version moves
+class WarehouseRateTable:
+    def __init__(self):
+        self._rates = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def rates(self):
+        table = models.ware_house_transporting.__tablename__
+        version = current_table_versions().get(table, 0)
+        if version != self._version:
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    select(
+                        models.ware_house_transporting.ware_house_id,
+                        models.ware_house_transporting.ware_house_transporting_rate,
+                        models.ware_house_transporting.hamalirate,
+                    )
+                ).all()
+            with self._lock:
+                self._rates = {
+                    ware_house_id: (transporting_rate or 0, hamali_rate or 0)
+                    for ware_house_id, transporting_rate, hamali_rate in rows
+                }
+                self._version = version
+                self.reloads += 1
+        return self._rates
+
+
+warehouse_rates = WarehouseRateTable()
+
+
+def cost_deposit(deposit, transporting_rate: int, hamali_rate: int):
+    transporting_cost = round(deposit.weight * transporting_rate, 2)
+    hamali_cost = round(deposit.bags * hamali_rate, 2)
+    return {
+        "transporting_rate": transporting_rate,
+        "hamali_rate": hamali_rate,
+        "transporting_cost": transporting_cost,
+        "hamali_cost": hamali_cost,
+        "total_cost": round(transporting_cost + hamali_cost, 2),
+    }
+
+
+# Cost a day's deposits against the warehouse rates, write them with one
+# bulk INSERT, add them to the per-warehouse totals and take the rice out of
+# the mills' stock, all in one transaction. Returns the warehouse ids whose
+# totals changed.
+def record_deposits(db: Session, deposits, user_id: int = None):
+    if not deposits or len(deposits) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Send 1 to {MAX_BATCH_SIZE} deposits per batch",
+        )
+    rates = warehouse_rates.rates()
+    # The rate table holds every user's warehouses; only the caller's count
+    ware_house_ids = {d.ware_house_id for d in deposits}
+    visible = set(
+        db.execute(
+            select(models.ware_house_transporting.ware_house_id).where(
+                models.ware_house_transporting.ware_house_id.in_(ware_house_ids)
+            )
+        ).scalars()
+    )
+    unknown = sorted(ware_house_ids - (visible & rates.keys()))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Warehouse not found: {', '.join(map(str, unknown))}",
+        )
+
+    rice_mill_ids = {d.rice_mill_id for d in deposits}
+    found = set(
+        db.execute(
+            select(models.Add_Rice_Mill.rice_mill_id).where(
+                models.Add_Rice_Mill.rice_mill_id.in_(rice_mill_ids)
+            )
+        ).scalars()
+    )
+    if rice_mill_ids - found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rice mill not found",
+        )
+
+    rows = []
+    totals = defaultdict(lambda: {"deposits": 0, "bags": 0, "weight": 0.0})
+    for deposit in deposits:
+        row = dict(
+            deposit.dict(),
+            **cost_deposit(deposit, *rates[deposit.ware_house_id]),
+            user_id=user_id,
+        )
+        rows.append(row)
+        total = totals[deposit.ware_house_id]
+        total["deposits"] += 1
+        total["bags"] += row["bags"]
+        total["weight"] += row["weight"]
+        for cost in ("transporting_cost", "hamali_cost", "total_cost"):
+            total[cost] = total.get(cost, 0.0) + row[cost]
+        total["last_deposit_date"] = max(
+            total.get("last_deposit_date", row["deposit_date"]), row["deposit_date"]
+        )
+
+    db.execute(insert(models.Rice_deposite), rows)
+    add_to_warehouse_totals(db, totals)
+    record_movements(
+        db,
+        [
+            {
+                "rice_mill_id": row["rice_mill_id"],
+                "commodity": "rice",
+                "movement_type": "rice_deposite",
+                "quantity": -row["weight"],
+                "movement_date": row["deposit_date"],
+                "reference": f"lot:{row['lot_number']}" if row["lot_number"] else None,
+                "user_id": user_id,
+            }
+            for row in rows
+        ],
+    )
+    db.commit()
+    return sorted(totals)
+
+
+# Add to each warehouse's totals row, creating it on the first deposit, with
+# one upsert per warehouse so concurrent first deposits cannot collide
+def add_to_warehouse_totals(db: Session, totals):
+    Total = models.WarehouseDepositTotal
+    for ware_house_id in sorted(totals):
+        upsert(
+            db,
+            Total,
+            {"ware_house_id": ware_house_id, **totals[ware_house_id]},
+            lambda new: {
+                "deposits": Total.deposits + new.deposits,
+                "bags": Total.bags + new.bags,
+                "weight": Total.weight + new.weight,
+                "transporting_cost": Total.transporting_cost + new.transporting_cost,
+                "hamali_cost": Total.hamali_cost + new.hamali_cost,
+                "total_cost": Total.total_cost + new.total_cost,
+                "last_deposit_date": case(
+                    (
+                        (Total.last_deposit_date.is_(None))
+                        | (Total.last_deposit_date < new.last_deposit_date),
+                        new.last_deposit_date,
+                    ),
+                    else_=Total.last_deposit_date,
+                ),
+            },
+        )
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, create_model
 from sqlalchemy import Column, Date, String
-from typing import Annotated, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Literal, Optional
 from enum import Enum
 from datetime import date, datetime
+from stock import COMMODITIES, MOVEMENT_TYPES
+from byproducts import PRODUCTS
 
 
 class UserCreate(BaseModel):
@@ -97,6 +99,8 @@ class AgreementBase(BaseModel):
     type_of_agreement: str
     lot_from: int
     lot_to: int
+    # Defaults to the open season covering the day it is added
+    season_id: Optional[int] = None
     agremennt_id: Optional[int] = None
 
 
@@ -166,6 +170,8 @@ class AddDoBase(BaseModel):
     total_bardana: float
     society_name_id: int
     truck_number_id: int
+    # Defaults to the open season covering the DO date
+    season_id: Optional[int] = None
     do_id: Optional[int] = None
 
 
@@ -190,3 +196,233 @@ class AddDoWithAddRiceMillAgreementSocietyTruck(BaseModel):
     truck_number: str
     do_id: Optional[int] = None
     created_at: Optional[datetime] = None
+
+
+class TruckWithRecentDos(BaseModel):
+    truck_id: int
+    truck_number: str
+    transport_id: int
+    transporter_name: Optional[str] = None
+    transporter_phone_number: Optional[int] = None
+    recent_dos: List[AddDoBase]
+
+
+class DhanAwakBase(BaseModel):
+    do_id: int
+    rst_number: str
+    arrival_date: date
+    bags: int = Field(ge=0)
+    net_weight: float = Field(gt=0)
+    # Defaults to the DO's truck
+    truck_id: Optional[int] = None
+
+
+class DhanAwakEntry(BaseModel):
+    dhan_awak_id: int
+    do_id: int
+    rice_mill_id: Optional[int] = None
+    society_id: Optional[int] = None
+    truck_id: Optional[int] = None
+    rst_number: Optional[str] = None
+    arrival_date: date
+    bags: int
+    net_weight: float
+    reverses_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+
+class SyncChanges(BaseModel):
+    # Pass as `since` on the next sync
+    watermark: datetime
+    # Set when `changes` is everything, not a delta
+    full_resync: bool
+    changes: Dict[str, List[Dict[str, Any]]]
+    deleted: Dict[str, List[int]]
+
+
+class BatchRows(BaseModel):
+    # In the order the ids were asked for
+    rows: List[Dict[str, Any]]
+    missing: List[int]
+
+
+class SeasonBase(BaseModel):
+    season_name: str = Field(max_length=30)
+    start_date: date
+    end_date: date
+
+
+class SeasonEntry(SeasonBase):
+    season_id: int
+    closed_at: Optional[datetime] = None
+    archived_at: Optional[datetime] = None
+
+
+class ArchivedDo(AddDoBase):
+    received_weight: float
+    received_bags: int
+    arrival_count: int
+    season_id: int
+    created_at: Optional[datetime] = None
+    archived_at: datetime
+
+
+class ArchivedAgreement(AgreementBase):
+    season_id: int
+    created_at: Optional[datetime] = None
+    archived_at: datetime
+
+
+class ArchivedDhanAwak(DhanAwakEntry):
+    season_id: int
+    archived_at: datetime
+
+
+class DoBalance(BaseModel):
+    do_id: int
+    do_number: str
+    total_weight: float
+    total_bardana: float
+    received_weight: float
+    received_bags: int
+    arrival_count: int
+    pending_weight: float
+    pending_bags: float
+
+
+class DhanAwakBatchResult(BaseModel):
+    inserted: int
+    skipped_rst_numbers: List[str]
+    balances: List[DoBalance]
+
+
+class RiceDepositeBase(BaseModel):
+    rice_mill_id: int
+    ware_house_id: int
+    truck_id: Optional[int] = None
+    deposit_date: date
+    lot_number: Optional[str] = Field(default=None, max_length=50)
+    bags: int = Field(ge=0)
+    weight: float = Field(gt=0)
+
+
+class RiceDepositeEntry(RiceDepositeBase):
+    rice_deposite_id: int
+    transporting_rate: Optional[int] = None
+    hamali_rate: Optional[int] = None
+    transporting_cost: float
+    hamali_cost: float
+    total_cost: float
+    created_at: Optional[datetime] = None
+
+
+class WarehouseDepositTotals(BaseModel):
+    ware_house_id: int
+    ware_house_name: Optional[str] = None
+    deposits: int
+    bags: int
+    weight: float
+    transporting_cost: float
+    hamali_cost: float
+    total_cost: float
+    last_deposit_date: Optional[date] = None
+
+
+class RiceDepositeBatchResult(BaseModel):
+    inserted: int
+    warehouse_totals: List[WarehouseDepositTotals]
+
+
+class ByproductSaleBase(BaseModel):
+    rice_mill_id: int
+    party_id: int
+    broker_id: Optional[int] = None
+    truck_id: Optional[int] = None
+    product: Literal[PRODUCTS]
+    sale_date: date
+    # Quintals and rupees per quintal
+    quantity: float = Field(gt=0)
+    rate: float = Field(ge=0)
+
+
+class ByproductSaleEntry(ByproductSaleBase):
+    sale_id: int
+    sale_month: int
+    amount: float
+    created_at: Optional[datetime] = None
+
+
+class ByproductRollup(BaseModel):
+    id: Optional[int] = None
+    product: str
+    sales: int
+    quantity: float
+    amount: float
+
+
+class ByproductPartition(BaseModel):
+    month: int
+    rows: Optional[int] = None
+
+
+class StockMovementBase(BaseModel):
+    rice_mill_id: int
+    commodity: Literal[COMMODITIES]
+    movement_type: Literal[tuple(sorted(MOVEMENT_TYPES))]
+    # Quintals. Inflow / outflow types set the sign, adjustments keep theirs.
+    quantity: float
+    movement_date: date
+    reference: Optional[str] = Field(default=None, max_length=64)
+
+
+class StockMovementEntry(StockMovementBase):
+    movement_id: int
+    created_at: Optional[datetime] = None
+
+
+class StockLevel(BaseModel):
+    rice_mill_id: int
+    commodity: str
+    quantity: float
+    snapshot_quantity: float
+    snapshot_at: Optional[datetime] = None
+    movements_since_snapshot: int
+
+
+class TypeaheadMatch(BaseModel):
+    id: int
+    name: str
+
+
+class AuditLogEntry(BaseModel):
+    audit_id: int
+    actor_id: Optional[int] = None
+    actor_name: Optional[str] = None
+    entity: str
+    entity_id: Optional[str] = None
+    action: str
+    changes: Optional[dict] = None
+    created_at: datetime
+
+
+# Responses of endpoints taking ?fields=: the same fields, all optional, and
+# sent only when selected (response_model_exclude_unset)
+def sparse(model):
+    return create_model(
+        f"Sparse{model.__name__}",
+        **{
+            name: (Optional[field.annotation], None)
+            for name, field in model.model_fields.items()
+        },
+    )
+
+
+SparseRiceMill = sparse(AddRiceMillBase)
+SparseTransporter = sparse(TransporterBase)
+SparseTruck = sparse(TruckBase)
+SparseTruckWithTransporter = sparse(TruckWithTransporter)
+SparseSociety = sparse(SocietyBase)
+SparseAgreement = sparse(RiceMillWithAgreement)
+SparseWareHouse = sparse(WareHouseTransporting)
+SparseKochia = sparse(KochiaWithRiceMill)
+SparseDo = sparse(AddDoWithAddRiceMillAgreementSocietyTruck)
@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+import models
+
+# Models whose rows belong to the user that wrote them (their user_id). A
+# request's session only reads, updates and deletes the current user's
+# rows of these; each has an index leading on user_id for that filter.
+OWNED_MODELS = (
+    models.Add_Rice_Mill,
+    models.Transporter,
+    models.Truck,
+    models.Society,
+    models.Agreement,
+    models.ware_house_transporting,
+    models.Kochia,
+    models.Party,
+    models.brokers,
+    models.Add_Do,
+    models.Dhan_Awak,
+    models.Rice_deposite,
+    models.ByproductSale,
+    models.StockMovement,
+    models.Tombstone,
+)
+
+
+# The user a session is scoped to: info["owner_id"] if set (jobs acting for
+# a user), else the request's authenticated user. None for sessions outside
+# a request (startup, CLI jobs), which see every row.
+def owner_id(session):
+    if session.info.get("owner_id") is not None:
+        return session.info["owner_id"]
+    request_state = session.info.get("request_state")
+    current_user = getattr(request_state, "current_user", None)
+    return current_user.id if current_user is not None else None
+
+
+# Add `user_id = owner` to every ORM SELECT / UPDATE / DELETE, including
+# column-only queries, joins and relationship loads. Pass
+# execution_options(all_owners=True) to opt a statement out.
+@event.listens_for(Session, "do_orm_execute")
+def scope_to_owner(orm_execute_state):
+    if not (
+        orm_execute_state.is_select
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    if orm_execute_state.execution_options.get("all_owners"):
+        return
+    owner = owner_id(orm_execute_state.session)
+    if owner is None:
+        return
+    orm_execute_state.statement = orm_execute_state.statement.options(
+        *(
+            with_loader_criteria(
+                model, lambda cls: cls.user_id == owner, include_aliases=True
+            )
+            for model in OWNED_MODELS
+        )
+    )
+
+
+# Stamp the owner on new rows that were added without a user_id
+@event.listens_for(Session, "before_flush")
+def stamp_owner(session, flush_context, instances):
+    owner = owner_id(session)
+    if owner is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, OWNED_MODELS) and obj.user_id is None:
+            obj.user_id = owner
@@ -0,0 +1,209 @@
+import sys
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, exists, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+
+# DOs (with their arrivals) moved per transaction, so an archival run never
+# holds locks on the hot tables for long
+ARCHIVE_BATCH_SIZE = settings.season_archive_batch_size
+
+
+def get_season(db: Session, season_id: int):
+    season = db.get(models.Season, season_id)
+    if season is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Season with ID {season_id} not found",
+        )
+    return season
+
+
+def check_season_open(db: Session, season_id: int):
+    if season_id is None:
+        return
+    season = get_season(db, season_id)
+    if season.closed_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Season {season.season_name} is closed",
+        )
+
+
+# Season for a DO / agreement being written: the one given, or else the
+# season covering `on_date` (None if no season covers it). Closed seasons
+# take no new or changed rows.
+def resolve_season(db: Session, season_id: int, on_date: date):
+    if season_id is None:
+        season_id = db.execute(
+            select(models.Season.season_id).where(
+                models.Season.start_date <= on_date,
+                models.Season.end_date >= on_date,
+            )
+        ).scalar()
+    check_season_open(db, season_id)
+    return season_id
+
+
+def check_no_overlap(db: Session, start_date: date, end_date: date):
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Season ends before it starts",
+        )
+    overlapping = db.execute(
+        select(models.Season.season_name).where(
+            models.Season.start_date <= end_date,
+            models.Season.end_date >= start_date,
+        )
+    ).scalar()
+    if overlapping:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Overlaps season {overlapping}",
+        )
+
+
+# Put DOs and agreements written before the season existed into it.
+# Seasons are shared (and only administrators create them), so this covers
+# every user's rows.
+def assign_season(db: Session, season):
+    db.execute(
+        update(models.Add_Do)
+        .where(
+            models.Add_Do.season_id.is_(None),
+            models.Add_Do.date.between(season.start_date, season.end_date),
+        )
+        .values(season_id=season.season_id)
+        .execution_options(synchronize_session=False, all_owners=True)
+    )
+    db.execute(
+        update(models.Agreement)
+        .where(
+            models.Agreement.season_id.is_(None),
+            models.Agreement.created_at >= season.start_date,
+            models.Agreement.created_at < season.end_date + timedelta(days=1),
+        )
+        .values(season_id=season.season_id)
+        .execution_options(synchronize_session=False, all_owners=True)
+    )
+
+
+# INSERT ... SELECT the matching rows into the archive table, then DELETE
+# them from the hot table. Core statements: the append-only guard on the
+# arrival ledger only covers ORM deletes, and archival is the one path
+# allowed to move its rows. The rows live on in the archive, so the DELETE
+# is not audited row by row.
+def move_rows(db: Session, model, archive, condition, season_id: int, archived_at):
+    source = model.__table__
+    columns = [source.c[name] for name in archive.c.keys() if name in source.c]
+    names = [column.name for column in columns]
+    if "season_id" not in source.c:
+        columns.append(literal(season_id).label("season_id"))
+        names.append("season_id")
+    columns.append(literal(archived_at).label("archived_at"))
+    names.append("archived_at")
+    db.execute(insert(archive).from_select(names, select(*columns).where(condition)))
+    result = db.execute(
+        delete(model)
+        .where(condition)
+        .execution_options(synchronize_session=False, audit=False)
+    )
+    return result.rowcount
+
+
+# Move a closed season out of the hot tables, one batch of DOs per
+# transaction: their arrivals first, then the DOs. Agreements follow once no
+# remaining DO points at them. Covers every user's rows, so it only runs for
+# administrators (or from the command line). Safe to re-run after an
+# interruption.
+def archive_season(db: Session, season_id: int, batch_size: int = None):
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    season = get_season(db, season_id)
+    if season.closed_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Close the season before archiving it",
+        )
+    moved = {"dos": 0, "arrivals": 0, "agreements": 0}
+
+    while True:
+        do_ids = (
+            db.execute(
+                select(models.Add_Do.do_id)
+                .where(models.Add_Do.season_id == season_id)
+                .order_by(models.Add_Do.do_id)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not do_ids:
+            break
+        archived_at = datetime.now()
+        moved["arrivals"] += move_rows(
+            db,
+            models.Dhan_Awak,
+            models.dhanawak_archive,
+            models.Dhan_Awak.do_id.in_(do_ids),
+            season_id,
+            archived_at,
+        )
+        moved["dos"] += move_rows(
+            db,
+            models.Add_Do,
+            models.do_archive,
+            models.Add_Do.do_id.in_(do_ids),
+            season_id,
+            archived_at,
+        )
+        db.commit()
+
+    still_used = exists().where(
+        models.Add_Do.select_argeement_id == models.Agreement.agremennt_id
+    )
+    while True:
+        agreement_ids = (
+            db.execute(
+                select(models.Agreement.agremennt_id)
+                .where(models.Agreement.season_id == season_id, ~still_used)
+                .order_by(models.Agreement.agremennt_id)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not agreement_ids:
+            break
+        moved["agreements"] += move_rows(
+            db,
+            models.Agreement,
+            models.agreement_archive,
+            models.Agreement.agremennt_id.in_(agreement_ids),
+            season_id,
+            datetime.now(),
+        )
+        db.commit()
+
+    season = get_season(db, season_id)
+    season.archived_at = datetime.now()
+    db.commit()
+    return moved
+
+
+# Archive from the command line (e.g. a cron job):
+#
+#     python seasons.py archive <season_id>
+if __name__ == "__main__":
+    import cache  # noqa: F401  bumps table versions on commit
+    import sync  # noqa: F401  tombstones the archived rows
+    from database import SessionLocal
+
+    if len(sys.argv) != 3 or sys.argv[1] != "archive":
+        sys.exit("usage: python seasons.py archive <season_id>")
+    with SessionLocal() as session:
+        print(archive_season(session, int(sys.argv[2])))
@@ -0,0 +1,181 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from database import upsert
+
+COMMODITIES = (
+    "paddy",
+    "rice",
+    "broken",
+    "husk",
+    "bran",
+    "nakkhi",
+    "bhushi",
+    "frk",
+    "other",
+)
+
+# Movement types and the sign they give the quantity. Adjustments carry
+# their own sign.
+INFLOW_TYPES = {
+    "dhan_awak",
+    "other_awak",
+    "rice_purchase",
+    "frk_purchase",
+    "milling_output",
+}
+OUTFLOW_TYPES = {
+    "rice_deposite",
+    "other_jawak",
+    "broken_jawak",
+    "husk_jawak",
+    "nakkhi_jawak",
+    "bran_jawak",
+    "bhushi_jawak",
+    "paddy_sale",
+    "milling_input",
+}
+MOVEMENT_TYPES = INFLOW_TYPES | OUTFLOW_TYPES | {"adjustment"}
+
+# Fold the delta into a new snapshot once this many movements piled up
+SNAPSHOT_INTERVAL = settings.stock_snapshot_interval
+
+
+@event.listens_for(models.StockMovement, "before_update")
+@event.listens_for(models.StockMovement, "before_delete")
+def reject_movement_change(mapper, connection, target):
+    raise ValueError("Stock movements are append-only, post an adjustment instead")
+
+
+def signed_quantity(movement_type: str, quantity: float) -> float:
+    if movement_type in OUTFLOW_TYPES:
+        return -abs(quantity)
+    if movement_type in INFLOW_TYPES:
+        return abs(quantity)
+    return quantity
+
+
+# Append movements (dicts with rice_mill_id, commodity, movement_type,
+# quantity already signed, movement_date, reference, user_id) and move the
+# balances, inside the caller's transaction.
+#
+# Each balance row is updated before its movements are inserted, so the row
+# lock is held while they are written: a snapshot taken under the same lock
+# never misses a movement that is still uncommitted.
+def record_movements(db: Session, movements):
+    totals = defaultdict(lambda: [0.0, 0])
+    for movement in movements:
+        total = totals[(movement["rice_mill_id"], movement["commodity"])]
+        total[0] += movement["quantity"]
+        total[1] += 1
+
+    # Sorted so concurrent writers lock balance rows in the same order
+    for (rice_mill_id, commodity), (quantity, count) in sorted(totals.items()):
+        upsert(
+            db,
+            models.StockBalance,
+            {
+                "rice_mill_id": rice_mill_id,
+                "commodity": commodity,
+                "snapshot_quantity": 0,
+                "snapshot_movement_id": 0,
+                "delta_quantity": quantity,
+                "delta_movements": count,
+            },
+            lambda new: {
+                "delta_quantity": models.StockBalance.delta_quantity
+                + new.delta_quantity,
+                "delta_movements": models.StockBalance.delta_movements
+                + new.delta_movements,
+            },
+        )
+
+    if movements:
+        db.execute(insert(models.StockMovement), movements)
+
+    for rice_mill_id, commodity in sorted(totals):
+        balance = db.execute(
+            select(models.StockBalance.delta_movements).where(
+                models.StockBalance.rice_mill_id == rice_mill_id,
+                models.StockBalance.commodity == commodity,
+            )
+        ).scalar()
+        if balance >= SNAPSHOT_INTERVAL:
+            take_snapshot(db, rice_mill_id, commodity)
+    return sorted(totals)
+
+
+# Fold the delta of one balance into a new snapshot. Locks the balance row.
+def take_snapshot(db: Session, rice_mill_id: int, commodity: str):
+    balance = db.execute(
+        select(models.StockBalance)
+        .where(
+            models.StockBalance.rice_mill_id == rice_mill_id,
+            models.StockBalance.commodity == commodity,
+        )
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    if balance.delta_movements == 0:
+        return False
+
+    last_movement_id = db.execute(
+        select(func.max(models.StockMovement.movement_id))
+        .where(
+            models.StockMovement.rice_mill_id == rice_mill_id,
+            models.StockMovement.commodity == commodity,
+        )
+        .execution_options(all_owners=True)
+    ).scalar()
+    if last_movement_id is None:
+        # A delta with no movement rows behind it: nothing to anchor to
+        return False
+    quantity = balance.snapshot_quantity + balance.delta_quantity
+    taken_at = datetime.now()
+    db.execute(
+        insert(models.StockSnapshot).values(
+            rice_mill_id=rice_mill_id,
+            commodity=commodity,
+            quantity=quantity,
+            last_movement_id=last_movement_id,
+            taken_at=taken_at,
+        )
+    )
+    db.execute(
+        update(models.StockBalance)
+        .where(
+            models.StockBalance.rice_mill_id == rice_mill_id,
+            models.StockBalance.commodity == commodity,
+        )
+        .values(
+            snapshot_quantity=quantity,
+            snapshot_movement_id=last_movement_id,
+            snapshot_at=taken_at,
+            delta_quantity=0,
+            delta_movements=0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+# Snapshot every balance with movements since its last snapshot, one
+# transaction per balance so writers are blocked only briefly. Covers every
+# user's mills: run it on a session outside any request.
+def take_all_snapshots(db: Session):
+    keys = db.execute(
+        select(models.StockBalance.rice_mill_id, models.StockBalance.commodity)
+        .where(models.StockBalance.delta_movements > 0)
+        .execution_options(all_owners=True)
+    ).all()
+    db.rollback()
+    taken = 0
+    for rice_mill_id, commodity in keys:
+        taken += take_snapshot(db, rice_mill_id, commodity)
+        db.commit()
+    return taken
@@ -0,0 +1,144 @@
+import sys
+from datetime import timedelta
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from queries import (
+    agreement_columns,
+    broker_columns,
+    do_columns,
+    kochia_columns,
+    party_columns,
+    rice_mill_columns,
+    society_columns,
+    transporter_columns,
+    truck_columns,
+    ware_house_columns,
+)
+
+SYNC_OVERLAP = timedelta(seconds=settings.sync_overlap_seconds)
+TOMBSTONE_RETENTION = timedelta(days=settings.sync_tombstone_retention_days)
+
+# Entities served by the delta sync: (model, columns sent for a row)
+SYNC_ENTITIES = {
+    "rice_mills": (models.Add_Rice_Mill, rice_mill_columns),
+    "transporters": (models.Transporter, transporter_columns),
+    "trucks": (models.Truck, truck_columns),
+    "societies": (models.Society, society_columns),
+    "agreements": (models.Agreement, agreement_columns),
+    "warehouses": (models.ware_house_transporting, ware_house_columns),
+    "kochia": (models.Kochia, kochia_columns),
+    "parties": (models.Party, party_columns),
+    "brokers": (models.brokers, broker_columns),
+    "dos": (models.Add_Do, do_columns),
+}
+
+ENTITY_BY_TABLE = {
+    model.__tablename__: entity for entity, (model, _) in SYNC_ENTITIES.items()
+}
+
+
+def write_tombstones(session, entity: str, rows):
+    if rows:
+        session.connection().execute(
+            insert(models.Tombstone),
+            [
+                {"entity": entity, "entity_id": row_id, "user_id": user_id}
+                for row_id, user_id in rows
+            ],
+        )
+
+
+# Rows deleted through the ORM (db.delete(obj))
+@event.listens_for(Session, "after_flush")
+def tombstone_flushed_deletes(session, flush_context):
+    deleted = {}
+    for obj in session.deleted:
+        entity = ENTITY_BY_TABLE.get(obj.__table__.name)
+        if entity is None:
+            continue
+        row_id = obj.__mapper__.primary_key_from_instance(obj)[0]
+        deleted.setdefault(entity, []).append((row_id, obj.user_id))
+    for entity, rows in deleted.items():
+        write_tombstones(session, entity, rows)
+
+
+# Bulk DELETE statements (chunked deletes, season archival): read the ids
+# the statement is about to remove, in the same transaction and scope
+@event.listens_for(Session, "do_orm_execute")
+def tombstone_bulk_deletes(orm_execute_state):
+    if not orm_execute_state.is_delete:
+        return
+    entity = ENTITY_BY_TABLE.get(orm_execute_state.statement.table.name)
+    if entity is None:
+        return
+    model = SYNC_ENTITIES[entity][0]
+    query = select(model.__mapper__.primary_key[0], model.user_id)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    rows = orm_execute_state.session.execute(query).all()
+    write_tombstones(orm_execute_state.session, entity, rows)
+
+
+# Rows of `entities` created or changed at or after `since`, and the ids
+# deleted since then, for the session's user. Without `since` (first sync)
+# or with one older than the tombstones kept, everything is sent with
+# full_resync set, and the client replaces its copy. The watermark to send
+# next time comes from the database clock, the one updated_at is written
+# with.
+def changes_since(db: Session, since, entities):
+    now = db.execute(select(func.now())).scalar()
+    full_resync = since is None or since < now - TOMBSTONE_RETENTION
+    changes = {}
+    for entity in entities:
+        model, columns = SYNC_ENTITIES[entity]
+        query = db.query(*columns, model.updated_at)
+        if not full_resync:
+            query = query.filter(model.updated_at >= since)
+        changes[entity] = [
+            row._asdict() for row in query.order_by(model.updated_at).all()
+        ]
+
+    deleted = {entity: [] for entity in entities}
+    if not full_resync:
+        tombstones = db.query(
+            models.Tombstone.entity, models.Tombstone.entity_id
+        ).filter(
+            models.Tombstone.deleted_at >= since,
+            models.Tombstone.entity.in_(entities),
+        )
+        for entity, entity_id in tombstones:
+            deleted[entity].append(entity_id)
+
+    return {
+        "watermark": now - SYNC_OVERLAP,
+        "full_resync": full_resync,
+        "changes": changes,
+        "deleted": deleted,
+    }
+
+
+def prune_tombstones(db: Session):
+    cutoff = db.execute(select(func.now())).scalar() - TOMBSTONE_RETENTION
+    result = db.execute(
+        delete(models.Tombstone)
+        .where(models.Tombstone.deleted_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+# Drop tombstones past the retention (e.g. from a daily cron job):
+#
+#     python sync.py prune-tombstones
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if sys.argv[1:] != ["prune-tombstones"]:
+        sys.exit("usage: python sync.py prune-tombstones")
+    with SessionLocal() as session:
+        print(f"{prune_tombstones(session)} tombstones removed")
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from sqlalchemy import event, insert, select, update
+
+from database import Base, engine
+from models import TableVersion
+
+# How long a worker trusts its last read of table_versions before asking
+# the database again.
+VERSION_CHECK_INTERVAL = 0.3
+
+_versions = {}
+_versions_read_at = 0.0
+_versions_lock = threading.Lock()
+
+
+# Seed one row per table when the registry table is created so write paths
+# only ever need an UPDATE.
+@event.listens_for(TableVersion.__table__, "after_create")
+def seed_table_versions(target, connection, **kw):
+    connection.execute(
+        insert(TableVersion),
+        [
+            {"table_name": name, "version": 0}
+            for name in sorted(Base.metadata.tables)
+            if name != TableVersion.__tablename__
+        ],
+    )
+
+
+# Bump the version of every written table. Called from the session's
+# before_commit hook so it runs inside the writer's transaction.
+def bump_table_versions(session, tables):
+    for table_name in sorted(tables):
+        if table_name == TableVersion.__tablename__:
+            continue
+        result = session.execute(
+            update(TableVersion)
+            .where(TableVersion.table_name == table_name)
+            .values(version=TableVersion.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.execute(
+                insert(TableVersion).values(table_name=table_name, version=1)
+            )
+
+
+# Current {table_name: version}, re-read at most every VERSION_CHECK_INTERVAL
+def current_table_versions(max_age: float = VERSION_CHECK_INTERVAL):
+    global _versions, _versions_read_at
+
+    now = time.monotonic()
+    if now - _versions_read_at < max_age:
+        return _versions
+
+    with _versions_lock:
+        if time.monotonic() - _versions_read_at < max_age:
+            return _versions
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(TableVersion.table_name, TableVersion.version)
+            ).all()
+        _versions = {row.table_name: row.version for row in rows}
+        _versions_read_at = time.monotonic()
+        return _versions
+
+
+# Force the next current_table_versions() call to hit the database, so a
+# worker sees its own writes immediately.
+def expire_local_versions():
+    global _versions_read_at
+    _versions_read_at = 0.0
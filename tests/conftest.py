@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Two SQLite files stand in for the MySQL primary and its read replica. Set
+# before anything imports config, which reads the environment once.
+_data_dir = tempfile.mkdtemp(prefix="rice-mill-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir}/primary.db"
+os.environ["READ_DATABASE_URL"] = f"sqlite:///{_data_dir}/replica.db"
+os.environ["SECRET_KEY"] = "test-secret"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+os.environ["TELEGRAM_CHAT_ID"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Schema on both databases, created once per run
+@pytest.fixture(scope="session")
+def databases():
+    import create_tables
+    from database import Base, engine, read_engine
+
+    create_tables.create_tables()
+    Base.metadata.create_all(bind=read_engine)
+    return engine, read_engine
+
+
+# Local HTTP server answering from a script of (status, json body, delay)
+# responses, then 200 {"ok": true}. Records (time, path, json body) of
+# every request it receives.
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = deque()
+        self.requests = []
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        self.server.requests.append(
+            (time.monotonic(), self.path, json.loads(body) if body else None)
+        )
+        if self.server.script:
+            status, payload, delay = self.server.script.popleft()
+        else:
+            status, payload, delay = 200, {"ok": True}, 0
+        time.sleep(delay)
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            # The client gave up (timeout) before the reply
+            pass
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Poll `condition` until it holds or `timeout` passes
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
@@ -0,0 +1,59 @@
+from datetime import date
+
+from sqlalchemy import insert
+
+import models
+from audit import audit_buffer
+from database import SessionLocal
+from deletes import delete_in_chunks
+
+
+def audit_entries(entity: str, action: str):
+    audit_buffer.flush()
+    with SessionLocal() as db:
+        return (
+            db.query(models.AuditLog)
+            .filter(models.AuditLog.entity == entity, models.AuditLog.action == action)
+            .all()
+        )
+
+
+def test_chunked_deletes_audit_every_row(databases):
+    with SessionLocal() as db:
+        for name in ("Audit P1", "Audit P2", "Audit P3"):
+            db.add(models.Party(party_name=name, party_phone_number=1))
+        db.commit()
+    with SessionLocal() as db:
+        delete_in_chunks(
+            db, models.Party, models.Party.party_name.like("Audit P%"), chunk_size=2
+        )
+    deleted = audit_entries(models.Party.__tablename__, "delete")
+    assert sorted(entry.changes["before"]["party_name"] for entry in deleted) == [
+        "Audit P1",
+        "Audit P2",
+        "Audit P3",
+    ]
+    assert all(entry.entity_id for entry in deleted)
+
+
+def test_bulk_inserted_ledger_rows_are_audited(databases):
+    movement = {
+        "rice_mill_id": 55,
+        "commodity": "bran",
+        "movement_type": "adjustment",
+        "quantity": 4.0,
+        "movement_date": date(2024, 10, 2),
+        "user_id": 1,
+    }
+    with SessionLocal() as db:
+        db.execute(
+            insert(models.StockMovement),
+            [movement, dict(movement, quantity=6.0)],
+        )
+        db.commit()
+    created = [
+        entry.changes["after"]["quantity"]
+        for entry in audit_entries(models.StockMovement.__tablename__, "create")
+        if entry.changes["after"]["rice_mill_id"] == 55
+    ]
+    assert sorted(created) == [4.0, 6.0]
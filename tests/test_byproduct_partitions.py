@@ -0,0 +1,57 @@
+import pytest
+from fastapi import HTTPException
+
+from byproducts import MonthlyPartitions
+
+
+# Records the DDL a MySQL connection would run
+class FakeMySQL:
+    class dialect:
+        name = "mysql"
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+def add_partition(existing, month):
+    partitions = MonthlyPartitions()
+    partitions.list = lambda connection: dict.fromkeys(existing, 0)
+    connection = FakeMySQL()
+    partitions._add_partition(connection, month)
+    return connection.statements
+
+
+def test_later_month_fills_the_gap_after_the_newest_partition():
+    (statement,) = add_partition([202401], 202404)
+    assert "REORGANIZE PARTITION p_future INTO" in statement
+    for month, bound in ((202402, 202403), (202403, 202404), (202404, 202405)):
+        assert f"PARTITION p{month} VALUES LESS THAN ({bound})" in statement
+    assert statement.endswith("PARTITION p_future VALUES LESS THAN MAXVALUE)")
+
+
+def test_month_in_a_gap_splits_the_partition_covering_it():
+    (statement,) = add_partition([202401, 202405], 202403)
+    assert "REORGANIZE PARTITION p202405 INTO" in statement
+    assert "PARTITION p202402 VALUES LESS THAN (202403)" in statement
+    assert statement.endswith("PARTITION p202405 VALUES LESS THAN (202406))")
+    assert "p_future" not in statement
+
+
+def test_month_older_than_every_partition_gets_its_own_range():
+    (statement,) = add_partition([202403], 202312)
+    assert "REORGANIZE PARTITION p202403 INTO" in statement
+    assert "PARTITION p202312 VALUES LESS THAN (202401)" in statement
+    assert "PARTITION p202402 VALUES LESS THAN (202403)" in statement
+
+
+def test_existing_month_is_left_alone():
+    assert add_partition([202401, 202402], 202402) == []
+
+
+def test_month_far_from_the_recorded_ones_is_refused():
+    with pytest.raises(HTTPException) as error:
+        add_partition([202401], 203001)
+    assert error.value.status_code == 400
@@ -0,0 +1,154 @@
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from cache import route_digest
+from cache_backends import InProcessBackend, RedisBackend
+
+
+# Speaks enough RESP (GET / SET PX / DEL / FLUSHDB) to stand in for Redis.
+# With `fail` set, every command is answered with an error.
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.server.reply(args))
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.fail = False
+
+    def reply(self, args):
+        command = args[0].upper()
+        if self.fail:
+            return b"-ERR unavailable\r\n"
+        if command == b"GET":
+            entry = self.data.get(args[1])
+            if entry is None or entry[1] < time.monotonic():
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+        if command == b"SET":
+            expires_at = time.monotonic() + int(args[4]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if command == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.fixture
+def fake_redis():
+    server = FakeRedis()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_backend(fake_redis):
+    host, port = fake_redis.server_address
+    return RedisBackend(f"redis://{host}:{port}/0", ttl=60)
+
+
+def test_in_process_hit_and_miss():
+    backend = InProcessBackend(max_entries=10, ttl=60)
+    backend.set("route:a", b"1", group="rice_mills")
+    assert backend.get("route:a") == b"1"
+    assert backend.get("route:b") is None
+    assert backend.stats()["hits"] == 1
+    assert backend.stats()["misses"] == 1
+
+
+def test_in_process_expiry_and_eviction():
+    backend = InProcessBackend(max_entries=2, ttl=60)
+    backend.set("expired", b"1", ttl=0)
+    assert backend.get("expired") is None
+    for key in ("a", "b", "c"):
+        backend.set(key, b"1")
+    assert backend.get("a") is None
+    assert backend.get("c") == b"1"
+
+
+def test_in_process_invalidation_drops_the_group_only():
+    backend = InProcessBackend(max_entries=10, ttl=60)
+    backend.set("mills", b"1", group="rice_mills")
+    backend.set("trucks", b"2", group="trucks")
+    backend.invalidate("rice_mills")
+    assert backend.get("mills") is None
+    assert backend.get("trucks") == b"2"
+
+
+def test_redis_hit_and_miss(redis_backend):
+    redis_backend.set("route:a", b"payload")
+    assert redis_backend.get("route:a") == b"payload"
+    assert redis_backend.get("route:b") is None
+    stats = redis_backend.stats()
+    assert (stats["hits"], stats["misses"], stats["errors"]) == (1, 1, 0)
+
+
+def test_redis_delete_and_clear(redis_backend):
+    redis_backend.set("a", b"1")
+    redis_backend.set("b", b"2")
+    redis_backend.delete("a")
+    assert redis_backend.get("a") is None
+    assert redis_backend.get("b") == b"2"
+    redis_backend.clear()
+    assert redis_backend.get("b") is None
+
+
+def test_redis_ttl(redis_backend):
+    redis_backend.set("short", b"1", ttl=0.05)
+    time.sleep(0.1)
+    assert redis_backend.get("short") is None
+
+
+def test_redis_error_reply_is_a_miss(redis_backend, fake_redis):
+    redis_backend.set("a", b"1")
+    fake_redis.fail = True
+    assert redis_backend.get("a") is None
+    assert redis_backend.stats()["errors"] == 1
+    fake_redis.fail = False
+    # Reconnects on the next command
+    assert redis_backend.get("a") == b"1"
+
+
+def test_redis_unreachable_is_a_miss():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    backend = RedisBackend(f"redis://127.0.0.1:{port}/0", timeout=0.2)
+    backend.set("a", b"1")
+    assert backend.get("a") is None
+    assert backend.stats()["errors"] == 2
+
+
+# Redis keys embed the versions of the tables a route reads, so a write
+# invalidates by moving readers to a new key
+def test_table_version_bump_changes_the_route_key(redis_backend):
+    key = ("rice_mills", "get_all_rice_mills", (("owner", 1),))
+    before = route_digest("rice_mills", key, {"addricemill": 3})
+    redis_backend.set("route:" + before, b"cached")
+    after = route_digest("rice_mills", key, {"addricemill": 4})
+    assert after != before
+    assert redis_backend.get("route:" + after) is None
+    assert route_digest("rice_mills", key, {"addricemill": 3, "party": 9}) == before
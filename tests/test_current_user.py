@@ -0,0 +1,27 @@
+from starlette.requests import Request
+
+from database import SessionLocal
+from models import User
+from util import CurrentUser, create_access_token, get_current_user, hash_password
+
+
+def test_current_user_is_a_plain_value_cached_or_not(databases):
+    with SessionLocal() as db:
+        db.add(User(name="Asha", email="asha@example.com", password=hash_password("p")))
+        db.commit()
+    token = create_access_token({"sub": "asha@example.com"})
+
+    users = []
+    for _ in range(2):  # the first call fills the user cache, the second reads it
+        request = Request({"type": "http", "headers": []})
+        with SessionLocal() as db:
+            users.append(get_current_user(request, db, token))
+        assert request.state.current_user is users[-1]
+
+    assert users[0] == users[1]
+    assert isinstance(users[1], CurrentUser)
+    assert (users[1].name, users[1].email, users[1].role) == (
+        "Asha",
+        "asha@example.com",
+        "admin",
+    )
@@ -0,0 +1,126 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+
+import dhan_awak
+import models
+from database import SessionLocal
+from schemas import DhanAwakBase
+
+
+def make_do(db, do_number: str):
+    do = models.Add_Do(
+        select_mill_id=1,
+        date=date(2024, 10, 1),
+        do_number=do_number,
+        select_argeement_id=1,
+        mota_weight=1,
+        mota_Bardana=1,
+        patla_weight=1,
+        patla_bardana=1,
+        sarna_weight=1,
+        sarna_bardana=1,
+        total_weight=3,
+        total_bardana=3,
+        society_name_id=1,
+        truck_number_id=1,
+        user_id=1,
+    )
+    db.add(do)
+    db.commit()
+    return do.do_id
+
+
+def arrival(do_id: int, rst_number: str):
+    return DhanAwakBase(
+        do_id=do_id,
+        rst_number=rst_number,
+        arrival_date=date(2024, 10, 2),
+        bags=10,
+        net_weight=1.5,
+    )
+
+
+def test_resent_slips_are_skipped(databases):
+    with SessionLocal() as db:
+        do_id = make_do(db, "DA-1")
+        assert dhan_awak.record_arrivals(db, [arrival(do_id, "A1")])[:2] == (1, [])
+        inserted, skipped, _ = dhan_awak.record_arrivals(
+            db, [arrival(do_id, "A1"), arrival(do_id, "A2"), arrival(do_id, "A2")]
+        )
+        assert (inserted, skipped) == (1, ["A1", "A2"])
+        assert db.get(models.Add_Do, do_id).arrival_count == 2
+
+
+# A concurrent batch commits the same slip after this batch checked for it:
+# the unique index rejects the INSERT, and the retry counts it as skipped
+def test_slip_recorded_concurrently_is_skipped(databases, monkeypatch):
+    with SessionLocal() as db:
+        do_id = make_do(db, "DA-2")
+    real_insert = dhan_awak.insert
+    raced = []
+
+    def racing_insert(model):
+        if model is models.Dhan_Awak and not raced:
+            raced.append(True)
+            with SessionLocal() as other:
+                other.execute(
+                    real_insert(models.Dhan_Awak).values(
+                        do_id=do_id,
+                        rice_mill_id=1,
+                        rst_number="RACE",
+                        arrival_date=date(2024, 10, 2),
+                        bags=1,
+                        net_weight=1.0,
+                    )
+                )
+                other.commit()
+        return real_insert(model)
+
+    monkeypatch.setattr(dhan_awak, "insert", racing_insert)
+    with SessionLocal() as db:
+        inserted, skipped, _ = dhan_awak.record_arrivals(
+            db, [arrival(do_id, "RACE"), arrival(do_id, "B1")]
+        )
+        assert (inserted, skipped) == (1, ["RACE"])
+        assert db.get(models.Add_Do, do_id).received_bags == 10
+        count = db.execute(
+            select(func.count()).where(models.Dhan_Awak.rst_number == "RACE")
+        ).scalar()
+        assert count == 1
+
+
+# A concurrent reversal commits after this one checked for it: the unique
+# reverses_id index rejects the INSERT, reported as a conflict
+def test_reversal_raced_by_another_is_a_conflict(databases, monkeypatch):
+    with SessionLocal() as db:
+        do_id = make_do(db, "DA-3")
+        dhan_awak.record_arrivals(db, [arrival(do_id, "C1")])
+        original = db.execute(
+            select(models.Dhan_Awak).where(models.Dhan_Awak.rst_number == "C1")
+        ).scalar_one()
+        original_id, mill_id = original.dhan_awak_id, original.rice_mill_id
+    real_insert = dhan_awak.insert
+
+    def racing_insert(model):
+        with SessionLocal() as other:
+            other.execute(
+                real_insert(models.Dhan_Awak).values(
+                    do_id=do_id,
+                    rice_mill_id=mill_id,
+                    arrival_date=date(2024, 10, 2),
+                    bags=-10,
+                    net_weight=-1.5,
+                    reverses_id=original_id,
+                )
+            )
+            other.commit()
+        return real_insert(model)
+
+    monkeypatch.setattr(dhan_awak, "insert", racing_insert)
+    with SessionLocal() as db:
+        with pytest.raises(HTTPException) as error:
+            dhan_awak.reverse_arrival(db, original_id)
+        assert error.value.status_code == 409
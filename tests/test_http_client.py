@@ -0,0 +1,94 @@
+import socket
+import time
+
+import pytest
+import requests
+
+from http_client import CircuitBreaker, CircuitOpenError, OutboundClient
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert 59 < breaker.before_call() <= 60
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # A second caller waits for the trial's outcome
+    assert breaker.before_call() > 0
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() == 0
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() == 0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.before_call() > 0
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_client_cycles_closed_open_half_open_closed(stub_server):
+    client = OutboundClient(failure_threshold=2, reset_timeout=0.2)
+    stub_server.script.extend([(500, {}, 0), (503, {}, 0)])
+    assert client.post(stub_server.url + "/a").status_code == 500
+    assert client.post(stub_server.url + "/a").status_code == 503
+
+    with pytest.raises(CircuitOpenError) as opened:
+        client.post(stub_server.url + "/a")
+    assert 0 < opened.value.retry_after <= 0.2
+    # Rejected without reaching the server
+    assert len(stub_server.requests) == 2
+
+    time.sleep(0.25)
+    assert client.post(stub_server.url + "/a").status_code == 200
+    breaker = client.breaker_for(stub_server.url.removeprefix("http://"))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["times_opened"] == 1
+
+
+def test_4xx_is_not_a_failure(stub_server):
+    client = OutboundClient(failure_threshold=1, reset_timeout=60)
+    stub_server.script.append((429, {}, 0))
+    assert client.post(stub_server.url).status_code == 429
+    assert client.post(stub_server.url).status_code == 200
+
+
+def test_read_timeout_counts_as_a_failure(stub_server):
+    client = OutboundClient(read_timeout=0.1, failure_threshold=1, reset_timeout=60)
+    stub_server.script.append((200, {}, 0.5))
+    started_at = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        client.post(stub_server.url)
+    assert time.monotonic() - started_at < 0.4
+    with pytest.raises(CircuitOpenError):
+        client.post(stub_server.url)
+
+
+def test_connection_refused_counts_as_a_failure():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    client = OutboundClient(connect_timeout=0.2, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get(f"http://127.0.0.1:{port}/")
+    with pytest.raises(CircuitOpenError):
+        client.get(f"http://127.0.0.1:{port}/")
+    assert client.stats()["hosts"][f"127.0.0.1:{port}"]["failures"] == 2
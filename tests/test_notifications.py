@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from conftest import wait_for
+from notifications import TelegramNotifier, TokenBucket
+
+
+@pytest.fixture
+def make_notifier(stub_server):
+    notifiers = []
+
+    def make(chat_ids=("1",), **kwargs):
+        notifier = TelegramNotifier(
+            "TOKEN", list(chat_ids), api_url=stub_server.url, **kwargs
+        )
+        notifiers.append(notifier)
+        return notifier
+
+    yield make
+    for notifier in notifiers:
+        notifier.close(timeout=0)
+
+
+def sent_texts(stub_server):
+    return [(body["chat_id"], body["text"]) for _, _, body in stub_server.requests]
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, capacity=2)
+    for _ in range(2):
+        assert bucket.wait_time() == 0
+        bucket.consume()
+    assert 0.05 < bucket.wait_time() <= 0.1
+    time.sleep(0.1)
+    assert bucket.wait_time() == 0
+
+
+def test_group_and_private_chats_get_their_own_limits(make_notifier):
+    notifier = make_notifier(
+        group_messages_per_minute=20, private_messages_per_second=1
+    )
+    group, private = notifier._chat_bucket("-100"), notifier._chat_bucket("42")
+    assert (group.rate, group.capacity) == (20 / 60, 20)
+    assert (private.rate, private.capacity) == (1, 1)
+    assert notifier._chat_bucket("42") is private
+
+
+def test_messages_go_to_every_chat(make_notifier, stub_server):
+    notifier = make_notifier(chat_ids=("1", "-2"))
+    notifier.send("DO added")
+    assert wait_for(lambda: notifier.sent == 2)
+    assert sorted(sent_texts(stub_server)) == [("-2", "DO added"), ("1", "DO added")]
+    assert stub_server.requests[0][1] == "/botTOKEN/sendMessage"
+
+
+def test_private_chat_is_paced(make_notifier, stub_server):
+    notifier = make_notifier(private_messages_per_second=5)
+    notifier.send("first")
+    notifier.send("second")
+    assert wait_for(lambda: notifier.sent == 2)
+    (first_at, _, _), (second_at, _, _) = stub_server.requests
+    assert second_at - first_at >= 0.15
+    assert notifier.stats()["throttled"] >= 1
+
+
+def test_digest_coalesces_a_window_into_one_message(make_notifier, stub_server):
+    notifier = make_notifier(digest_window=0.2)
+    for _ in range(3):
+        notifier.event("DOs added", "Mill X", 10)
+    notifier.event("Arrivals", "Mill Y")
+    notifier.send("Season closed")
+    assert wait_for(lambda: notifier.sent == 1)
+    time.sleep(0.3)
+    assert sent_texts(stub_server) == [
+        (
+            "1",
+            "3 DOs added at Mill X, total 30 qtl\n1 Arrivals at Mill Y\nSeason closed",
+        )
+    ]
+    assert notifier.stats()["coalesced"] == 5
+
+
+def test_digest_splits_at_the_message_limit(make_notifier):
+    notifier = make_notifier(digest_window=60)
+    messages = list(notifier._split(["x" * 3000, "y" * 3000, "z"]))
+    assert messages == ["x" * 3000, "y" * 3000 + "\nz"]
+
+
+def test_429_retry_after_is_honoured(make_notifier, stub_server):
+    stub_server.script.append((429, {"ok": False, "parameters": {"retry_after": 1}}, 0))
+    notifier = make_notifier()
+    notifier.send("rate limited once")
+    assert wait_for(lambda: notifier.sent == 1)
+    (first_at, _, _), (second_at, _, body) = stub_server.requests
+    assert second_at - first_at >= 0.9
+    assert body["text"] == "rate limited once"
+    assert notifier.stats()["failed"] == 0
+
+
+def test_rejected_message_is_dropped_not_retried(make_notifier, stub_server):
+    stub_server.script.append((400, {"ok": False}, 0))
+    notifier = make_notifier()
+    notifier.send("bad")
+    notifier.send("good")
+    assert wait_for(lambda: notifier.sent == 1)
+    assert notifier.failed == 1
+    assert [text for _, text in sent_texts(stub_server)] == ["bad", "good"]
+
+
+def test_failed_delivery_log_leaves_out_the_bot_token(make_notifier, caplog):
+    notifier = make_notifier()
+
+    def unreachable(url, payload):
+        raise ConnectionError(f"Max retries exceeded with url: {url}")
+
+    notifier._post = unreachable
+    notifier.send("lost")
+    assert wait_for(lambda: notifier.failed == 1)
+    assert "ConnectionError" in caplog.text
+    assert "TOKEN" not in caplog.text
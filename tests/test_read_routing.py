@@ -0,0 +1,92 @@
+from sqlalchemy import insert, select, update
+from starlette.requests import Request
+
+import database
+from database import ReadSessionLocal, SessionLocal, get_db, get_read_db
+from models import Role
+
+
+def request_from(authorization: str):
+    return Request(
+        {"type": "http", "headers": [(b"authorization", authorization.encode())]}
+    )
+
+
+def role_names(connection_or_session, prefix: str):
+    return set(
+        connection_or_session.execute(
+            select(Role.role_name).where(Role.role_name.startswith(prefix))
+        ).scalars()
+    )
+
+
+def test_reads_go_to_the_replica(databases):
+    primary, replica = databases
+    with replica.begin() as connection:
+        connection.execute(insert(Role), [{"role_name": "replica-only"}])
+
+    with ReadSessionLocal() as db:
+        assert role_names(db, "replica-only") == {"replica-only"}
+        assert not db.info.get("primary")
+    with SessionLocal() as db:
+        assert role_names(db, "replica-only") == set()
+
+
+def test_flushes_and_dml_go_to_the_primary(databases):
+    primary, replica = databases
+    with ReadSessionLocal() as db:
+        db.add(Role(role_name="flushed"))
+        db.commit()
+    with primary.connect() as connection:
+        assert role_names(connection, "flushed") == {"flushed"}
+    with replica.connect() as connection:
+        assert role_names(connection, "flushed") == set()
+
+    with ReadSessionLocal() as db:
+        db.execute(
+            update(Role).where(Role.role_name == "flushed").values(role_name="flushed2")
+        )
+        # Pinned after DML: reads in the same session see the write
+        assert db.info["primary"] is True
+        assert role_names(db, "flushed") == {"flushed2"}
+        db.commit()
+
+
+def test_client_reads_its_own_writes(databases):
+    writer = request_from("Bearer writer")
+    db = next(get_db(writer))
+    db.add(Role(role_name="sticky"))
+    db.commit()
+    db.close()
+
+    read_db = next(get_read_db(request_from("Bearer writer")))
+    assert read_db.info["primary"] is True
+    assert role_names(read_db, "sticky") == {"sticky"}
+    read_db.close()
+
+    # Other clients keep reading the replica, which has not caught up
+    other_db = next(get_read_db(request_from("Bearer other")))
+    assert not other_db.info.get("primary")
+    assert role_names(other_db, "sticky") == set()
+    other_db.close()
+
+
+def test_stickiness_ends_after_the_window(databases, monkeypatch):
+    db = next(get_db(request_from("Bearer brief")))
+    db.add(Role(role_name="brief"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(database, "READ_AFTER_WRITE_WINDOW", 0)
+    read_db = next(get_read_db(request_from("Bearer brief")))
+    assert not read_db.info.get("primary")
+    read_db.close()
+
+
+def test_sessions_are_created_lazily(databases):
+    stats = database.get_pool_stats()
+    db = next(get_read_db(request_from("Bearer lazy")))
+    db.close()
+    after = database.get_pool_stats()
+    assert after["sessions_requested"] == stats["sessions_requested"] + 1
+    assert after["sessions_materialized"] == stats["sessions_materialized"]
@@ -0,0 +1,53 @@
+from datetime import date
+
+import models
+from database import SessionLocal
+from rice_deposite import add_to_warehouse_totals
+from stock import record_movements
+
+
+def movement(quantity: float):
+    return {
+        "rice_mill_id": 77,
+        "commodity": "paddy",
+        "movement_type": "adjustment",
+        "quantity": quantity,
+        "movement_date": date(2024, 10, 2),
+        "reference": None,
+        "user_id": 1,
+    }
+
+
+def test_first_movement_creates_the_balance_and_later_ones_add(databases):
+    for quantities in ([5.0, 2.5], [-1.5]):
+        with SessionLocal() as db:
+            record_movements(db, [movement(quantity) for quantity in quantities])
+            db.commit()
+    with SessionLocal() as db:
+        balance = db.get(models.StockBalance, (77, "paddy"))
+        assert (balance.delta_quantity, balance.delta_movements) == (6.0, 3)
+
+
+def totals(deposit_date: date, bags: int):
+    return {
+        "deposits": 1,
+        "bags": bags,
+        "weight": bags * 0.5,
+        "transporting_cost": 10.0,
+        "hamali_cost": 2.0,
+        "total_cost": 12.0,
+        "last_deposit_date": deposit_date,
+    }
+
+
+def test_warehouse_totals_are_created_then_added_to(databases):
+    for deposit_date, bags in ((date(2024, 10, 5), 100), (date(2024, 10, 3), 40)):
+        with SessionLocal() as db:
+            add_to_warehouse_totals(db, {88: totals(deposit_date, bags)})
+            db.commit()
+    with SessionLocal() as db:
+        total = db.get(models.WarehouseDepositTotal, 88)
+        assert (total.deposits, total.bags, total.weight) == (2, 140, 70.0)
+        assert total.total_cost == 24.0
+        # The latest date is kept, whatever order deposits arrive in
+        assert total.last_deposit_date == date(2024, 10, 5)
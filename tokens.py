@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import engine
+from models import BlacklistedToken
+from table_versions import current_table_versions
+
+ALGORITHM = "HS256"
+
+
+class TokenRevokedError(JWTError):
+    pass
+
+
+# One verified token: its claims, when it expires (epoch seconds, None for
+# tokens without exp) and the blacklisted_tokens version its revocation
+# status was last checked against.
+class VerifiedToken:
+    __slots__ = ("claims", "expires_at", "revocation_version", "revoked")
+
+    def __init__(self, claims: dict):
+        self.claims = claims
+        self.expires_at = claims.get("exp")
+        self.revocation_version = None
+        self.revoked = False
+
+
+# Verifies JWTs and remembers the decoded claims, keyed by a digest of the
+# token, until the token expires. Repeat requests with the same token skip
+# signature verification and claim parsing. Revocation status is cached too
+# and re-checked whenever the blacklisted_tokens table version moves, so a
+# logout on any worker is honoured on every worker.
+class TokenVerifier:
+    def __init__(
+        self, secret_key: str, algorithm: str = ALGORITHM, max_entries: int = 10000
+    ):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revocation_checks = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def _lookup(self, token: str) -> VerifiedToken:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at is not None and entry.expires_at <= time.time():
+                    del self._entries[key]
+                    raise ExpiredSignatureError("Signature has expired.")
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Raises ExpiredSignatureError / JWTError; failures are not cached
+        entry = VerifiedToken(
+            jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        )
+        with self._lock:
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    # Signature and expiry only
+    def decode(self, token: str) -> dict:
+        return dict(self._lookup(token).claims)
+
+    # Signature, expiry and revocation
+    def verify(self, token: str) -> dict:
+        entry = self._lookup(token)
+        if self._is_revoked(token, entry):
+            raise TokenRevokedError("Token has been revoked.")
+        return dict(entry.claims)
+
+    def is_revoked(self, token: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+        return self._is_revoked(token, entry)
+
+    def _is_revoked(self, token: str, entry: VerifiedToken = None) -> bool:
+        version = current_table_versions().get(BlacklistedToken.__tablename__, 0)
+        if entry is not None and entry.revocation_version == version:
+            return entry.revoked
+        # Primary, not the replica: a logout must take effect immediately
+        with engine.connect() as connection:
+            revoked = (
+                connection.execute(
+                    select(BlacklistedToken.token).where(
+                        BlacklistedToken.token == token
+                    )
+                ).first()
+                is not None
+            )
+        with self._lock:
+            self.revocation_checks += 1
+        if entry is not None:
+            entry.revoked = revoked
+            entry.revocation_version = version
+        return revoked
+
+    def revoke(self, token: str, db: Session):
+        db.add(BlacklistedToken(token=token))
+        db.commit()
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+            if entry is not None:
+                entry.revoked = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "revocation_checks": self.revocation_checks,
+            }
+
+
+token_verifier = TokenVerifier(
+    settings.secret_key, max_entries=settings.token_cache_size
+)
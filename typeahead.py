@@ -0,0 +1,228 @@
+import re
+import threading
+from bisect import bisect_left, insort
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import models
+from database import commit_hooks, engine
+from table_versions import current_table_versions, expire_local_versions
+
+
+def normalize_name(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+# Truck numbers are typed as "CG04 AB 1234", "cg04ab1234", "CG-04-AB-1234"
+def normalize_compact(text: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", text.casefold())
+
+
+# Typeahead lists: (id column, name column, how names are compared)
+TYPEAHEAD_SOURCES = {
+    "rice_mills": (
+        models.Add_Rice_Mill.rice_mill_id,
+        models.Add_Rice_Mill.rice_mill_name,
+        normalize_name,
+    ),
+    "societies": (
+        models.Society.society_id,
+        models.Society.society_name,
+        normalize_name,
+    ),
+    "parties": (models.Party.party_id, models.Party.party_name, normalize_name),
+    "brokers": (models.brokers.broker_id, models.brokers.broker_name, normalize_name),
+    "trucks": (models.Truck.truck_id, models.Truck.truck_number, normalize_compact),
+}
+
+# Mapped class -> list name, for picking written rows out of a flush
+SOURCE_BY_CLASS = {
+    id_column.class_: kind for kind, (id_column, _, _) in TYPEAHEAD_SOURCES.items()
+}
+
+
+# Sorted array of (owner, key, id) with bisect lookups. Every word start of a
+# name is a key, so "ram" finds both "Ram Rice Mill" and "Shree Ram
+# Industries", and "1234" finds truck "CG04 AB 1234". Leading on the owning
+# user keeps each user's rows together, like the user_id indexes.
+class PrefixIndex:
+    def __init__(self, normalize=normalize_name):
+        self.normalize = normalize
+        self._keys = []
+        self._names = {}
+
+    def _keys_for(self, name: str):
+        words = name.split()
+        keys = {self.normalize(" ".join(words[start:])) for start in range(len(words))}
+        keys.discard("")
+        return keys
+
+    def add(self, row_id, name, owner):
+        self.remove(row_id)
+        if not name or owner is None:
+            return
+        self._names[row_id] = (owner, name)
+        for key in self._keys_for(name):
+            insort(self._keys, (owner, key, row_id))
+
+    def remove(self, row_id):
+        owner, name = self._names.pop(row_id, (None, None))
+        if name is None:
+            return
+        for key in self._keys_for(name):
+            entry = (owner, key, row_id)
+            position = bisect_left(self._keys, entry)
+            if position < len(self._keys) and self._keys[position] == entry:
+                del self._keys[position]
+
+    # First `limit` distinct rows of `owner` with a key starting with
+    # `prefix`, in key order
+    def search(self, prefix: str, owner, limit: int = 10):
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        seen = set()
+        position = bisect_left(self._keys, (owner, prefix))
+        while position < len(self._keys) and len(matches) < limit:
+            key_owner, key, row_id = self._keys[position]
+            if key_owner != owner or not key.startswith(prefix):
+                break
+            if row_id not in seen:
+                seen.add(row_id)
+                matches.append({"id": row_id, "name": self._names[row_id][1]})
+            position += 1
+        return matches
+
+    def __len__(self):
+        return len(self._names)
+
+
+# One PrefixIndex per list. Each list is built from its table on first use
+# and tagged with the table version it reflects. Writes committed by this
+# worker are applied in place; a version this worker did not produce (another
+# worker, bulk update/delete) makes the list reload on its next search.
+class TypeaheadIndex:
+    def __init__(self, sources=TYPEAHEAD_SOURCES):
+        self.sources = sources
+        self._indexes = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    def table_of(self, kind: str) -> str:
+        return self.sources[kind][0].table.name
+
+    def build(self, kind: str):
+        id_column, name_column, normalize = self.sources[kind]
+        version = current_table_versions().get(self.table_of(kind), 0)
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(id_column, name_column, id_column.class_.user_id)
+            ).all()
+        index = PrefixIndex(normalize)
+        for row_id, name, owner in rows:
+            index.add(row_id, name, owner)
+        with self._lock:
+            self._indexes[kind] = index
+            self._versions[kind] = version
+            self.rebuilds += 1
+
+    def build_all(self):
+        for kind in self.sources:
+            self.build(kind)
+
+    def search(self, kind: str, prefix: str, owner, limit: int = 10):
+        version = current_table_versions().get(self.table_of(kind), 0)
+        with self._lock:
+            fresh = self._versions.get(kind) == version
+        if not fresh:
+            self.build(kind)
+        with self._lock:
+            return self._indexes[kind].search(prefix, owner, limit)
+
+    # changes: {kind: [(id, name or None for deleted, owner), ...]}
+    def apply(self, changes, bulk_tables=()):
+        if not changes and not bulk_tables:
+            return
+        versions = current_table_versions()
+        with self._lock:
+            for kind in self.sources:
+                if kind not in self._indexes:
+                    continue
+                table = self.table_of(kind)
+                if table in bulk_tables:
+                    self._versions.pop(kind, None)
+                    continue
+                if kind not in changes:
+                    continue
+                version = versions.get(table, 0)
+                if self._versions.get(kind) != version - 1:
+                    # Missed someone else's write in between: reload
+                    self._versions.pop(kind, None)
+                    continue
+                index = self._indexes[kind]
+                for row_id, name, owner in changes[kind]:
+                    if name is None:
+                        index.remove(row_id)
+                    else:
+                        index.add(row_id, name, owner)
+                self._versions[kind] = version
+                self.incremental_updates += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lists": {kind: len(index) for kind, index in self._indexes.items()},
+                "rebuilds": self.rebuilds,
+                "incremental_updates": self.incremental_updates,
+            }
+
+
+typeahead_index = TypeaheadIndex()
+
+
+# Collect the names written by a flush; applied once the transaction commits
+@event.listens_for(Session, "after_flush")
+def collect_typeahead_changes(session, flush_context):
+    pending = session.info.setdefault("typeahead_pending", {})
+    for objects, deleted in (
+        (session.new, False),
+        (session.dirty, False),
+        (session.deleted, True),
+    ):
+        for obj in objects:
+            kind = SOURCE_BY_CLASS.get(type(obj))
+            if kind is None:
+                continue
+            id_column, name_column, _ = TYPEAHEAD_SOURCES[kind]
+            row_id = getattr(obj, id_column.key)
+            name = None if deleted else getattr(obj, name_column.key)
+            pending.setdefault(kind, []).append((row_id, name, obj.user_id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def collect_typeahead_bulk_writes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        bulk = orm_execute_state.session.info.setdefault("typeahead_bulk", set())
+        bulk.add(orm_execute_state.statement.table.name)
+
+
+def apply_committed_typeahead_changes(session, tables):
+    changes = session.info.pop("typeahead_pending", None) or {}
+    bulk_tables = session.info.pop("typeahead_bulk", None) or set()
+    if changes or bulk_tables:
+        # Read back the versions this commit produced
+        expire_local_versions()
+        typeahead_index.apply(changes, bulk_tables)
+
+
+commit_hooks.append(apply_committed_typeahead_changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_typeahead_changes(session):
+    session.info.pop("typeahead_pending", None)
+    session.info.pop("typeahead_bulk", None)
@@ -1,24 +1,19 @@
-import os
-from fastapi import Depends, HTTPException, status
-from jose import JWTError, jwt
+from fastapi import Depends, HTTPException, Request, status
+from jose import ExpiredSignatureError, JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_read_db
 from models import User
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
 from passlib.context import CryptContext
-import requests
-from models import BlacklistedToken
+from notifications import notifier
+from cache import get_cached_user, set_cached_user
+from config import settings
+from tokens import ALGORITHM, token_verifier
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-ALGORITHM = "HS256"
+SECRET_KEY = settings.secret_key
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -34,12 +29,10 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def verify_token(token: str, db: Session):
-    if is_token_blacklisted(token, db):
-        return None
+# Claims of a valid, unrevoked token, or None
+def verify_token(token: str, db: Session = None):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return token_verifier.verify(token)
     except JWTError:
         return None
 
@@ -56,46 +49,47 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 
 def get_user_by_token(db: Session, token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = verify_token(token)
+    email = payload.get("sub") if payload else None
+    if email is None:
+        raise invalid_token
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise invalid_token
+    return user
 
 
 def add_to_blacklist(token: str, db: Session):
-    blacklisted_token = BlacklistedToken(token=token)
-    db.add(blacklisted_token)
-    db.commit()
+    token_verifier.revoke(token, db)
 
 
-def is_token_blacklisted(token: str, db: Session) -> bool:
-    return (
-        db.query(BlacklistedToken).filter(BlacklistedToken.token == token).first()
-        is not None
-    )
+def is_token_blacklisted(token: str, db: Session = None) -> bool:
+    return token_verifier.is_revoked(token)
+
+
+# The authenticated user of a request. A plain read-only value, the same
+# whether it came from the user cache or the database; load the User row
+# when ORM access is needed.
+class CurrentUser(NamedTuple):
+    id: int
+    name: str
+    email: str
+    role: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.name, user.email, user.role)
 
 
 def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+    request: Request,
+    db: Session = Depends(get_read_db),
+    token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,32 +97,69 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = token_verifier.verify(token)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
+    cached_user = get_cached_user(email)
+    if cached_user is not None:
+        user = CurrentUser(**cached_user)
+    else:
+        db_user = db.query(User).filter(User.email == email).first()
+        if db_user is None:
+            raise credentials_exception
+        user = CurrentUser.from_user(db_user)
+        set_cached_user(user)
+    # Picked up by the audit log as the actor of this request's writes
+    request.state.current_user = user
     return user
 
 
+# Operators, by email. The users.role column is picked at sign-up, so it
+# cannot be what grants access to every user's rows.
+ADMIN_EMAILS = {
+    email.strip().lower() for email in settings.admin_emails.split(",") if email.strip()
+}
+
+
+# Dependency for maintenance endpoints that act on every user's rows
+def get_admin_user(current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only an administrator can do this",
+        )
+    return current_user
+
+
+# 404 unless every id in `ids` is found through `column`. Request sessions
+# are scoped, so ids of rows the caller does not own count as missing.
+def check_ids_exist(db: Session, column, ids, label: str):
+    ids = {value for value in ids if value is not None}
+    if not ids:
+        return
+    found = set(db.execute(select(column).where(column.in_(ids))).scalars())
+    missing = sorted(ids - found)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{label} not found: {', '.join(map(str, missing))}",
+        )
+
+
+# Queued and rate limited; coalesced into digests when TELEGRAM_DIGEST_WINDOW
+# is set
 def send_telegram_message(message: str):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": message,
-    }
-    requests.post(url, json=payload)
+    notifier.send(message)
 
 
+# Claims of a validly signed, unexpired token (revoked or not)
 def get_user_from_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return payload  # Assumes payload contains 'name' or 'email' of the user
-    except jwt.ExpiredSignatureError:
+        return token_verifier.decode(token)
+    except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+    except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")